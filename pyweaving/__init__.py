@@ -3,9 +3,22 @@ from __future__ import (absolute_import, division, print_function,
 
 import datetime
 import json
-from copy import deepcopy
+import weakref
+from itertools import chain
+from collections import namedtuple
+from io import StringIO
 from collections import defaultdict
 
+import numpy as np
+
+from . import jsonio
+from .drawdown import (compute_crossings, compute_drawdown_array,
+                       compute_float_arrays, compute_longest_floats,
+                       count_threads_below, layers_from_counts,
+                       masks_to_array, minimal_period, iter_bits,
+                       longest_runs, rotate_mask, Drawdown, DrawdownTracker)
+from .optimize import sequential_order, treadle_basis
+
 
 __version__ = '0.0.8.dev'
 
@@ -13,17 +26,45 @@ __version__ = '0.0.8.dev'
 class Color(object):
     """
     A color type. Internally stored as RGB, and does not support transparency.
+
+    Colors are immutable and interned: constructing a Color with the same RGB
+    value as an existing one returns the existing instance, so a draft with
+    thousands of threads of a few colors only holds a few Color objects.
     """
-    def __init__(self, rgb):
-        if not isinstance(rgb, tuple):
-            rgb = tuple(rgb)
-        self.rgb = rgb
+    __slots__ = ('rgb', '__weakref__')
+
+    _interned = weakref.WeakValueDictionary()
+
+    def __new__(cls, rgb):
+        if isinstance(rgb, Color):
+            return rgb
+        rgb = tuple(rgb)
+        try:
+            return cls._interned[rgb]
+        except KeyError:
+            self = object.__new__(cls)
+            object.__setattr__(self, 'rgb', rgb)
+            cls._interned[rgb] = self
+            return self
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Color instances are immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("Color instances are immutable")
+
+    def __reduce__(self):
+        return Color, (self.rgb,)
 
     def __eq__(self, other):
-        return self.rgb == other.rgb
+        return self is other or (isinstance(other, Color) and
+                                 self.rgb == other.rgb)
 
     def __ne__(self, other):
-        return self.rgb != other.rgb
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.rgb)
 
     @property
     def css(self):
@@ -32,11 +73,106 @@ class Color(object):
     def __str__(self):
         return str(self.rgb)
 
+    def __repr__(self):
+        return '<Color %s>' % (self.rgb,)
+
+
+def _tracked(method):
+    def wrapper(self, *args):
+        ret = method(self, *args)
+        self.touch()
+        return ret
+    wrapper.__name__ = method.__name__
+    return wrapper
+
+
+class TrackedSet(set):
+    """
+    A set which reports every in-place modification to its ``owner``, the
+    weft thread or treadle holding it. Used for the shafts and treadles of
+    picks and the tie-up of treadles, so that lifts derived from them can be
+    cached by the draft and invalidated when they change.
+    """
+    __slots__ = ('owner',)
+
+    def __init__(self, iterable=(), owner=None):
+        set.__init__(self, iterable)
+        self.owner = owner
+
+    def touch(self):
+        if self.owner is not None:
+            self.owner.touch()
+
+    def __reduce_ex__(self, protocol):
+        # Rebuild from the items, so that restoring them isn't reported as an
+        # edit, and keep the owner, which the default reduction drops.
+        return self.__class__, (list(self),), self.owner
+
+    def __setstate__(self, owner):
+        self.owner = owner
+
+    add = _tracked(set.add)
+    discard = _tracked(set.discard)
+    remove = _tracked(set.remove)
+    pop = _tracked(set.pop)
+    clear = _tracked(set.clear)
+    update = _tracked(set.update)
+    difference_update = _tracked(set.difference_update)
+    intersection_update = _tracked(set.intersection_update)
+    symmetric_difference_update = _tracked(set.symmetric_difference_update)
+    __ior__ = _tracked(set.__ior__)
+    __iand__ = _tracked(set.__iand__)
+    __isub__ = _tracked(set.__isub__)
+    __ixor__ = _tracked(set.__ixor__)
+
+
+class TrackedList(list):
+    """
+    A list which reports every in-place modification to its ``owner``
+    draft. Used for the shafts and weft of a draft, so that reordering,
+    replacing, adding or removing picks or shafts invalidates cached lifts.
+    """
+    __slots__ = ('owner',)
+
+    def __init__(self, iterable=(), owner=None):
+        list.__init__(self, iterable)
+        self.owner = owner
+
+    def touch(self):
+        if self.owner is not None:
+            self.owner.touch()
+
+    def __reduce_ex__(self, protocol):
+        # Rebuild from the items, so that restoring them isn't reported as an
+        # edit, and keep the owner, which the default reduction drops.
+        return self.__class__, (list(self),), self.owner
+
+    def __setstate__(self, owner):
+        self.owner = owner
+
+    append = _tracked(list.append)
+    extend = _tracked(list.extend)
+    insert = _tracked(list.insert)
+    pop = _tracked(list.pop)
+    remove = _tracked(list.remove)
+    reverse = _tracked(list.reverse)
+    clear = _tracked(list.clear)
+    __setitem__ = _tracked(list.__setitem__)
+    __delitem__ = _tracked(list.__delitem__)
+    __iadd__ = _tracked(list.__iadd__)
+    __imul__ = _tracked(list.__imul__)
+
+    def sort(self, *args, **kwargs):
+        list.sort(self, *args, **kwargs)
+        self.touch()
+
 
 class WarpThread(object):
     """
     Represents a single warp thread.
     """
+    __slots__ = ('color', 'shaft')
+
     def __init__(self, color=None, shaft=None):
         if color and not isinstance(color, Color):
             color = Color(color)
@@ -50,59 +186,133 @@ class WarpThread(object):
 class WeftThread(object):
     """
     Represents a single weft thread.
+
+    The sets of shafts and treadles are only allocated once they are first
+    accessed or assigned, since every pick uses one or the other but not both.
     """
+    __slots__ = ('color', '_shafts', '_treadles', '_connected', '_owner')
+
     def __init__(self, color=None, shafts=None, treadles=None):
         if color and not isinstance(color, Color):
             color = Color(color)
         self.color = color
         assert not (shafts and treadles), \
             "can't have both shafts (liftplan) and treadles specified"
-        self.treadles = treadles or set()
-        self.shafts = shafts or set()
+        self._owner = None
+        self._treadles = TrackedSet(treadles, self) if treadles else None
+        self._shafts = TrackedSet(shafts, self) if shafts else None
+        self._connected = None
+
+    def touch(self):
+        # Edits are reported to the draft which last cached lifts for us.
+        if self._owner is not None:
+            self._owner.touch()
+
+    @property
+    def shafts(self):
+        if self._shafts is None:
+            self._shafts = TrackedSet(owner=self)
+        return self._shafts
+
+    @shafts.setter
+    def shafts(self, shafts):
+        self._shafts = TrackedSet(shafts, self)
+        self.touch()
+
+    @property
+    def treadles(self):
+        if self._treadles is None:
+            self._treadles = TrackedSet(owner=self)
+        return self._treadles
+
+    @treadles.setter
+    def treadles(self, treadles):
+        self._treadles = TrackedSet(treadles, self)
+        self.touch()
 
     @property
     def connected_shafts(self):
-        if self.shafts:
-            return self.shafts
+        if self._shafts:
+            return self._shafts
         else:
-            assert self.treadles
-            ret = set()
-            for treadle in self.treadles:
-                ret.update(treadle.shafts)
-            return ret
+            assert self._treadles
+            # Resolving treadles through the tie-up is memoized while the
+            # lifts cached by our draft are current, since any change to the
+            # tie-up or treadling since then would have invalidated them.
+            owner = self._owner
+            version = owner.lift_cache_version() if owner else None
+            if version is None or self._connected is None or \
+                    self._connected[0] != version:
+                ret = frozenset()
+                ret = ret.union(*(treadle.shafts
+                                  for treadle in self._treadles))
+                self._connected = version, ret
+            return self._connected[1]
 
     def __repr__(self):
-        if self.treadles:
+        if self._treadles:
             return '<WeftThread color:%s treadles:%s>' % (self.color.rgb,
-                                                          self.treadles)
+                                                          self._treadles)
         else:
             return '<WeftThread color:%s shafts:%s>' % (self.color.rgb,
-                                                        self.shafts)
+                                                        self._shafts)
 
 
 class Shaft(object):
     """
     Represents a single shaft of the loom.
     """
-    pass
+    __slots__ = ()
 
 
 class Treadle(object):
     """
     Represents a single treadle of the loom.
     """
+    __slots__ = ('_shafts', '_owner')
+
     def __init__(self, shafts=None):
+        self._owner = None
         self.shafts = shafts or set()
 
+    def touch(self):
+        if self._owner is not None:
+            self._owner.touch()
+
+    @property
+    def shafts(self):
+        return self._shafts
+
+    @shafts.setter
+    def shafts(self, shafts):
+        self._shafts = TrackedSet(shafts, self)
+        self.touch()
+
 
 class DraftError(Exception):
     pass
 
 
+RepeatUnits = namedtuple('RepeatUnits', ['threading', 'treadling',
+                                         'warp_colors', 'weft_colors',
+                                         'warp', 'weft'])
+RepeatUnits.__doc__ = """
+The lengths of the smallest repeating units of a draft, as found by
+``Draft.find_repeats()``. ``threading`` and ``treadling`` are the periods of
+the shafts used by each warp thread and lifted on each pick (however the pick
+is treadled), ``warp_colors`` and ``weft_colors`` the periods of the thread
+colors, and ``warp`` and ``weft`` the periods of both together. The last repeat
+of a unit may be incomplete.
+"""
+
+
 class Draft(object):
     """
     The core representation of a weaving draft.
     """
+    _crossings_cache = None
+    _version = 0
+
     def __init__(self, num_shafts, num_treadles=0, liftplan=False,
                  rising_shed=True, start_at_lowest_thread=True,
                  date=None, title='', author='', address='',
@@ -111,6 +321,7 @@ class Draft(object):
         self.rising_shed = rising_shed
         self.start_at_lowest_thread = start_at_lowest_thread
 
+        self._lift_cache = None
         self.shafts = []
         for __ in range(num_shafts):
             self.shafts.append(Shaft())
@@ -132,84 +343,152 @@ class Draft(object):
         self.fax = fax
         self.notes = notes
 
+    @property
+    def shafts(self):
+        return self._shafts
+
+    @shafts.setter
+    def shafts(self, shafts):
+        self._shafts = TrackedList(shafts, self)
+        self.touch()
+
+    @property
+    def weft(self):
+        return self._weft
+
+    @weft.setter
+    def weft(self, threads):
+        self._weft = TrackedList(threads, self)
+        self.touch()
+
+    def touch(self):
+        """
+        Record that the lifts of this draft may have changed, invalidating
+        those cached by ``.lift_masks()``. Changes to the shaft and weft lists
+        and to the shafts and treadles of picks and treadles are recorded
+        automatically.
+        """
+        self._version += 1
+
+    def lift_cache_version(self):
+        """
+        Return the version of this draft for which lifts are currently cached,
+        or None if they are not.
+        """
+        if self._lift_cache is not None and \
+                self._lift_cache[0] == self._version:
+            return self._version
+        return None
+
     @classmethod
     def from_json(cls, s):
         """
         Construct a new Draft instance from its JSON representation.
         Counterpart to ``.to_json()``.
         """
-        obj = json.loads(s)
-        warp = obj.pop('warp')
-        weft = obj.pop('weft')
-        tieup = obj.pop('tieup')
-
-        draft = cls(**obj)
+        return jsonio.load_json(cls, json.loads(s))
 
-        for thread_obj in warp:
-            draft.add_warp_thread(
-                color=thread_obj['color'],
-                shaft=draft.shafts[thread_obj['shaft']],
-            )
+    @classmethod
+    def read_json(cls, f):
+        """
+        Construct a new Draft instance by incrementally reading its JSON
+        representation from a text file object. Counterpart to
+        ``.write_json()``.
+        """
+        return jsonio.read_json(cls, f)
 
-        for thread_obj in weft:
-            draft.add_weft_thread(
-                color=thread_obj['color'],
-                shafts=set(draft.shafts[n] for n in thread_obj['shafts']),
-                treadles=set(draft.treadles[n] for n in
-                             thread_obj['treadles']),
-            )
+    def to_json(self, columnar=False):
+        """
+        Serialize a Draft to its JSON representation. Counterpart to
+        ``.from_json()``. If ``columnar`` is True, threads are stored as
+        parallel arrays of palette ids and shaft or treadle numbers rather
+        than as one object per thread.
+        """
+        f = StringIO()
+        self.write_json(f, columnar=columnar)
+        return f.getvalue()
 
-        for ii, shaft_nos in enumerate(tieup):
-            draft.treadles[ii].shafts = set(draft.shafts[n] for n in shaft_nos)
+    def write_json(self, f, columnar=False):
+        """
+        Write the JSON representation of this draft to a text file object, one
+        thread at a time. See ``.to_json()``.
+        """
+        jsonio.write_json(self, f, columnar=columnar)
 
-        return draft
+    @property
+    def palette(self):
+        """
+        A list of the distinct colors of the threads in this draft, in order of
+        first use.
+        """
+        colors = dict((thread.color, None)
+                      for thread in chain(self.warp, self.weft))
+        colors.pop(None, None)
+        return list(colors)
 
-    def to_json(self):
+    def recolor(self, old, new):
         """
-        Serialize a Draft to its JSON representation. Counterpart to
-        ``.from_json()``.
-        """
-        return json.dumps({
-            'liftplan': self.liftplan,
-            'rising_shed': self.rising_shed,
-            'num_shafts': len(self.shafts),
-            'num_treadles': len(self.treadles),
-            'warp': [{
-                'color': thread.color.rgb,
-                'shaft': self.shafts.index(thread.shaft),
-            } for thread in self.warp],
-            'weft': [{
-                'color': thread.color.rgb,
-                'treadles': [self.treadles.index(tr)
-                             for tr in thread.treadles],
-                'shafts': [self.shafts.index(sh)
-                           for sh in thread.connected_shafts],
-            } for thread in self.weft],
-            'tieup': [
-                [self.shafts.index(sh) for sh in treadle.shafts]
-                for treadle in self.treadles
-            ],
-            'date': self.date,
-            'title': self.title,
-            'author': self.author,
-            'address': self.address,
-            'email': self.email,
-            'telephone': self.telephone,
-            'fax': self.fax,
-            'notes': self.notes,
-        })
+        Change every thread of color ``old`` to color ``new``.
+        """
+        old = Color(old)
+        new = Color(new)
+        for thread in chain(self.warp, self.weft):
+            if thread.color is old:
+                thread.color = new
 
     def copy(self):
         """
-        Make a complete copy of this draft.
+        Make a complete copy of this draft. Shafts, treadles and threads are
+        recreated with the same connections between them, while ``Color``
+        instances are shared.
+        """
+        new = self.__class__.__new__(self.__class__)
+        new.__dict__.update(self.__dict__)
+        new._lift_cache = None
+        new._crossings_cache = None
+
+        new.shafts = [Shaft() for __ in self.shafts]
+        shaft_map = dict(zip(self.shafts, new.shafts))
+        shaft_map[None] = None
+        new.treadles = [Treadle(shafts=[shaft_map[shaft]
+                                        for shaft in treadle.shafts])
+                        for treadle in self.treadles]
+        treadle_map = dict(zip(self.treadles, new.treadles))
+
+        new.warp = [WarpThread(color=thread.color,
+                               shaft=shaft_map[thread.shaft])
+                    for thread in self.warp]
+        new.weft = [
+            WeftThread(color=thread.color,
+                       shafts=[shaft_map[shaft]
+                               for shaft in thread._shafts or ()],
+                       treadles=[treadle_map[treadle]
+                                 for treadle in thread._treadles or ()])
+            for thread in self.weft]
+        return new
+
+    def add_shaft(self):
+        """
+        Add a new shaft to this draft, and return it.
         """
-        return deepcopy(self)
+        shaft = Shaft()
+        self.shafts.append(shaft)
+        return shaft
+
+    def add_treadle(self, shafts=None):
+        """
+        Add a new treadle to this draft, tied up to ``shafts``, and return it.
+        """
+        treadle = Treadle(shafts=set(shafts or ()))
+        self.treadles.append(treadle)
+        self.touch()
+        return treadle
 
     def add_warp_thread(self, color=None, index=None, shaft=0):
         """
         Add a warp thread to this draft.
         """
-        if not isinstance(shaft, Shaft):
+        if shaft is not None and not isinstance(shaft, Shaft):
             shaft = self.shafts[shaft]
         thread = WarpThread(
             color=color,
@@ -263,15 +542,130 @@ class Draft(object):
         else:
             return weft_thread
 
+    def threading_array(self):
+        """
+        Return the threading as an array of shaft indexes, one per warp
+        thread. Unthreaded ends are -1.
+        """
+        shaft_index = dict((shaft, ii) for ii, shaft in enumerate(self.shafts))
+        return np.array([shaft_index.get(thread.shaft, -1)
+                         for thread in self.warp], dtype=np.intp)
+
+    def lift_masks(self):
+        """
+        Return a list containing the shafts lifted on each pick as an integer
+        bitmask of shaft indexes, resolving treadling through the tie-up.
+
+        The result is cached until a tie-up, treadling or liftplan is modified,
+        so should not be changed by the caller.
+        """
+        if self.lift_cache_version() is None:
+            shaft_bits = dict((shaft, 1 << ii)
+                              for ii, shaft in enumerate(self.shafts))
+            treadle_masks = {}
+            # Picks and treadles report their changes to the draft which owns
+            # them: those already owned by another draft can't be cached.
+            cacheable = True
+
+            def claim(obj):
+                if obj._owner is None:
+                    obj._owner = self
+                return obj._owner is self
+
+            def shaft_mask(shafts):
+                mask = 0
+                for shaft in shafts:
+                    mask |= shaft_bits[shaft]
+                return mask
+
+            masks = []
+            for thread in self.weft:
+                cacheable &= claim(thread)
+                if thread._shafts:
+                    mask = shaft_mask(thread._shafts)
+                else:
+                    mask = 0
+                    for treadle in thread._treadles or ():
+                        if treadle not in treadle_masks:
+                            cacheable &= claim(treadle)
+                            treadle_masks[treadle] = shaft_mask(treadle.shafts)
+                        mask |= treadle_masks[treadle]
+                masks.append(mask)
+            lifts = masks_to_array(masks, len(self.shafts))
+            lifts.setflags(write=False)
+            self._lift_cache = (self._version if cacheable else None,
+                                masks, lifts)
+        return self._lift_cache[1]
+
+    def pick_masks(self):
+        """
+        Return a pair of lists, giving the shafts (for a liftplan) and the
+        treadles used on each pick as integer bitmasks of indexes. Treadling
+        is not resolved through the tie-up.
+        """
+        shaft_bits = dict((shaft, 1 << ii)
+                          for ii, shaft in enumerate(self.shafts))
+        treadle_bits = dict((treadle, 1 << ii)
+                            for ii, treadle in enumerate(self.treadles))
+        shaft_masks = []
+        treadle_masks = []
+        for thread in self.weft:
+            shaft_masks.append(sum(shaft_bits[shaft]
+                                   for shaft in thread._shafts or ()))
+            treadle_masks.append(sum(treadle_bits[treadle]
+                                     for treadle in thread._treadles or ()))
+        return shaft_masks, treadle_masks
+
+    def tieup_masks(self):
+        """
+        Return a list giving the shafts tied to each treadle as an integer
+        bitmask of shaft indexes.
+        """
+        shaft_bits = dict((shaft, 1 << ii)
+                          for ii, shaft in enumerate(self.shafts))
+        return [sum(shaft_bits[shaft] for shaft in treadle.shafts)
+                for treadle in self.treadles]
+
+    def liftplan_array(self):
+        """
+        Return the shafts lifted on every pick as a boolean matrix of shape
+        (picks, shafts), resolving treadling through the tie-up.
+
+        The result is cached along with ``.lift_masks()`` and is read-only.
+        """
+        self.lift_masks()
+        return self._lift_cache[2]
+
+    def compute_drawdown_array(self):
+        """
+        Compute the drawdown as a boolean array of shape (warp threads, weft
+        threads), which is True wherever the warp thread is on top.
+        """
+        return compute_drawdown_array(self.threading_array(),
+                                      self.liftplan_array(),
+                                      self.rising_shed)
+
     def compute_drawdown(self):
         """
         Compute a 2D array containing the thread visible at each position.
+        This is a lazy view over ``.compute_drawdown_array()``: threads are
+        looked up as ``drawdown[x][y]`` is accessed.
+        """
+        return Drawdown(self, self.compute_drawdown_array())
+
+    def track_drawdown(self):
+        """
+        Return a ``DrawdownTracker``, which keeps the drawdown and the longest
+        floats of this draft up to date incrementally as threads are changed.
         """
-        num_warp_threads = len(self.warp)
-        num_weft_threads = len(self.weft)
-        return [[self.compute_drawdown_at((x, y))
-                 for y in range(num_weft_threads)]
-                for x in range(num_warp_threads)]
+        return DrawdownTracker(self)
+
+    def compute_float_arrays(self):
+        """
+        Return a pair of ``FloatArrays`` describing every warp and weft float,
+        as columns of start, end, visible, length and thread index.
+        """
+        return compute_float_arrays(self.compute_drawdown_array())
 
     def compute_floats(self):
         """
@@ -281,40 +675,15 @@ class Draft(object):
 
         FIXME: This ignores the back side of the fabric. Should it?
         """
-        num_warp_threads = len(self.warp)
-        num_weft_threads = len(self.weft)
-
-        drawdown = self.compute_drawdown()
-
-        # Iterate over each warp thread, then each weft thread
-        # For each thread, find the position of each change in state
-        for x, thread in enumerate(self.warp):
-            this_vis_state = (thread == drawdown[x][0])
-            last = this_start = (x, 0)
-            for y in range(1, num_weft_threads):
-                check_vis_state = (thread == drawdown[x][y])
-                if check_vis_state != this_vis_state:
-                    length = last[1] - this_start[1]
-                    yield this_start, last, this_vis_state, length, thread
-                    this_vis_state = check_vis_state
-                    this_start = x, y
-                last = x, y
-            length = last[1] - this_start[1]
-            yield this_start, last, this_vis_state, length, thread
-
-        for y, thread in enumerate(self.weft):
-            this_vis_state = (thread == drawdown[0][y])
-            last = this_start = (0, y)
-            for x in range(1, num_warp_threads):
-                check_vis_state = (thread == drawdown[x][y])
-                if check_vis_state != this_vis_state:
-                    length = last[0] - this_start[0]
-                    yield this_start, last, this_vis_state, length, thread
-                    this_vis_state = check_vis_state
-                    this_start = x, y
-                last = x, y
-            length = last[0] - this_start[0]
-            yield this_start, last, this_vis_state, length, thread
+        warp_floats, weft_floats = self.compute_float_arrays()
+        for floats, threads in ((warp_floats, list(self.warp)),
+                                (weft_floats, list(self.weft))):
+            for start, end, visible, length, thread_no in zip(
+                    floats.start.tolist(), floats.end.tolist(),
+                    floats.visible.tolist(), floats.length.tolist(),
+                    floats.thread.tolist()):
+                yield (tuple(start), tuple(end), visible, length,
+                       threads[thread_no])
 
     def compute_longest_floats(self):
         """
@@ -322,34 +691,100 @@ class Draft(object):
 
         FIXME This might be producing incorrect results.
         """
-        floats = list(self.compute_floats())
-        return (
-            max(length
-                for start, end, visible, length, thread in floats
-                if isinstance(thread, WarpThread)),
-            max(length
-                for start, end, visible, length, thread in floats
-                if isinstance(thread, WeftThread)),
-        )
+        return compute_longest_floats(self.threading_array(),
+                                      self.liftplan_array(),
+                                      self.rising_shed)
 
     def reduce_shafts(self):
         """
         Optimize to use the fewest number of shafts, to attempt to make a
         complex draft possible to weave on a loom with fewer shafts. Note that
         this may make the threading more complex or less periodic.
+
+        Shafts which are lifted on exactly the same picks are merged, and
+        shafts with no warp threads are removed, without changing the
+        drawdown. Shafts are compared by hashing their lift patterns, packed
+        into bytes.
         """
-        raise NotImplementedError
+        lifts = self.liftplan_array()
+        threading = self.threading_array()
+        used = np.zeros(len(self.shafts), dtype=bool)
+        used[threading[threading >= 0]] = True
+        columns = np.packbits(lifts.T, axis=1)
+        patterns = {}
+        mapping = np.full(len(self.shafts), -1, dtype=np.intp)
+        for shaft_no in np.flatnonzero(used).tolist():
+            mapping[shaft_no] = patterns.setdefault(
+                columns[shaft_no].tobytes(), len(patterns))
+        self.remap_shafts(mapping)
+
+    def remap_shafts(self, mapping):
+        """
+        Renumber, merge or remove the shafts of this draft. ``mapping`` gives
+        the new index of each current shaft, or -1 to remove it. Warp threads
+        on removed shafts become unthreaded. A merged shaft is lifted whenever
+        any of the shafts merged into it would have been.
+        """
+        mapping = [int(new_no) for new_no in mapping]
+        new_shafts = [None] * (max(mapping) + 1 if mapping else 0)
+        shaft_map = {}
+        for shaft, new_no in zip(self.shafts, mapping):
+            if new_no < 0:
+                continue
+            if new_shafts[new_no] is None:
+                new_shafts[new_no] = shaft
+            shaft_map[shaft] = new_shafts[new_no]
+        assert None not in new_shafts, "shaft numbers must be contiguous"
 
-    def reduce_treadles(self):
+        for thread in self.warp:
+            thread.shaft = shaft_map.get(thread.shaft)
+        for treadle in self.treadles:
+            treadle.shafts = set(shaft_map[shaft] for shaft in treadle.shafts
+                                 if shaft in shaft_map)
+        for thread in self.weft:
+            if thread._shafts:
+                thread.shafts = set(shaft_map[shaft]
+                                    for shaft in thread._shafts
+                                    if shaft in shaft_map)
+        self.shafts = new_shafts
+
+    def reduce_treadles(self, exact=False, time_limit=1.0):
         """
         Optimize to use the fewest number of total treadles, to attempt to make
         a complex draft possible to weave on a loom with a smaller number of
         treadles. Note that this may require that more treadles are active on
         any given pick.
 
+        The tie-up is replaced by a small set of treadles such that the shafts
+        lifted on each pick are the union of some of them, found by a greedy
+        set cover. If ``exact`` is True, a search for the fewest possible
+        treadles is then run. Both stop after ``time_limit`` seconds in total,
+        keeping the best tie-up found. See
+        ``pyweaving.optimize.treadle_basis()``.
+
         Cannot be called on a liftplan draft.
         """
-        raise NotImplementedError
+        if self.liftplan:
+            raise ValueError("can't reduce treadles on a liftplan draft")
+        tieup, treadling = treadle_basis(self.lift_masks(), exact=exact,
+                                         time_limit=time_limit)
+        self.replace_treadles(tieup, treadling)
+
+    def replace_treadles(self, tieup, treadling):
+        """
+        Replace the treadles of this draft and the treadling of every pick.
+        ``tieup`` gives the shafts tied to each new treadle, and ``treadling``
+        the treadles used on each pick, both as integer bitmasks. Shafts
+        lifted directly on picks are cleared.
+        """
+        self.treadles = [Treadle(shafts=set(self.shafts[ii]
+                                            for ii in iter_bits(mask)))
+                         for mask in tieup]
+        for thread, mask in zip(self.weft, treadling):
+            if thread._shafts:
+                thread.shafts = set()
+            thread.treadles = set(self.treadles[ii] for ii in iter_bits(mask))
+        self.touch()
 
     def reduce_active_treadles(self):
         """
@@ -382,8 +817,24 @@ class Draft(object):
 
         For a treadled draft, will change the threading and tieup, won't change
         the treadling.
+
+        Shafts are reordered to minimize the total distance jumped between
+        the shafts of adjacent ends, counted once per pair of shafts. See
+        ``pyweaving.optimize.sequential_order()``.
         """
-        raise NotImplementedError
+        num_shafts = len(self.shafts)
+        threading = self.threading_array()
+        threading = threading[threading >= 0]
+        weights = np.zeros((num_shafts, num_shafts), dtype=np.intp)
+        np.add.at(weights, (threading[:-1], threading[1:]), 1)
+        weights += weights.T
+        np.fill_diagonal(weights, 0)
+        first_use = np.full(num_shafts, len(threading), dtype=np.intp)
+        first_use[threading[::-1]] = np.arange(len(threading))[::-1]
+        order = sequential_order(weights, first_use)
+        mapping = np.empty(num_shafts, dtype=np.intp)
+        mapping[order] = np.arange(num_shafts)
+        self.remap_shafts(mapping)
 
     def sort_treadles(self):
         """
@@ -394,9 +845,54 @@ class Draft(object):
         sorting both threading and treadles, call ``.sort_threading()`` before
         calling ``.sort_treadles()``.
 
+        Treadles are reordered in the same way as shafts by
+        ``.sort_threading()``, counting every pair of treadles used on
+        adjacent picks.
+
         Cannot be called on a liftplan draft.
         """
-        raise NotImplementedError
+        if self.liftplan:
+            raise ValueError("can't sort treadles on a liftplan draft")
+        num_treadles = len(self.treadles)
+        __, treadle_masks = self.pick_masks()
+        treadling = masks_to_array(treadle_masks, num_treadles)
+        treadling = treadling[treadling.any(axis=1)].astype(np.intp)
+        weights = np.dot(treadling[:-1].T, treadling[1:])
+        weights += weights.T
+        np.fill_diagonal(weights, 0)
+        first_use = np.where(treadling.any(axis=0), treadling.argmax(axis=0),
+                             len(treadling))
+        order = sequential_order(weights, first_use)
+        mapping = np.empty(num_treadles, dtype=np.intp)
+        mapping[order] = np.arange(num_treadles)
+        self.remap_treadles(mapping)
+
+    def remap_treadles(self, mapping):
+        """
+        Renumber, merge or remove the treadles of this draft, in the same way
+        as ``.remap_shafts()``. A merged treadle is tied up to every shaft of
+        the treadles merged into it.
+        """
+        mapping = [int(new_no) for new_no in mapping]
+        new_treadles = [None] * (max(mapping) + 1 if mapping else 0)
+        treadle_map = {}
+        for treadle, new_no in zip(self.treadles, mapping):
+            if new_no < 0:
+                continue
+            if new_treadles[new_no] is None:
+                new_treadles[new_no] = treadle
+            else:
+                new_treadles[new_no].shafts.update(treadle.shafts)
+            treadle_map[treadle] = new_treadles[new_no]
+        assert None not in new_treadles, "treadle numbers must be contiguous"
+
+        for thread in self.weft:
+            if thread._treadles:
+                thread.treadles = set(treadle_map[treadle]
+                                      for treadle in thread._treadles
+                                      if treadle in treadle_map)
+        self.treadles = new_treadles
+        self.touch()
 
     def invert_shed(self):
         """
@@ -441,10 +937,11 @@ class Draft(object):
         return (self.selvedge_continuous(False) and
                 self.selvedge_continuous(True))
 
-    def selvedge_continuous(self, low):
+    def continuous_selvedge_shafts(self, low):
         """
-        Check whether the selvedge corresponding to the lowest-number thread is
-        continuous.
+        Return a boolean array indicating, for each shaft, whether a selvedge
+        thread on that shaft would be continuous. ``low`` selects the selvedge
+        corresponding to the lowest-number thread.
         """
         # For the low selvedge:
         # If this draft starts at the lowest thread, there needs to be a
@@ -455,69 +952,155 @@ class Draft(object):
         # For the high selvedge:
         # If this draft starts at the highest thread, there needs to be a
         # transition between threads 0 and 1, threads 2 and 3, etc.
-
         offset = 0 if low ^ self.start_at_lowest_thread else 1
-        if low:
-            thread = self.warp[0]
-        else:
-            thread = self.warp[-1]
-        for ii in range(offset, len(self.weft) - 1, 2):
-            a_state = thread.shaft in self.weft[ii].connected_shafts
-            b_state = thread.shaft in self.weft[ii + 1].connected_shafts
-            if not a_state ^ b_state:
-                return False
-        return True
+        lifts = self.liftplan_array()
+        num_picks = len(lifts)
+        # Each pair of picks is tested for every shaft at once.
+        transitions = (lifts[offset:num_picks - 1:2] ^
+                       lifts[offset + 1:num_picks:2])
+        return transitions.all(axis=0)
+
+    def selvedge_continuous(self, low):
+        """
+        Check whether the selvedge corresponding to the lowest-number thread is
+        continuous.
+        """
+        thread = self.warp[0] if low else self.warp[-1]
+        if thread.shaft is None:
+            # An unthreaded end is never picked up.
+            offset = 0 if low ^ self.start_at_lowest_thread else 1
+            return len(self.weft) - offset < 2
+        continuous = self.continuous_selvedge_shafts(low)
+        return bool(continuous[self.shafts.index(thread.shaft)])
 
     def make_selvedges_continuous(self, add_new_shafts=False):
         """
         Make the selvedge threads "continuous": that is, threaded and treadled
         such that they are picked up on every pick. This method will try to use
-        the liftplan/tieup and switch selvedge threads to alternate shafts. If
-        that is impossible and ``add_new_shafts`` new shafts will be added to
-        handle the selvedge threads.
+        the liftplan/tieup and switch selvedge threads to alternate shafts,
+        choosing the shaft which gives the shortest float on the selvedge
+        thread. If that is impossible and ``add_new_shafts`` is True, a new
+        shaft is added which is lifted on every other pick, through a new
+        treadle for picks which are treadled, and the selvedge threads are
+        threaded on it.
 
         FIXME This method works, but it does not necessarily produce the
         subjectively "best" solution in terms of aesthetics and structure. For
         example, it may result in longer floats than necessary.
         """
         for low_thread in (False, True):
-            success = False
             if low_thread:
                 warp_thread = self.warp[0]
             else:
                 warp_thread = self.warp[-1]
             if self.selvedge_continuous(low_thread):
-                success = True
                 continue
-            for shaft in self.shafts:
-                warp_thread.shaft = shaft
-                if self.selvedge_continuous(low_thread):
-                    success = True
-                    break
-            if not success:
-                if add_new_shafts:
-                    raise NotImplementedError
-                else:
-                    raise DraftError("cannot make continuous selvedges")
+            candidates = np.flatnonzero(
+                self.continuous_selvedge_shafts(low_thread))
+            if candidates.size:
+                # The first shaft with the shortest float wins.
+                lifted = self.liftplan_array()[:, candidates].T
+                best = candidates[longest_runs(lifted).argmin()]
+                warp_thread.shaft = self.shafts[best]
+            elif add_new_shafts:
+                warp_thread.shaft = self.add_selvedge_shaft()
+            else:
+                raise DraftError("cannot make continuous selvedges")
+
+    def add_selvedge_shaft(self):
+        """
+        Add a shaft which is lifted on every other pick, as needed for a
+        continuous selvedge, and return it. Picks which use a liftplan lift it
+        directly, and treadled picks through a new treadle tied up to it alone.
+        """
+        shaft = self.add_shaft()
+        treadle = None
+        for ii, thread in enumerate(self.weft):
+            if ii % 2:
+                continue
+            if thread.treadles or (self.treadles and not thread.shafts):
+                if treadle is None:
+                    treadle = self.add_treadle(shafts=[shaft])
+                thread.treadles.add(treadle)
+            else:
+                thread.shafts.add(shaft)
+        return shaft
+
+    def compute_crossings(self):
+        """
+        Return a pair of read-only integer arrays giving the number of thread
+        crossings along each warp thread and along each weft thread.
+
+        The result is cached until the threading or liftplan changes.
+        """
+        threading = self.threading_array()
+        lifts = self.liftplan_array()
+        key = (self.rising_shed, threading.tobytes(), lifts.shape,
+               lifts.tobytes())
+        if self._crossings_cache is None or \
+                self._crossings_cache[0] != key:
+            crossings = compute_crossings(threading, lifts, self.rising_shed)
+            for counts in crossings:
+                counts.setflags(write=False)
+            self._crossings_cache = key, crossings
+        return self._crossings_cache[1]
 
     def compute_weft_crossings(self):
         """
-        Iterate over each weft row and compute the total number of thread
-        crossings in that row. Useful for determining sett.
+        Return an array giving the total number of thread crossings in each
+        weft row. Useful for determining sett.
         """
-        raise NotImplementedError
+        return self.compute_crossings()[1]
 
     def compute_warp_crossings(self):
         """
-        Iterate over each warp row and compute the total number of thread
-        crossings in that row.
+        Return an array giving the total number of thread crossings in each
+        warp row.
         """
-        raise NotImplementedError
+        return self.compute_crossings()[0]
+
+    def find_repeats(self):
+        """
+        Find the smallest repeating units of this draft's threading, treadling
+        and thread colors, in linear time. Returns a ``RepeatUnits``.
+        """
+        threading = self.threading_array().tolist()
+        lifts = self.lift_masks()
+        warp_colors = [thread.color for thread in self.warp]
+        weft_colors = [thread.color for thread in self.weft]
+        return RepeatUnits(
+            threading=minimal_period(threading),
+            treadling=minimal_period(lifts),
+            warp_colors=minimal_period(warp_colors),
+            weft_colors=minimal_period(weft_colors),
+            warp=minimal_period(list(zip(threading, warp_colors))),
+            weft=minimal_period(list(zip(lifts, weft_colors))),
+        )
 
-    def repeat(self, n):
+    def repeat_unit(self):
+        """
+        Return a copy of this draft containing only its smallest repeating
+        unit of warp and weft threads, including colors. Tiling the drawdown
+        of the unit reproduces the drawdown of the full draft.
+        """
+        repeats = self.find_repeats()
+        unit = self.copy()
+        unit.warp = unit.warp[:repeats.warp]
+        unit.weft = unit.weft[:repeats.weft]
+        return unit
+
+    def repeat(self, n, lazy=False):
         """
         Given a base draft, make it repeat with N units in each direction.
+        Threads are added for N more copies of the current warp and weft.
+
+        If ``lazy`` is True, leave this draft alone and instead return a
+        ``RepeatedDraft`` of the same N + 1 units, which refers to the threads
+        of this draft instead of copying them.
         """
+        if lazy:
+            from .repeat import RepeatedDraft
+            return RepeatedDraft(self, n + 1, n + 1)
         initial_warp = list(self.warp)
         initial_weft = list(self.weft)
         for ii in range(n):
@@ -533,48 +1116,73 @@ class Draft(object):
                     shafts=thread.shafts,
                 )
 
-    def advance(self):
+    def advance(self, step=1, repeats=None, lazy=False):
         """
         Given a base draft, make it 'advance'. Essentially:
             1. Repeat the draft N times, where N is the number of shafts, in
             both the warp and weft directions.
-            2. On each successive repeat, offset the threading by 1 additional
-            shaft and the treadling by one additional treadle.
+            2. On each successive repeat, offset the threading by ``step``
+            additional shafts and the treadling by ``step`` additional
+            treadles.
+
+        ``repeats`` gives N, the total number of repeats including the base
+        draft, if not the number of shafts. Unthreaded ends stay unthreaded.
+
+        If ``lazy`` is True, leave this draft alone and instead return an
+        ``AdvancedDraft`` view of the advanced draft.
         """
-        initial_warp = list(self.warp)
-        initial_weft = list(self.weft)
+        if repeats is None:
+            repeats = len(self.shafts)
+        if lazy:
+            from .repeat import AdvancedDraft
+            return AdvancedDraft(self, step=step, repeats=repeats)
         num_shafts = len(self.shafts)
         num_treadles = len(self.treadles)
-        for ii in range(1, num_shafts):
-            print("ADVANCE %d" % ii)
-            for thread in initial_warp:
-                print("  thread")
-                initial_shaft = self.shafts.index(thread.shaft)
-                print("    initial shaft: %d" % initial_shaft)
-                new_shaft = (initial_shaft + ii) % num_shafts
-                print("    new shaft: %d" % new_shaft)
+        threading = self.threading_array()
+        unthreaded = threading < 0
+        warp_colors = [thread.color for thread in self.warp]
+        weft_colors = [thread.color for thread in self.weft]
+        shaft_masks, treadle_masks = self.pick_masks()
+        for ii in range(1, repeats):
+            offset = ii * step
+            shifted = (threading + offset) % max(num_shafts, 1)
+            shifted[unthreaded] = -1
+            for color, shaft_no in zip(warp_colors, shifted.tolist()):
                 self.add_warp_thread(
-                    color=thread.color,
-                    shaft=new_shaft,
+                    color=color,
+                    shaft=None if shaft_no < 0 else shaft_no,
                 )
-            for thread in initial_weft:
-                initial_treadles = [self.treadles.index(treadle)
-                                    for treadle in thread.treadles]
-                new_treadles = [(treadle + ii) % num_treadles
-                                for treadle in initial_treadles]
-                initial_shafts = [self.shafts.index(shaft)
-                                  for shaft in thread.shafts]
-                new_shafts = [(shaft + ii) % num_shafts
-                              for shaft in initial_shafts]
+            for color, shaft_mask, treadle_mask in zip(
+                    weft_colors, shaft_masks, treadle_masks):
                 self.add_weft_thread(
-                    color=thread.color,
-                    treadles=new_treadles,
-                    shafts=new_shafts,
+                    color=color,
+                    shafts=list(iter_bits(
+                        rotate_mask(shaft_mask, offset, num_shafts))),
+                    treadles=list(iter_bits(
+                        rotate_mask(treadle_mask, offset, num_treadles))),
                 )
 
     def all_threads_attached(self):
         """
         Check whether all threads (weft and warp) will be "attached" to the
         fabric, instead of just falling off.
+
+        This is the case when every thread lies both above and beneath every
+        other, through some chain of crossings, so that the draft is a single
+        layer: see ``.find_layers()``.
         """
-        raise NotImplementedError
+        return len(self.find_layers()) <= 1
+
+    def find_layers(self):
+        """
+        Split the threads of this draft into the layers which hold together,
+        such as the two cloths of a double weave, returning a list of pairs of
+        warp and weft thread index arrays. Threads which never interlace are
+        each a layer of their own.
+
+        Only the number of threads beneath each thread is needed, which is
+        found from the threading and liftplan without computing the drawdown.
+        See ``pyweaving.drawdown.layers_from_counts()``.
+        """
+        return layers_from_counts(*count_threads_below(
+            self.threading_array(), self.liftplan_array(), self.rising_shed))
@@ -0,0 +1,246 @@
+"""
+Benchmarks for the performance-sensitive parts of pyweaving.
+
+Each benchmark builds a synthetic draft of a given size, then times each
+stage of working with it and records the peak memory allocated while doing
+so. Results are returned as plain dicts so that they can be written out as
+JSON and compared across releases.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import os
+import os.path
+import io
+import sys
+import time
+import json
+import shutil
+import platform
+import datetime
+import tracemalloc
+import contextlib
+from tempfile import mkdtemp
+
+import numpy as np
+from PIL import Image
+
+from . import Draft, __version__
+from .generators.twill import twill
+from .generators.tartan import tartan, gordon_modern
+from .generators.raster import point_threaded
+from .render import ImageRenderer, SVGRenderer
+from .wif import WIFReader, FastWIFReader, WIFWriter
+
+
+def tile_draft(draft, size):
+    """
+    Return a new draft with ``size`` warp and weft threads, made by repeating
+    the threads of ``draft`` as many times as needed.
+    """
+    ret = Draft(num_shafts=len(draft.shafts),
+                num_treadles=len(draft.treadles),
+                liftplan=draft.liftplan,
+                rising_shed=draft.rising_shed)
+    shaft_map = dict(zip(draft.shafts, ret.shafts))
+    treadle_map = dict(zip(draft.treadles, ret.treadles))
+    for treadle in draft.treadles:
+        treadle_map[treadle].shafts.update(shaft_map[shaft]
+                                           for shaft in treadle.shafts)
+
+    for ii in range(size):
+        thread = draft.warp[ii % len(draft.warp)]
+        ret.add_warp_thread(color=thread.color.rgb,
+                            shaft=shaft_map.get(thread.shaft))
+    for ii in range(size):
+        thread = draft.weft[ii % len(draft.weft)]
+        ret.add_weft_thread(
+            color=thread.color.rgb,
+            shafts=[shaft_map[shaft] for shaft in thread.shafts],
+            treadles=[treadle_map[treadle] for treadle in thread.treadles])
+    return ret
+
+
+def make_twill(size):
+    return tile_draft(twill(3), size)
+
+
+def make_tartan(size):
+    # The tartan generator reports the size of each repeat on stdout, which
+    # would corrupt the benchmark output.
+    with contextlib.redirect_stdout(io.StringIO()):
+        draft = tartan(gordon_modern)
+    return tile_draft(draft, size)
+
+
+def make_raster(size):
+    im = Image.effect_mandelbrot((40, size), (-2, -1.5, 1, 1.5), 100)
+    return tile_draft(point_threaded(im, shafts=40, repeats=1), size)
+
+
+drafts = {
+    'twill': make_twill,
+    'tartan': make_tartan,
+    'raster': make_raster,
+}
+
+
+def bench_drawdown(draft, directory):
+    draft.compute_drawdown_array()
+
+
+def bench_floats(draft, directory):
+    for __ in draft.compute_floats():
+        pass
+
+
+def bench_longest_floats(draft, directory):
+    draft.compute_longest_floats()
+
+
+def bench_layers(draft, directory):
+    draft.find_layers()
+
+
+def bench_render_png(draft, directory):
+    ImageRenderer(draft, scale=4).save(os.path.join(directory, 'out.png'))
+
+
+def bench_render_svg(draft, directory):
+    SVGRenderer(draft).save(os.path.join(directory, 'out.svg'))
+
+
+def bench_wif_write(draft, directory):
+    WIFWriter(draft).write(os.path.join(directory, 'out.wif'))
+
+
+def bench_wif_read(draft, directory):
+    FastWIFReader(os.path.join(directory, 'out.wif')).read()
+
+
+def bench_wif_read_legacy(draft, directory):
+    WIFReader(os.path.join(directory, 'out.wif')).read()
+
+
+# Each stage is a tuple of (name, function, max cells, setup), where max
+# cells is the largest drawdown (warp threads x weft threads) the stage is run
+# on, or None for no limit, and setup is an untimed function called with the
+# same arguments before the stage is run, or None. The WIF readers use it to
+# write the file they read, so they can be run without the WIF writer.
+stages = [
+    ('drawdown', bench_drawdown, None, None),
+    ('longest_floats', bench_longest_floats, None, None),
+    ('floats', bench_floats, 1000 ** 2, None),
+    ('layers', bench_layers, None, None),
+    ('render_png', bench_render_png, 2000 ** 2, None),
+    ('render_svg', bench_render_svg, 500 ** 2, None),
+    ('wif_write', bench_wif_write, None, None),
+    ('wif_read', bench_wif_read, None, bench_wif_write),
+    ('wif_read_legacy', bench_wif_read_legacy, None, bench_wif_write),
+]
+
+
+def measure(func, *args):
+    """
+    Call ``func`` with ``args``, returning a tuple of its return value and
+    the wall clock time it took in seconds.
+    """
+    start = time.perf_counter()
+    ret = func(*args)
+    return ret, time.perf_counter() - start
+
+
+def measure_memory(func, *args):
+    """
+    Call ``func`` with ``args``, returning a tuple of its return value and
+    the peak number of bytes allocated while it ran. Tracing allocations
+    slows down the call, so this is measured separately from the time taken.
+    """
+    tracemalloc.start()
+    try:
+        ret = func(*args)
+        __, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return ret, peak
+
+
+def run(draft_names=None, sizes=(100, 1000, 20000), stage_names=None,
+        repeat=1, log=None):
+    """
+    Run the benchmarks for every combination of draft and size, returning a
+    dict containing the environment and a list of results. Each result
+    records the best time of ``repeat`` runs of a stage. Stages which are
+    skipped because the draft is too large have times of None.
+    """
+    draft_names = draft_names or list(drafts)
+    stage_names = stage_names or [stage[0] for stage in stages]
+    results = []
+
+    def record(draft_name, size, stage, seconds, peak_bytes):
+        results.append({
+            'draft': draft_name,
+            'size': size,
+            'stage': stage,
+            'seconds': seconds,
+            'peak_bytes': peak_bytes,
+        })
+        if log:
+            if seconds is None:
+                print('%-8s %6d %-16s skipped' % (draft_name, size, stage),
+                      file=log)
+            else:
+                print('%-8s %6d %-16s %9.4fs %12d bytes' %
+                      (draft_name, size, stage, seconds, peak_bytes),
+                      file=log)
+
+    directory = mkdtemp()
+    try:
+        for draft_name in draft_names:
+            for size in sizes:
+                draft, seconds = measure(drafts[draft_name], size)
+                __, peak_bytes = measure_memory(drafts[draft_name], size)
+                record(draft_name, size, 'build', seconds, peak_bytes)
+
+                for name, func, limit, setup in stages:
+                    if name not in stage_names:
+                        continue
+                    if limit is not None and size * size > limit:
+                        record(draft_name, size, name, None, None)
+                        continue
+                    if setup:
+                        setup(draft, directory)
+                    seconds = min(measure(func, draft, directory)[1]
+                                  for __ in range(repeat))
+                    __, peak_bytes = measure_memory(func, draft, directory)
+                    record(draft_name, size, name, seconds, peak_bytes)
+    finally:
+        shutil.rmtree(directory)
+
+    return {
+        'pyweaving': __version__,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'date': datetime.datetime.now().isoformat(),
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+def main(opts):
+    """
+    Run the benchmarks with options from the ``pyweaving bench`` command,
+    writing the results as JSON.
+    """
+    ret = run(draft_names=opts.drafts,
+              sizes=opts.sizes,
+              stage_names=opts.stages,
+              repeat=opts.repeat,
+              log=sys.stderr)
+    if opts.output:
+        with open(opts.output, 'w') as f:
+            json.dump(ret, f, indent=2)
+    else:
+        json.dump(ret, sys.stdout, indent=2)
+        print()
@@ -0,0 +1,211 @@
+"""
+A compact binary container for drafts, which can be loaded by memory-mapping
+the file so that only the parts of a very large draft that are used are read
+from disk.
+
+The file starts with a fixed size header, followed by each section in turn
+with no padding between them:
+
+- Threading: one little-endian int32 shaft index per warp thread (-1 for an
+  unthreaded end).
+- Warp colors, then weft colors: one little-endian int32 palette index per
+  thread (-1 for no color).
+- Palette: three bytes (R, G, B) per color.
+- Liftplan, then treadling: one row per pick, packed as in ``CompactDraft``.
+- Tie-up: one packed row of shafts per treadle.
+- Metadata: the remaining draft attributes, as UTF-8 encoded JSON.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import io
+import sys
+import json
+import mmap
+import struct
+from array import array
+
+from . import Color
+from .compact import CompactDraft, pack_mask, unpack_mask
+
+
+MAGIC = b'PYWV'
+VERSION = 1
+
+# magic, version, flags, shafts, treadles, warp threads, weft threads,
+# colors, metadata bytes
+header_struct = struct.Struct('<4sHHIIIIII')
+
+FLAG_RISING_SHED = 1 << 0
+FLAG_LIFTPLAN = 1 << 1
+FLAG_START_AT_LOWEST_THREAD = 1 << 2
+
+metadata_fields = ('date', 'title', 'author', 'address', 'email',
+                   'telephone', 'fax', 'notes')
+
+
+def int32_bytes(values):
+    ints = array('i', values)
+    assert ints.itemsize == 4
+    if sys.byteorder != 'little':
+        ints.byteswap()
+    return ints.tobytes()
+
+
+def int32_array(buf):
+    ints = array('i')
+    assert ints.itemsize == 4
+    ints.frombytes(buf)
+    if sys.byteorder != 'little':
+        ints.byteswap()
+    return ints
+
+
+class BinaryDraftWriter(object):
+    """
+    A binary draft writer for a draft.
+    """
+    def __init__(self, draft):
+        if not isinstance(draft, CompactDraft):
+            draft = CompactDraft.from_draft(draft)
+        self.draft = draft
+
+    def write_file(self, f):
+        """
+        Write the draft to the binary file object ``f``.
+        """
+        draft = self.draft
+        metadata = json.dumps(dict((field, getattr(draft, field))
+                                   for field in metadata_fields))
+        metadata = metadata.encode('utf-8')
+
+        flags = 0
+        if draft.rising_shed:
+            flags |= FLAG_RISING_SHED
+        if draft.liftplan:
+            flags |= FLAG_LIFTPLAN
+        if draft.start_at_lowest_thread:
+            flags |= FLAG_START_AT_LOWEST_THREAD
+
+        f.write(header_struct.pack(MAGIC, VERSION, flags,
+                                   len(draft.shafts),
+                                   len(draft.treadles),
+                                   len(draft._warp_colors),
+                                   len(draft._weft_colors),
+                                   len(draft.palette),
+                                   len(metadata)))
+        f.write(int32_bytes(draft._threading))
+        f.write(int32_bytes(draft._warp_colors))
+        f.write(int32_bytes(draft._weft_colors))
+        f.write(bytes(bytearray(channel for color in draft.palette
+                                for channel in color.rgb)))
+        f.write(draft._lifts)
+        f.write(draft._treadling)
+        for mask in draft._tieup:
+            f.write(pack_mask(mask, draft._shaft_stride))
+        f.write(metadata)
+
+    def write(self, filename):
+        with io.open(filename, 'wb') as f:
+            self.write_file(f)
+
+
+class BinaryDraftReader(object):
+    """
+    A reader for a binary draft file.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+
+    def read(self, use_mmap=True):
+        """
+        Load the draft, returning a CompactDraft instance.
+
+        If ``use_mmap`` is True, the threading, colors, liftplan and
+        treadling of the draft are views into a read-only memory map of the
+        file, so loading takes constant time and pages are only read when
+        accessed. The first modification of the draft copies them into
+        memory, without altering the file. Otherwise, the whole file is read
+        into memory up front.
+        """
+        with io.open(self.filename, 'rb') as f:
+            if use_mmap:
+                buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                buf = f.read()
+        view = memoryview(buf)
+
+        if len(view) < header_struct.size:
+            raise ValueError("%r is not a binary draft file" % self.filename)
+        (magic, version, flags, num_shafts, num_treadles, num_warp, num_weft,
+         num_colors, metadata_size) = header_struct.unpack_from(view)
+        if magic != MAGIC:
+            raise ValueError("%r is not a binary draft file" % self.filename)
+        if version != VERSION:
+            raise ValueError("%r has unsupported binary draft version %d" %
+                             (self.filename, version))
+
+        draft = CompactDraft(
+            num_shafts=num_shafts,
+            num_treadles=num_treadles,
+            rising_shed=bool(flags & FLAG_RISING_SHED),
+            liftplan=bool(flags & FLAG_LIFTPLAN),
+            start_at_lowest_thread=bool(flags & FLAG_START_AT_LOWEST_THREAD))
+
+        sizes = [
+            ('threading', 4 * num_warp),
+            ('warp_colors', 4 * num_warp),
+            ('weft_colors', 4 * num_weft),
+            ('palette', 3 * num_colors),
+            ('lifts', draft._shaft_stride * num_weft),
+            ('treadling', draft._treadle_stride * num_weft),
+            ('tieup', draft._shaft_stride * num_treadles),
+            ('metadata', metadata_size),
+        ]
+        sections = {}
+        offset = header_struct.size
+        for name, size in sizes:
+            sections[name] = view[offset:offset + size]
+            offset += size
+        if offset != len(view):
+            raise ValueError("%r has %d bytes, expected %d" %
+                             (self.filename, len(view), offset))
+
+        palette = sections['palette']
+        for ii in range(0, len(palette), 3):
+            # The palette may repeat colors after a recolor, so entries are
+            # added as they are to keep thread color numbers valid.
+            color = Color(tuple(palette[ii:ii + 3]))
+            draft._palette_index.setdefault(color, len(draft.palette))
+            draft.palette.append(color)
+
+        stride = draft._shaft_stride
+        tieup = sections['tieup']
+        if stride:
+            draft._tieup = [unpack_mask(tieup[ii:ii + stride])
+                            for ii in range(0, len(tieup), stride)]
+        else:
+            # With no shafts, the tieup takes no bytes.
+            draft._tieup = [0] * num_treadles
+
+        if use_mmap and sys.byteorder == 'little':
+            draft._threading = sections['threading'].cast('i')
+            draft._warp_colors = sections['warp_colors'].cast('i')
+            draft._weft_colors = sections['weft_colors'].cast('i')
+            draft._lifts = sections['lifts']
+            draft._treadling = sections['treadling']
+            # Keep the mapping open for as long as the draft is.
+            draft._mmap = buf
+            draft._shared = True
+        else:
+            draft._threading = int32_array(sections['threading'])
+            draft._warp_colors = int32_array(sections['warp_colors'])
+            draft._weft_colors = int32_array(sections['weft_colors'])
+            draft._lifts = bytearray(sections['lifts'])
+            draft._treadling = bytearray(sections['treadling'])
+
+        metadata = json.loads(bytes(sections['metadata']).decode('utf-8'))
+        for field in metadata_fields:
+            if field in metadata:
+                setattr(draft, field, metadata[field])
+        return draft
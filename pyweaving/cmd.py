@@ -4,32 +4,37 @@ from __future__ import (absolute_import, division, print_function,
 import sys
 import argparse
 
-from . import Draft, instructions
-from .wif import WIFReader, WIFWriter
-from .render import ImageRenderer, SVGRenderer
+from . import Draft, instructions, bench
+from .wif import FastWIFReader, WIFWriter
+from .binary import BinaryDraftReader, BinaryDraftWriter
+from .render import ImageRenderer, SVGRenderer, TiledImageRenderer
 
 
 def load_draft(infile):
     if infile.endswith('.wif'):
-        return WIFReader(infile).read()
+        return FastWIFReader(infile).read()
     elif infile.endswith('.json'):
         with open(infile) as f:
-            return Draft.from_json(f.read())
+            return Draft.read_json(f)
+    elif infile.endswith('.pwb'):
+        return BinaryDraftReader(infile).read()
     else:
         raise ValueError(
-            "filename %r unrecognized: .wif and .json are supported" %
+            "filename %r unrecognized: .wif, .json and .pwb are supported" %
             infile)
 
 
 def render(opts):
     draft = load_draft(opts.infile)
-    if opts.outfile:
+    if opts.tiles:
+        TiledImageRenderer(draft).save(opts.outfile, pyramid=opts.pyramid)
+    elif opts.outfile:
         if opts.outfile.endswith('.svg'):
             SVGRenderer(draft).save(opts.outfile)
         else:
-            ImageRenderer(draft).save(opts.outfile)
+            ImageRenderer(draft, crossings=opts.crossings).save(opts.outfile)
     else:
-        ImageRenderer(draft).show()
+        ImageRenderer(draft, crossings=opts.crossings).show()
 
 
 def convert(opts):
@@ -39,6 +44,8 @@ def convert(opts):
     elif opts.outfile.endswith('.json'):
         with open(opts.outfile, 'w') as f:
             f.write(draft.to_json())
+    elif opts.outfile.endswith('.pwb'):
+        BinaryDraftWriter(draft).write(opts.outfile)
 
 
 def thread(opts):
@@ -66,6 +73,8 @@ def tieup(opts):
 def stats(opts):
     draft = load_draft(opts.infile)
     warp_longest, weft_longest = draft.compute_longest_floats()
+    warp_crossings, weft_crossings = draft.compute_crossings()
+    repeats = draft.find_repeats()
     print("Title:", draft.title)
     print("Author:", draft.author)
     print("Address:", draft.address)
@@ -81,6 +90,19 @@ def stats(opts):
     print("Treadles:", len(draft.treadles))
     print("Longest Float (Warp):", warp_longest)
     print("Longest Float (Weft):", weft_longest)
+    print("Most Crossings (Warp):", warp_crossings.max(initial=0))
+    print("Most Crossings (Weft):", weft_crossings.max(initial=0))
+    print("All Threads Attached:", draft.all_threads_attached())
+    print("Threading Repeat:", repeats.threading)
+    print("Treadling Repeat:", repeats.treadling)
+    print("Warp Repeat (with colors):", repeats.warp)
+    print("Weft Repeat (with colors):", repeats.weft)
+
+
+def comma_list(type):
+    def parse(value):
+        return [type(item) for item in value.split(',')]
+    return parse
 
 
 def main(argv=sys.argv):
@@ -93,6 +115,12 @@ def main(argv=sys.argv):
     p_render.add_argument('infile')
     p_render.add_argument('outfile', nargs='?')
     p_render.add_argument('--liftplan', action='store_true')
+    p_render.add_argument('--crossings', action='store_true',
+                          help='Add bar graphs of the thread crossings.')
+    p_render.add_argument('--tiles', action='store_true',
+                          help='Write the drawdown as tiles to a directory.')
+    p_render.add_argument('--pyramid', action='store_true',
+                          help='With --tiles, also write lower zoom levels.')
     p_render.set_defaults(function=render)
 
     p_convert = subparsers.add_parser(
@@ -131,5 +159,26 @@ def main(argv=sys.argv):
     p_stats.add_argument('infile')
     p_stats.set_defaults(function=stats)
 
+    p_bench = subparsers.add_parser(
+        'bench',
+        help='Run performance benchmarks, writing the results as JSON.')
+    p_bench.add_argument('--drafts', type=comma_list(str),
+                         help='Comma-separated synthetic drafts to use, '
+                         'from: %s.' % ', '.join(sorted(bench.drafts)))
+    p_bench.add_argument('--sizes', type=comma_list(int),
+                         default=[100, 1000, 20000],
+                         help='Comma-separated numbers of warp and weft '
+                         'threads.')
+    p_bench.add_argument('--stages', type=comma_list(str),
+                         help='Comma-separated stages to run, from: %s.' %
+                         ', '.join(stage[0] for stage in bench.stages))
+    p_bench.add_argument('--repeat', type=int, default=1,
+                         help='Report the best time of this many runs.')
+    p_bench.add_argument('-o', '--output',
+                         help='Write results to a file instead of stdout.')
+    p_bench.set_defaults(function=bench.main)
+
     opts, args = p.parse_known_args(argv[1:])
+    if getattr(opts, 'tiles', False) and not opts.outfile:
+        p_render.error("an output directory is required with --tiles")
     return opts.function(opts)
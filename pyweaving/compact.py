@@ -0,0 +1,748 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+from array import array
+from collections.abc import MutableSet, Sequence
+
+import numpy as np
+
+from . import Draft, WarpThread, WeftThread, Shaft, Treadle, Color
+from .drawdown import iter_bits
+
+
+def pack_mask(mask, stride):
+    """
+    Pack an integer bitmask into ``stride`` bytes, least significant bit first.
+    This is the same layout produced by ``numpy.packbits(...,
+    bitorder='little')``, so a row of packed bytes and a Python int bitmask are
+    interchangeable.
+    """
+    return bytearray(mask.to_bytes(stride, 'little'))
+
+
+def unpack_mask(row):
+    """
+    Counterpart to ``pack_mask()``.
+    """
+    return int.from_bytes(bytes(row), 'little')
+
+
+class BitSetView(MutableSet):
+    """
+    A live set of shafts or treadles backed by an integer bitmask. Used to
+    preserve the ``.shafts`` and ``.treadles`` set APIs of threads and treadles
+    in a compact draft.
+    """
+    def __init__(self, get_mask, set_mask, objs, index_map):
+        self.get_mask = get_mask
+        self.set_mask = set_mask
+        self.objs = objs
+        self.index_map = index_map
+
+    @classmethod
+    def _from_iterable(cls, it):
+        return set(it)
+
+    def index_of(self, obj):
+        if isinstance(obj, int):
+            return obj
+        return self.index_map[obj]
+
+    def __contains__(self, obj):
+        index = self.index_map.get(obj)
+        if index is None:
+            return False
+        return bool((self.get_mask() >> index) & 1)
+
+    def __iter__(self):
+        for index in iter_bits(self.get_mask()):
+            yield self.objs[index]
+
+    def __len__(self):
+        return bin(self.get_mask()).count('1')
+
+    def add(self, obj):
+        self.set_mask(self.get_mask() | (1 << self.index_of(obj)))
+
+    def discard(self, obj):
+        index = self.index_map.get(obj)
+        if index is not None:
+            self.set_mask(self.get_mask() & ~(1 << index))
+
+    def __repr__(self):
+        return '<BitSetView %s>' % list(iter_bits(self.get_mask()))
+
+
+class CompactWarpThread(WarpThread):
+    """
+    A view of a single warp thread in a ``CompactDraft``.
+    """
+    __slots__ = ('draft', 'index')
+
+    def __init__(self, draft, index):
+        self.draft = draft
+        self.index = index
+
+    @property
+    def color(self):
+        return self.draft.get_color(self.draft._warp_colors[self.index])
+
+    @color.setter
+    def color(self, color):
+        self.draft.unshare()
+        self.draft._warp_colors[self.index] = self.draft.color_number(color)
+
+    @property
+    def shaft(self):
+        shaft_no = self.draft._threading[self.index]
+        if shaft_no < 0:
+            return None
+        return self.draft.shafts[shaft_no]
+
+    @shaft.setter
+    def shaft(self, shaft):
+        self.draft.unshare()
+        self.draft._threading[self.index] = self.draft.shaft_number(shaft)
+
+    def __eq__(self, other):
+        return (isinstance(other, CompactWarpThread) and
+                other.draft is self.draft and other.index == self.index)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((id(self.draft), 'warp', self.index))
+
+
+class CompactWeftThread(WeftThread):
+    """
+    A view of a single weft thread in a ``CompactDraft``.
+    """
+    __slots__ = ('draft', 'index')
+
+    def __init__(self, draft, index):
+        self.draft = draft
+        self.index = index
+
+    @property
+    def color(self):
+        return self.draft.get_color(self.draft._weft_colors[self.index])
+
+    @color.setter
+    def color(self, color):
+        self.draft.unshare()
+        self.draft._weft_colors[self.index] = self.draft.color_number(color)
+
+    def get_lift_mask(self):
+        return self.draft.get_row(self.draft._lifts,
+                                  self.draft._shaft_stride, self.index)
+
+    def set_lift_mask(self, mask):
+        self.draft.unshare()
+        self.draft.set_row(self.draft._lifts,
+                           self.draft._shaft_stride, self.index, mask)
+
+    def get_treadle_mask(self):
+        return self.draft.get_row(self.draft._treadling,
+                                  self.draft._treadle_stride, self.index)
+
+    def set_treadle_mask(self, mask):
+        self.draft.unshare()
+        self.draft.set_row(self.draft._treadling,
+                           self.draft._treadle_stride, self.index, mask)
+
+    @property
+    def shafts(self):
+        return BitSetView(self.get_lift_mask, self.set_lift_mask,
+                          self.draft.shafts, self.draft._shaft_index)
+
+    @shafts.setter
+    def shafts(self, shafts):
+        self.set_lift_mask(self.draft.shaft_mask(shafts))
+
+    @property
+    def treadles(self):
+        return BitSetView(self.get_treadle_mask, self.set_treadle_mask,
+                          self.draft.treadles, self.draft._treadle_index)
+
+    @treadles.setter
+    def treadles(self, treadles):
+        self.set_treadle_mask(self.draft.treadle_mask(treadles))
+
+    @property
+    def connected_shafts(self):
+        return set(self.draft.shafts[index] for index in
+                   iter_bits(self.draft.lift_mask(self.index)))
+
+    def __repr__(self):
+        if self.get_treadle_mask():
+            return '<WeftThread color:%s treadles:%s>' % (self.color.rgb,
+                                                          self.treadles)
+        else:
+            return '<WeftThread color:%s shafts:%s>' % (self.color.rgb,
+                                                        self.shafts)
+
+    def __eq__(self, other):
+        return (isinstance(other, CompactWeftThread) and
+                other.draft is self.draft and other.index == self.index)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((id(self.draft), 'weft', self.index))
+
+
+class CompactTreadle(Treadle):
+    """
+    A view of a single treadle in a ``CompactDraft``. The tie-up for each
+    treadle is stored as a bitmask of shaft indexes.
+    """
+    __slots__ = ('draft', 'index')
+
+    def __init__(self, draft, index):
+        self.draft = draft
+        self.index = index
+
+    def get_mask(self):
+        return self.draft._tieup[self.index]
+
+    def set_mask(self, mask):
+        self.draft._tieup[self.index] = mask
+
+    @property
+    def shafts(self):
+        return BitSetView(self.get_mask, self.set_mask,
+                          self.draft.shafts, self.draft._shaft_index)
+
+    @shafts.setter
+    def shafts(self, shafts):
+        self.set_mask(self.draft.shaft_mask(shafts))
+
+
+class ThreadSequence(Sequence):
+    """
+    A read-only sequence of thread views, standing in for the ``.warp`` and
+    ``.weft`` lists of a regular draft.
+    """
+    def __init__(self, draft, thread_class, colors):
+        self.draft = draft
+        self.thread_class = thread_class
+        self.colors = colors
+
+    def __len__(self):
+        return len(self.colors)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.thread_class(self.draft, ii)
+                    for ii in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('thread index out of range')
+        return self.thread_class(self.draft, index)
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+class CompactDraft(Draft):
+    """
+    A draft which stores its threads in packed arrays instead of one object
+    per thread, for very large drafts.
+
+    Threading is stored as an array of shaft indexes, the liftplan and
+    treadling as packed bit matrices (one row per pick), the tie-up as a
+    bitmask of shafts per treadle, and thread colors as indexes into
+    ``.palette``. The ``.warp`` and ``.weft`` attributes are sequences of
+    lightweight views over that storage, so code written against ``Draft``
+    continues to work.
+    """
+    _shared = False
+    # Shadows the property of Draft: a compact draft stores its palette.
+    palette = None
+
+    def __init__(self, num_shafts, num_treadles=0, **kwargs):
+        self.palette = []
+        self._palette_index = {}
+        self._shaft_stride = (num_shafts + 7) // 8
+        self._treadle_stride = (num_treadles + 7) // 8
+        self._threading = array('i')
+        self._warp_colors = array('i')
+        self._weft_colors = array('i')
+        self._lifts = bytearray()
+        self._treadling = bytearray()
+        self._tieup = [0] * num_treadles
+
+        Draft.__init__(self, num_shafts, num_treadles, **kwargs)
+
+        self._shaft_index = dict((shaft, ii)
+                                 for ii, shaft in enumerate(self.shafts))
+        self.treadles = [CompactTreadle(self, ii)
+                         for ii in range(num_treadles)]
+        self._treadle_index = dict((treadle, ii)
+                                   for ii, treadle in enumerate(self.treadles))
+
+    @classmethod
+    def from_draft(cls, draft):
+        """
+        Construct a new CompactDraft containing the same threads and metadata
+        as an existing draft.
+        """
+        new = cls(num_shafts=len(draft.shafts),
+                  num_treadles=len(draft.treadles),
+                  liftplan=draft.liftplan,
+                  rising_shed=draft.rising_shed,
+                  start_at_lowest_thread=draft.start_at_lowest_thread,
+                  date=draft.date,
+                  title=draft.title,
+                  author=draft.author,
+                  address=draft.address,
+                  email=draft.email,
+                  telephone=draft.telephone,
+                  fax=draft.fax,
+                  notes=draft.notes)
+        shaft_map = dict(zip(draft.shafts, new.shafts))
+        treadle_map = dict(zip(draft.treadles, new.treadles))
+
+        for old, treadle in zip(draft.treadles, new.treadles):
+            treadle.shafts = [shaft_map[shaft] for shaft in old.shafts]
+
+        for thread in draft.warp:
+            new.add_warp_thread(
+                color=thread.color,
+                shaft=shaft_map.get(thread.shaft, -1),
+            )
+
+        for thread in draft.weft:
+            new.add_weft_thread(
+                color=thread.color,
+                shafts=[shaft_map[shaft] for shaft in thread.shafts],
+                treadles=[treadle_map[treadle] for treadle in thread.treadles],
+            )
+
+        return new
+
+    def copy(self, copy_on_write=False):
+        """
+        Make a complete copy of this draft, by copying its packed storage.
+
+        If ``copy_on_write`` is True, the storage is instead shared between the
+        two drafts until either of them is modified, at which point that
+        draft takes its own copy.
+        """
+        new = self.__class__.__new__(self.__class__)
+        new.__dict__.update(self.__dict__)
+        new.palette = list(self.palette)
+        new._palette_index = dict(self._palette_index)
+        new._tieup = list(self._tieup)
+        new._lift_cache = None
+        new.shafts = [Shaft() for __ in self.shafts]
+        new._shaft_index = dict((shaft, ii)
+                                for ii, shaft in enumerate(new.shafts))
+        new.treadles = [CompactTreadle(new, ii)
+                        for ii in range(len(self.treadles))]
+        new._treadle_index = dict((treadle, ii)
+                                  for ii, treadle in enumerate(new.treadles))
+        if copy_on_write:
+            self._shared = new._shared = True
+        else:
+            new._shared = True
+            new.unshare()
+        return new
+
+    def unshare(self):
+        """
+        Take a private, resizable copy of the thread storage if it is shared
+        with another draft (after ``.copy(copy_on_write=True)``) or is a view
+        of a memory-mapped file. Called before any modification.
+        """
+        if not self._shared:
+            return
+        for name in ('_threading', '_warp_colors', '_weft_colors'):
+            ints = array('i')
+            ints.frombytes(memoryview(getattr(self, name)).cast('B'))
+            setattr(self, name, ints)
+        self._lifts = bytearray(self._lifts)
+        self._treadling = bytearray(self._treadling)
+        self._shared = False
+
+    @property
+    def warp(self):
+        return ThreadSequence(self, CompactWarpThread, self._warp_colors)
+
+    @warp.setter
+    def warp(self, threads):
+        threads = [(thread.color, thread.shaft) for thread in threads]
+        self.unshare()
+        del self._threading[:]
+        del self._warp_colors[:]
+        for color, shaft in threads:
+            self.add_warp_thread(color=color, shaft=shaft)
+
+    @property
+    def weft(self):
+        return ThreadSequence(self, CompactWeftThread, self._weft_colors)
+
+    @weft.setter
+    def weft(self, threads):
+        threads = [(thread.color, list(thread.shafts), list(thread.treadles))
+                   for thread in threads]
+        self.unshare()
+        del self._weft_colors[:]
+        del self._lifts[:]
+        del self._treadling[:]
+        for color, shafts, treadles in threads:
+            self.add_weft_thread(color=color, shafts=shafts,
+                                 treadles=treadles)
+
+    def color_number(self, color):
+        """
+        Return the palette index for ``color``, adding it to the palette if
+        necessary. ``None`` is stored as -1.
+        """
+        if color is None:
+            return -1
+        color = Color(color)
+        try:
+            return self._palette_index[color]
+        except KeyError:
+            index = self._palette_index[color] = len(self.palette)
+            self.palette.append(color)
+            return index
+
+    def recolor(self, old, new):
+        """
+        Change every thread of color ``old`` to color ``new``, by replacing it
+        in the palette.
+        """
+        old = Color(old)
+        new = Color(new)
+        for ii, color in enumerate(self.palette):
+            if color is old:
+                self.palette[ii] = new
+                self._palette_index.setdefault(new, ii)
+        self._palette_index.pop(old, None)
+
+    def get_color(self, index):
+        if index < 0:
+            return None
+        return self.palette[index]
+
+    def shaft_number(self, shaft):
+        """
+        Return the index of a shaft, which may be given as a ``Shaft`` or an
+        integer. An unthreaded end (``None``) is stored as -1.
+        """
+        if shaft is None:
+            return -1
+        if isinstance(shaft, Shaft):
+            return self._shaft_index[shaft]
+        return shaft
+
+    def shaft_mask(self, shafts):
+        mask = 0
+        for shaft in shafts or ():
+            mask |= 1 << self.shaft_number(shaft)
+        return mask
+
+    def treadle_mask(self, treadles):
+        mask = 0
+        for treadle in treadles or ():
+            if isinstance(treadle, Treadle):
+                treadle = self._treadle_index[treadle]
+            mask |= 1 << treadle
+        return mask
+
+    def get_row(self, matrix, stride, index):
+        start = index * stride
+        return unpack_mask(matrix[start:start + stride])
+
+    def set_row(self, matrix, stride, index, mask):
+        start = index * stride
+        matrix[start:start + stride] = pack_mask(mask, stride)
+
+    def lift_mask(self, index):
+        """
+        Return the bitmask of shafts lifted on the weft pick at ``index``,
+        resolving treadling through the tie-up.
+        """
+        mask = self.get_row(self._lifts, self._shaft_stride, index)
+        treadles = self.get_row(self._treadling, self._treadle_stride, index)
+        for treadle_no in iter_bits(treadles):
+            mask |= self._tieup[treadle_no]
+        return mask
+
+    def lift_masks(self):
+        return [self.lift_mask(ii) for ii in range(len(self._weft_colors))]
+
+    def restride(self, matrix, old_stride, new_stride):
+        """
+        Return a copy of a packed matrix with each row widened to
+        ``new_stride`` bytes.
+        """
+        rows = len(self._weft_colors)
+        packed = np.zeros((rows, new_stride), dtype=np.uint8)
+        packed[:, :old_stride] = np.frombuffer(
+            bytes(matrix), dtype=np.uint8).reshape(rows, old_stride)
+        return bytearray(packed.tobytes())
+
+    def add_shaft(self):
+        self.unshare()
+        stride = (len(self.shafts) + 8) // 8
+        if stride != self._shaft_stride:
+            self._lifts = self.restride(self._lifts, self._shaft_stride,
+                                        stride)
+            self._shaft_stride = stride
+        shaft = Shaft()
+        self._shaft_index[shaft] = len(self.shafts)
+        self.shafts.append(shaft)
+        return shaft
+
+    def add_treadle(self, shafts=None):
+        self.unshare()
+        stride = (len(self.treadles) + 8) // 8
+        if stride != self._treadle_stride:
+            self._treadling = self.restride(self._treadling,
+                                            self._treadle_stride, stride)
+            self._treadle_stride = stride
+        treadle = CompactTreadle(self, len(self.treadles))
+        self._tieup.append(self.shaft_mask(shafts))
+        self._treadle_index[treadle] = treadle.index
+        self.treadles.append(treadle)
+        return treadle
+
+    def remap_shafts(self, mapping):
+        self.unshare()
+        mapping = np.asarray(mapping, dtype=np.intp)
+        num_shafts = int(mapping.max()) + 1 if mapping.size else 0
+        new_shafts = [None] * num_shafts
+        for shaft, new_no in zip(self.shafts, mapping.tolist()):
+            if new_no >= 0 and new_shafts[new_no] is None:
+                new_shafts[new_no] = shaft
+        assert None not in new_shafts, "shaft numbers must be contiguous"
+
+        threading = np.array(self._threading, dtype=np.intp)
+        threaded = threading >= 0
+        threading[threaded] = mapping[threading[threaded]]
+        self._threading = array('i', threading.tolist())
+
+        lifts = self.unpack_matrix(self._lifts, self._shaft_stride,
+                                   len(self.shafts))
+        new_lifts = np.zeros((len(lifts), num_shafts), dtype=bool)
+        for old_no, new_no in enumerate(mapping.tolist()):
+            if new_no >= 0:
+                new_lifts[:, new_no] |= lifts[:, old_no]
+        self._lifts = bytearray(np.packbits(new_lifts, axis=1,
+                                            bitorder='little').tobytes())
+
+        for ii, mask in enumerate(self._tieup):
+            new_mask = 0
+            for old_no in iter_bits(mask):
+                if mapping[old_no] >= 0:
+                    new_mask |= 1 << int(mapping[old_no])
+            self._tieup[ii] = new_mask
+
+        self.shafts = new_shafts
+        self._shaft_stride = (num_shafts + 7) // 8
+        self._shaft_index = dict((shaft, ii)
+                                 for ii, shaft in enumerate(self.shafts))
+
+    def remap_treadles(self, mapping):
+        self.unshare()
+        mapping = np.asarray(mapping, dtype=np.intp)
+        num_treadles = int(mapping.max()) + 1 if mapping.size else 0
+        tieup = [0] * num_treadles
+        for mask, new_no in zip(self._tieup, mapping.tolist()):
+            if new_no >= 0:
+                tieup[new_no] |= mask
+        treadling = self.treadling_array()
+        new_treadling = np.zeros((len(treadling), num_treadles), dtype=bool)
+        for old_no, new_no in enumerate(mapping.tolist()):
+            if new_no >= 0:
+                new_treadling[:, new_no] |= treadling[:, old_no]
+        self._treadle_stride = (num_treadles + 7) // 8
+        self._treadling = bytearray(np.packbits(
+            new_treadling, axis=1, bitorder='little').tobytes())
+        self._tieup = tieup
+        self.treadles = [CompactTreadle(self, ii)
+                         for ii in range(num_treadles)]
+        self._treadle_index = dict((treadle, ii)
+                                   for ii, treadle in enumerate(self.treadles))
+
+    def replace_treadles(self, tieup, treadling):
+        self.unshare()
+        self._treadle_stride = (len(tieup) + 7) // 8
+        self._tieup = list(tieup)
+        self.treadles = [CompactTreadle(self, ii) for ii in range(len(tieup))]
+        self._treadle_index = dict((treadle, ii)
+                                   for ii, treadle in enumerate(self.treadles))
+        self._treadling = bytearray(b''.join(
+            pack_mask(mask, self._treadle_stride) for mask in treadling))
+        self._lifts = bytearray(len(self._lifts))
+
+    def pick_masks(self):
+        picks = range(len(self._weft_colors))
+        return ([self.get_row(self._lifts, self._shaft_stride, ii)
+                 for ii in picks],
+                [self.get_row(self._treadling, self._treadle_stride, ii)
+                 for ii in picks])
+
+    def tieup_masks(self):
+        return list(self._tieup)
+
+    def add_warp_thread(self, color=None, index=None, shaft=0):
+        """
+        Add a warp thread to this draft.
+        """
+        self.unshare()
+        shaft_no = self.shaft_number(shaft)
+        color_no = self.color_number(color)
+        if index is None:
+            self._threading.append(shaft_no)
+            self._warp_colors.append(color_no)
+        else:
+            self._threading.insert(index, shaft_no)
+            self._warp_colors.insert(index, color_no)
+
+    def add_weft_thread(self, color=None, index=None,
+                        shafts=None, treadles=None):
+        """
+        Add a weft thread to this draft.
+        """
+        assert not (shafts and treadles), \
+            "can't have both shafts (liftplan) and treadles specified"
+        lift_row = pack_mask(self.shaft_mask(shafts), self._shaft_stride)
+        treadle_row = pack_mask(self.treadle_mask(treadles),
+                                self._treadle_stride)
+        color_no = self.color_number(color)
+        self.unshare()
+        if index is None:
+            self._weft_colors.append(color_no)
+            self._lifts.extend(lift_row)
+            self._treadling.extend(treadle_row)
+        else:
+            if index < 0:
+                index = max(0, len(self._weft_colors) + index)
+            index = min(index, len(self._weft_colors))
+            self._weft_colors.insert(index, color_no)
+            start = index * self._shaft_stride
+            self._lifts[start:start] = lift_row
+            start = index * self._treadle_stride
+            self._treadling[start:start] = treadle_row
+
+    def extend_warp(self, shafts, colors):
+        """
+        Append warp threads in bulk, given a sequence of shaft indexes and a
+        sequence of palette indexes.
+        """
+        assert len(shafts) == len(colors)
+        self.unshare()
+        self._threading.extend(shafts)
+        self._warp_colors.extend(colors)
+
+    def extend_weft(self, colors, lifts, treadles):
+        """
+        Append weft threads in bulk, given a sequence of palette indexes and
+        sequences of shaft and treadle bitmasks for each pick. The shafts and
+        treadles may instead be given as boolean matrices with a row for each
+        pick, which are packed without converting each row to a bitmask.
+        """
+        assert len(colors) == len(lifts) == len(treadles)
+        self.unshare()
+        self._weft_colors.extend(colors)
+        self._lifts.extend(self.pack_rows(lifts, self._shaft_stride))
+        self._treadling.extend(self.pack_rows(treadles, self._treadle_stride))
+
+    def pack_rows(self, rows, stride):
+        """
+        Pack a sequence of bitmasks, or a boolean matrix, into rows of
+        ``stride`` bytes.
+        """
+        if isinstance(rows, np.ndarray):
+            packed = np.zeros((len(rows), stride), dtype=np.uint8)
+            packed[:, :(rows.shape[1] + 7) // 8] = np.packbits(
+                rows, axis=1, bitorder='little')
+            return packed.tobytes()
+        return b''.join(pack_mask(mask, stride) for mask in rows)
+
+    def threading_array(self):
+        return np.array(self._threading, dtype=np.intp)
+
+    def unpack_matrix(self, matrix, stride, width):
+        rows = len(self._weft_colors)
+        packed = np.frombuffer(bytes(matrix), dtype=np.uint8)
+        packed = packed.reshape(rows, stride)
+        return np.unpackbits(packed, axis=1, count=width,
+                             bitorder='little').astype(bool)
+
+    def treadling_array(self):
+        """
+        Return the treadling as a boolean matrix of shape (picks, treadles).
+        """
+        return self.unpack_matrix(self._treadling, self._treadle_stride,
+                                  len(self.treadles))
+
+    def tieup_array(self):
+        """
+        Return the tie-up as a boolean matrix of shape (treadles, shafts).
+        """
+        num_shafts = len(self.shafts)
+        packed = np.frombuffer(
+            b''.join(bytes(pack_mask(mask, self._shaft_stride))
+                     for mask in self._tieup),
+            dtype=np.uint8).reshape(len(self._tieup), self._shaft_stride)
+        return np.unpackbits(packed, axis=1, count=num_shafts,
+                             bitorder='little').astype(bool)
+
+    def liftplan_array(self):
+        lifts = self.unpack_matrix(self._lifts, self._shaft_stride,
+                                   len(self.shafts))
+        if self.treadles:
+            treadling = self.treadling_array().astype(np.uint8)
+            tieup = self.tieup_array().astype(np.uint8)
+            lifts |= np.dot(treadling, tieup) > 0
+        return lifts
+
+    def flip_weftwise(self):
+        self.unshare()
+        self._threading.reverse()
+        self._warp_colors.reverse()
+
+    def flip_warpwise(self):
+        self.unshare()
+        self._weft_colors.reverse()
+        for matrix, stride in ((self._lifts, self._shaft_stride),
+                               (self._treadling, self._treadle_stride)):
+            if stride:
+                rows = np.frombuffer(bytes(matrix), dtype=np.uint8)
+                matrix[:] = rows.reshape(-1, stride)[::-1].tobytes()
+
+    def reduce_active_treadles(self):
+        if self.liftplan:
+            raise ValueError("can't reduce treadles on a liftplan draft")
+        combos = {}
+        picks = []
+        for ii in range(len(self._weft_colors)):
+            mask = self.lift_mask(ii)
+            picks.append(combos.setdefault(mask, len(combos)))
+        self._tieup = [0] * len(combos)
+        for mask, treadle_no in combos.items():
+            self._tieup[treadle_no] = mask
+        self.treadles = [CompactTreadle(self, ii) for ii in range(len(combos))]
+        self._treadle_index = dict((treadle, ii)
+                                   for ii, treadle in enumerate(self.treadles))
+        self._treadle_stride = (len(combos) + 7) // 8
+        self._lifts = bytearray(len(picks) * self._shaft_stride)
+        self._treadling = bytearray()
+        for treadle_no in picks:
+            self._treadling.extend(pack_mask(1 << treadle_no,
+                                             self._treadle_stride))
@@ -0,0 +1,570 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+from collections import namedtuple
+
+import numpy as np
+
+
+FloatArrays = namedtuple('FloatArrays',
+                         ['start', 'end', 'visible', 'length', 'thread'])
+FloatArrays.__doc__ = """
+Columnar description of a set of floats. ``start`` and ``end`` are integer
+arrays of shape (floats, 2) holding (x, y) positions, ``visible`` is a boolean
+array indicating whether the float is on the face of the fabric, ``length`` is
+the distance from start to end, and ``thread`` is the index of the thread
+forming each float.
+"""
+
+
+def masks_to_array(masks, width):
+    """
+    Convert a sequence of integer bitmasks into a boolean matrix of shape
+    (len(masks), width), where bit ``n`` of each mask becomes column ``n``.
+    """
+    stride = (width + 7) // 8
+    packed = np.frombuffer(b''.join(mask.to_bytes(stride, 'little')
+                                    for mask in masks), dtype=np.uint8)
+    packed = packed.reshape(len(masks), stride)
+    return np.unpackbits(packed, axis=1, count=width,
+                         bitorder='little').astype(bool)
+
+
+def iter_bits(mask):
+    """
+    Iterate over the indexes of the set bits in an integer bitmask, lowest
+    first.
+    """
+    index = 0
+    while mask:
+        if mask & 1:
+            yield index
+        mask >>= 1
+        index += 1
+
+
+def rotate_mask(mask, offset, width):
+    """
+    Rotate the lowest ``width`` bits of an integer bitmask by ``offset``
+    positions, so that bit ``n`` moves to bit ``(n + offset) % width``.
+    """
+    if not width:
+        return mask
+    offset %= width
+    full = (1 << width) - 1
+    return ((mask << offset) | (mask >> (width - offset))) & full
+
+
+def compute_drawdown_array(threading, lifts, rising_shed=True):
+    """
+    Compute the drawdown of a draft as a boolean matrix of shape (warp
+    threads, weft threads), which is True wherever the warp thread is on top.
+
+    ``threading`` is an integer array giving the shaft index of each warp
+    thread (-1 for an unthreaded end), and ``lifts`` is a boolean matrix of
+    shape (picks, shafts) giving the shafts raised on each pick. This is the
+    product of the threading (as a one-hot matrix) with the liftplan, computed
+    as a row gather since each end is threaded on at most one shaft.
+    """
+    threading = np.asarray(threading, dtype=np.intp)
+    lifts = np.asarray(lifts, dtype=bool)
+    num_picks, num_shafts = lifts.shape
+    # The extra all-False row at the end is selected by unthreaded (-1) ends,
+    # which are never lifted.
+    by_shaft = np.zeros((num_shafts + 1, num_picks), dtype=bool)
+    by_shaft[:num_shafts] = lifts.T
+    lifted = by_shaft[threading]
+    if not rising_shed:
+        np.logical_not(lifted, out=lifted)
+    return lifted
+
+
+def find_runs(matrix):
+    """
+    Run-length encode every row of a 2D boolean matrix. Returns a tuple of
+    arrays ``(rows, starts, ends, values)`` with one entry per run, ordered by
+    row and then by position within the row. ``ends`` are inclusive.
+    """
+    num_rows, num_cols = matrix.shape
+    if num_cols == 0:
+        empty = np.zeros(0, dtype=np.intp)
+        return empty, empty, empty, np.zeros(0, dtype=bool)
+    change = matrix[:, 1:] != matrix[:, :-1]
+    start_mask = np.ones(matrix.shape, dtype=bool)
+    start_mask[:, 1:] = change
+    end_mask = np.ones(matrix.shape, dtype=bool)
+    end_mask[:, :-1] = change
+    rows, starts = np.nonzero(start_mask)
+    __, ends = np.nonzero(end_mask)
+    return rows, starts, ends, matrix[rows, starts]
+
+
+def compute_float_arrays(drawdown):
+    """
+    Find every float in a drawdown array, as computed by
+    ``compute_drawdown_array()``. Returns a pair of ``FloatArrays``, for the
+    warp and weft floats respectively, in the same order as
+    ``Draft.compute_floats()``.
+    """
+    xs, starts, ends, values = find_runs(drawdown)
+    warp = FloatArrays(
+        start=np.column_stack((xs, starts)),
+        end=np.column_stack((xs, ends)),
+        visible=values,
+        length=ends - starts,
+        thread=xs,
+    )
+
+    ys, starts, ends, values = find_runs(drawdown.T)
+    weft = FloatArrays(
+        start=np.column_stack((starts, ys)),
+        end=np.column_stack((ends, ys)),
+        visible=~values,
+        length=ends - starts,
+        thread=ys,
+    )
+    return warp, weft
+
+
+def longest_run(matrix):
+    """
+    Return the length of the longest run of equal values along the rows of a
+    2D boolean matrix, or 0 if it is empty.
+    """
+    num_rows, num_cols = matrix.shape
+    if matrix.size == 0:
+        return 0
+    # Mark the start of every run, plus the end of each row, in a flattened
+    # matrix: run lengths are then the distances between marks. The distance
+    # from the end of one row to the start of the next is 1, which never
+    # exceeds a real run.
+    boundaries = np.ones((num_rows, num_cols + 1), dtype=bool)
+    np.not_equal(matrix[:, 1:], matrix[:, :-1],
+                 out=boundaries[:, 1:num_cols])
+    return int(np.diff(np.flatnonzero(boundaries)).max())
+
+
+def longest_runs(matrix):
+    """
+    Return an integer array giving the length of the longest run of equal
+    values along each row of a 2D boolean matrix.
+    """
+    num_rows, num_cols = matrix.shape
+    if num_cols == 0:
+        return np.zeros(num_rows, dtype=np.intp)
+    rows, starts, ends, __ = find_runs(matrix)
+    # Every row has at least one run, and runs are ordered by row.
+    row_starts = np.flatnonzero(np.diff(rows, prepend=-1))
+    return np.maximum.reduceat(ends - starts + 1, row_starts)
+
+
+def edge_runs(matrix):
+    """
+    Return a pair of integer arrays giving the length of the first and last
+    run of equal values along each row of a 2D boolean matrix with at least
+    one column.
+    """
+    num_rows, num_cols = matrix.shape
+    change = matrix[:, 1:] != matrix[:, :-1]
+    first = np.full(num_rows, num_cols, dtype=np.intp)
+    last = first.copy()
+    if num_cols > 1:
+        changed = change.any(axis=1)
+        first[changed] = change[changed].argmax(axis=1) + 1
+        last[changed] = change[changed, ::-1].argmax(axis=1) + 1
+    return first, last
+
+
+def compute_longest_floats(threading, lifts, rising_shed=True,
+                           block_size=1024):
+    """
+    Return a tuple of the longest warp and weft float lengths in the drawdown
+    produced by ``threading`` and ``lifts`` (see ``compute_drawdown_array()``).
+
+    The drawdown is computed ``block_size`` picks at a time and reduced as it
+    goes, so that neither the full drawdown nor the list of floats is ever
+    held in memory.
+    """
+    threading = np.asarray(threading, dtype=np.intp)
+    lifts = np.asarray(lifts, dtype=bool)
+    warp_longest = 0
+    weft_longest = 0
+    last_pick = last_runs = None
+    for start in range(0, len(lifts), block_size):
+        block = lifts[start:start + block_size]
+        # Weft floats run along the rows of the transposed drawdown, which is
+        # cheaper to gather directly than to transpose.
+        by_pick = np.zeros((len(block), block.shape[1] + 1), dtype=bool)
+        by_pick[:, :-1] = block
+        by_pick = by_pick[:, threading]
+        if not rising_shed:
+            np.logical_not(by_pick, out=by_pick)
+        weft_longest = max(weft_longest, longest_run(by_pick))
+
+        if len(threading) == 0:
+            continue
+        drawdown = compute_drawdown_array(threading, block, rising_shed)
+        warp_longest = max(warp_longest, longest_run(drawdown))
+        # Carry the floats which cross from the previous block into this one.
+        first, last = edge_runs(drawdown)
+        unbroken = first == drawdown.shape[1]
+        if last_pick is not None:
+            continued = drawdown[:, 0] == last_pick
+            first[continued] += last_runs[continued]
+            warp_longest = max(warp_longest, int(first.max()))
+        last[unbroken] = first[unbroken]
+        last_pick, last_runs = drawdown[:, -1], last
+    # Float lengths are measured from the first to the last position.
+    return max(warp_longest - 1, 0), max(weft_longest - 1, 0)
+
+
+def compute_crossings(threading, lifts, rising_shed=True, block_size=1024):
+    """
+    Return a pair of integer arrays giving the number of times each warp
+    thread and each weft thread crosses from one face of the fabric to the
+    other, in the drawdown produced by ``threading`` and ``lifts`` (see
+    ``compute_drawdown_array()``). These are the transitions along each
+    column and row of the drawdown, and are computed ``block_size`` picks at
+    a time.
+    """
+    threading = np.asarray(threading, dtype=np.intp)
+    lifts = np.asarray(lifts, dtype=bool)
+    warp_crossings = np.zeros(len(threading), dtype=np.intp)
+    weft_crossings = np.zeros(len(lifts), dtype=np.intp)
+    last_pick = None
+    for start in range(0, len(lifts), block_size):
+        drawdown = compute_drawdown_array(
+            threading, lifts[start:start + block_size], rising_shed)
+        weft_crossings[start:start + drawdown.shape[1]] = \
+            (drawdown[1:] != drawdown[:-1]).sum(axis=0)
+        warp_crossings += (drawdown[:, 1:] != drawdown[:, :-1]).sum(axis=1)
+        if last_pick is not None:
+            warp_crossings += drawdown[:, 0] != last_pick
+        last_pick = drawdown[:, -1]
+    return warp_crossings, weft_crossings
+
+
+def count_threads_below(threading, lifts, rising_shed=True):
+    """
+    Return a pair of integer arrays giving the number of weft threads beneath
+    each warp thread, and of warp threads beneath each weft thread, in the
+    drawdown produced by ``threading`` and ``lifts`` (see
+    ``compute_drawdown_array()``).
+
+    A warp thread is on top of the picks which lift its shaft, so these are
+    found from the number of picks lifting each shaft and the number of ends
+    threaded on each, in O(picks * shafts + warp threads) time and without
+    computing the drawdown.
+    """
+    threading = np.asarray(threading, dtype=np.intp)
+    lifts = np.asarray(lifts, dtype=bool)
+    num_picks, num_shafts = lifts.shape
+    threaded = threading >= 0
+    # The number of picks lifting each shaft, with a final entry for
+    # unthreaded ends, which are never lifted.
+    picks_lifting = np.zeros(num_shafts + 1, dtype=np.intp)
+    picks_lifting[:num_shafts] = np.count_nonzero(lifts, axis=0)
+    ends_on_shaft = np.bincount(threading[threaded], minlength=num_shafts)
+    warp_on_top = picks_lifting[threading]
+    weft_under = lifts.astype(np.intp).dot(ends_on_shaft[:num_shafts])
+    if not rising_shed:
+        warp_on_top = num_picks - warp_on_top
+        weft_under = len(threading) - weft_under
+    return warp_on_top, len(threading) - weft_under
+
+
+def find_layers(drawdown):
+    """
+    Split the threads of a drawdown into the layers which hold together,
+    returning a list of pairs of warp and weft index arrays. See
+    ``layers_from_counts()``.
+    """
+    num_warps = drawdown.shape[0]
+    return layers_from_counts(np.count_nonzero(drawdown, axis=1),
+                              num_warps - np.count_nonzero(drawdown, axis=0))
+
+
+def layers_from_counts(warp_below, weft_below):
+    """
+    Split the threads of a drawdown into the layers which hold together,
+    given the number of weft threads beneath each warp thread and of warp
+    threads beneath each weft thread (see ``count_threads_below()``).
+    Returns a list of pairs of warp and weft index arrays.
+
+    Two threads are in the same layer if each lies beneath the other through
+    some chain of crossings, so that neither can be lifted away from the
+    other: these are the strongly connected components of the graph of
+    crossings. A thread which never interlaces, such as a warp thread which
+    is never lifted, is a layer of its own. Layers are returned in order of
+    their first warp thread, then their first weft thread.
+
+    Every warp and weft thread cross once, so a set of ``p`` warp and ``q``
+    weft threads with nothing beneath it but its own threads is one where
+    the number of threads beneath each, summed, is ``p * q``. Such a set
+    contains the threads with the fewest threads beneath them, so ordering
+    the threads of each kind by that count, and merging the two orders by
+    count plus position, passes through every such set. The layers are the
+    steps between them. This takes O((warps + wefts) log(warps + wefts))
+    time.
+    """
+    warp_below = np.asarray(warp_below, dtype=np.intp)
+    weft_below = np.asarray(weft_below, dtype=np.intp)
+    num_warps = len(warp_below)
+    num_wefts = len(weft_below)
+    warp_order = np.argsort(warp_below, kind='stable')
+    weft_order = np.argsort(weft_below, kind='stable')
+
+    keys = np.concatenate((warp_below[warp_order] + np.arange(num_warps),
+                           weft_below[weft_order] + np.arange(num_wefts)))
+    merged = np.argsort(keys, kind='stable')
+    is_warp = merged < num_warps
+    below = np.concatenate((warp_below[warp_order],
+                            weft_below[weft_order]))[merged]
+    warps_taken = np.cumsum(is_warp)
+    wefts_taken = np.cumsum(~is_warp)
+    closed = np.flatnonzero(np.cumsum(below) == warps_taken * wefts_taken)
+
+    threads = np.concatenate((warp_order, weft_order))[merged]
+    layers = []
+    start = 0
+    for end in closed.tolist():
+        layer = slice(start, end + 1)
+        layers.append((np.sort(threads[layer][is_warp[layer]]),
+                       np.sort(threads[layer][~is_warp[layer]])))
+        start = end + 1
+    layers.sort(key=lambda layer: (layer[0][0] if len(layer[0])
+                                   else num_warps,
+                                   layer[1][0] if len(layer[1]) else 0))
+    return layers
+
+
+def minimal_period(keys):
+    """
+    Return the length of the shortest repeating unit of a sequence: the
+    smallest ``p`` such that ``keys[i] == keys[i + p]`` wherever both exist.
+    This is computed with the Knuth-Morris-Pratt prefix function, in linear
+    time. The last repeat of the unit may be incomplete.
+    """
+    num_keys = len(keys)
+    if num_keys == 0:
+        return 0
+    prefix = [0] * num_keys
+    matched = 0
+    for ii in range(1, num_keys):
+        while matched and keys[ii] != keys[matched]:
+            matched = prefix[matched - 1]
+        if keys[ii] == keys[matched]:
+            matched += 1
+        prefix[ii] = matched
+    return num_keys - prefix[-1]
+
+
+def tile_array(unit, shape):
+    """
+    Tile a 2D array, such as the drawdown of a repeating unit, to fill an
+    array of ``shape``. The last tile in each direction may be incomplete.
+    """
+    reps = tuple(-(-size // unit_size) if unit_size else 0
+                 for size, unit_size in zip(shape, unit.shape))
+    return np.tile(unit, reps)[:shape[0], :shape[1]]
+
+
+class DrawdownColumn(object):
+    """
+    The visible threads along a single warp thread of a ``Drawdown``.
+    """
+    def __init__(self, drawdown, x):
+        self.drawdown = drawdown
+        self.x = x
+
+    def __len__(self):
+        return self.drawdown.array.shape[1]
+
+    def __getitem__(self, y):
+        draft = self.drawdown.draft
+        if self.drawdown.array[self.x, y]:
+            return draft.warp[self.x]
+        else:
+            return draft.weft[y]
+
+    def __iter__(self):
+        for y in range(len(self)):
+            yield self[y]
+
+
+class Drawdown(object):
+    """
+    A lazy adapter over a drawdown array which behaves like a list of lists of
+    thread objects, so that ``drawdown[x][y]`` is the thread visible at that
+    position. Thread objects are only looked up when accessed; the underlying
+    boolean matrix is available as ``.array``.
+    """
+    def __init__(self, draft, array):
+        self.draft = draft
+        self.array = array
+
+    def __len__(self):
+        return self.array.shape[0]
+
+    def __getitem__(self, x):
+        if x < 0:
+            x += len(self)
+        if not 0 <= x < len(self):
+            raise IndexError('drawdown index out of range')
+        return DrawdownColumn(self, x)
+
+    def __iter__(self):
+        for x in range(len(self)):
+            yield self[x]
+
+
+def neighbour_runs(matrix, rows, col, direction):
+    """
+    For each of ``rows`` of a 2D matrix, return the length and value of the
+    run of equal values next to column ``col``, on the side given by
+    ``direction`` (-1 or 1). The length is 0 at the edge of the matrix.
+    """
+    num_cols = matrix.shape[1]
+    lengths = np.zeros(len(rows), dtype=np.intp)
+    start = col + direction
+    if not 0 <= start < num_cols:
+        return lengths, np.zeros(len(rows), dtype=bool)
+    values = matrix[rows, start]
+    active = np.arange(len(rows))
+    pos = start
+    while active.size and 0 <= pos < num_cols:
+        active = active[matrix[rows[active], pos] == values[active]]
+        lengths[active] += 1
+        pos += direction
+    return lengths, values
+
+
+class DrawdownTracker(object):
+    """
+    Maintains the drawdown array of a draft, and the longest float along each
+    warp and weft thread, as the draft is edited.
+
+    After changing threads of the draft, call ``.update()``: only the warp
+    threads whose shaft changed and the picks whose lifted shafts changed are
+    recomputed, along with the floats that cross them. Changing one warp
+    thread therefore takes O(picks) time, and one pick O(warp threads), plus
+    the length of the floats that the change joins or splits. Adding or
+    removing threads or shafts recomputes everything.
+
+    ``.set_shaft()`` and ``.set_lifts()`` apply a change to the drawdown
+    directly, without reading the draft.
+    """
+    def __init__(self, draft):
+        self.draft = draft
+        self.refresh()
+
+    def refresh(self):
+        """
+        Recompute the drawdown and floats from scratch.
+        """
+        draft = self.draft
+        self.rising_shed = draft.rising_shed
+        self.threading = draft.threading_array().copy()
+        self.masks = list(draft.lift_masks())
+        self.lifts = np.array(draft.liftplan_array(), dtype=bool)
+        self.array = compute_drawdown_array(self.threading, self.lifts,
+                                            self.rising_shed)
+        self.warp_runs = longest_runs(self.array)
+        self.weft_runs = longest_runs(self.array.T)
+
+    def update(self):
+        """
+        Bring the drawdown up to date with the draft.
+        """
+        draft = self.draft
+        threading = draft.threading_array()
+        masks = draft.lift_masks()
+        if (draft.rising_shed != self.rising_shed or
+                len(draft.shafts) != self.lifts.shape[1] or
+                len(threading) != len(self.threading) or
+                len(masks) != len(self.masks)):
+            self.refresh()
+            return
+        for x in np.flatnonzero(threading != self.threading).tolist():
+            self.set_shaft(x, int(threading[x]))
+        changed = [y for y, (old, new) in enumerate(zip(self.masks, masks))
+                   if old != new]
+        if changed:
+            rows = masks_to_array([masks[y] for y in changed],
+                                  self.lifts.shape[1])
+            for y, row in zip(changed, rows):
+                self.set_lifts(y, row)
+            self.masks = list(masks)
+
+    def lifted(self, shaft_no):
+        """
+        Return whether the warp is on top for each pick, for a warp thread on
+        shaft ``shaft_no``.
+        """
+        if shaft_no < 0:
+            column = np.zeros(len(self.lifts), dtype=bool)
+        else:
+            column = self.lifts[:, shaft_no].copy()
+        if not self.rising_shed:
+            np.logical_not(column, out=column)
+        return column
+
+    def set_shaft(self, x, shaft_no):
+        """
+        Thread warp thread ``x`` on shaft ``shaft_no`` (-1 for unthreaded).
+        """
+        self.threading[x] = shaft_no
+        column = self.lifted(shaft_no)
+        changed = np.flatnonzero(column != self.array[x])
+        if changed.size:
+            self.array[x] = column
+            self.warp_runs[x] = longest_run(self.array[x:x + 1])
+            self.update_runs(self.array.T, self.weft_runs, changed, x)
+
+    def set_lifts(self, y, row):
+        """
+        Lift the shafts given by the boolean array ``row`` on pick ``y``.
+        """
+        self.lifts[y] = row
+        self.masks[y] = sum(1 << ii for ii in np.flatnonzero(row).tolist())
+        pick = compute_drawdown_array(self.threading, self.lifts[y:y + 1],
+                                      self.rising_shed)[:, 0]
+        changed = np.flatnonzero(pick != self.array[:, y])
+        if changed.size:
+            self.array[:, y] = pick
+            self.weft_runs[y] = longest_run(self.array.T[y:y + 1])
+            self.update_runs(self.array, self.warp_runs, changed, y)
+
+    def update_runs(self, matrix, runs, rows, col):
+        """
+        Update the longest run lengths ``runs`` of ``rows`` of ``matrix``,
+        after the value of each of them at column ``col`` has been flipped.
+        """
+        values = matrix[rows, col]
+        left, left_values = neighbour_runs(matrix, rows, col, -1)
+        right, right_values = neighbour_runs(matrix, rows, col, 1)
+        joined = (1 + np.where(left_values == values, left, 0) +
+                  np.where(right_values == values, right, 0))
+        split = (1 + np.where(left_values != values, left, 0) +
+                 np.where(right_values != values, right, 0))
+        # A row needs a full recompute only if its longest run was the one
+        # that was split, and the joined run is shorter.
+        rescan = (split >= runs[rows]) & (joined < split)
+        runs[rows] = np.maximum(runs[rows], joined)
+        for row in rows[rescan].tolist():
+            runs[row] = longest_run(matrix[row:row + 1])
+
+    def longest_floats(self):
+        """
+        Return a tuple of the longest warp and weft float lengths, as
+        ``compute_longest_floats()``.
+        """
+        warp_longest = int(self.warp_runs.max()) if self.warp_runs.size else 0
+        weft_longest = int(self.weft_runs.max()) if self.weft_runs.size else 0
+        return max(warp_longest - 1, 0), max(weft_longest - 1, 0)
+
+    def drawdown(self):
+        """
+        Return a ``Drawdown`` view over the current drawdown array.
+        """
+        return Drawdown(self.draft, self.array)
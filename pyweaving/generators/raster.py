@@ -14,7 +14,7 @@ def point_threaded(im, warp_color=(0, 0, 0), weft_color=(255, 255, 255),
     """
     draft = Draft(num_shafts=shafts, liftplan=True)
 
-    im.thumbnail((shafts, im.size[1]), Image.ANTIALIAS)
+    im.thumbnail((shafts, im.size[1]), Image.LANCZOS)
     im = im.convert('1')
 
     w, h = im.size
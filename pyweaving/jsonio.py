@@ -0,0 +1,369 @@
+"""
+Reading and writing the JSON representation of a draft, either as a complete
+string or incrementally from/to a file object.
+
+Two layouts are supported. The row layout (the default) stores each thread as
+an object::
+
+    {"warp": [{"color": [r, g, b], "shaft": 0}, ...],
+     "weft": [{"color": [r, g, b], "shafts": [], "treadles": [0]}, ...]}
+
+The columnar layout stores colors once in a palette, and each attribute of the
+threads as a parallel array, which is much more compact for large drafts::
+
+    {"format": "columnar",
+     "palette": [[r, g, b], ...],
+     "warp": {"colors": [0, ...], "shafts": [0, ...]},
+     "weft": {"colors": [1, ...], "shafts": [[], ...], "treadles": [[0], ...]}}
+
+Palette ids and shafts of -1 indicate a thread with no color or an unthreaded
+end. Both layouts also contain the tie-up, as a list of shaft indexes per
+treadle, and the draft attributes.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import json
+from array import array
+
+
+draft_fields = ('liftplan', 'rising_shed', 'start_at_lowest_thread', 'date',
+                'title', 'author', 'address', 'email', 'telephone', 'fax',
+                'notes')
+
+
+def write_array(f, items):
+    """
+    Write each of ``items`` to ``f`` as elements of a JSON array.
+    """
+    f.write('[')
+    for ii, item in enumerate(items):
+        if ii:
+            f.write(', ')
+        f.write(json.dumps(item))
+    f.write(']')
+
+
+def write_json(draft, f, columnar=False):
+    """
+    Write the JSON representation of ``draft`` to the text file object ``f``,
+    one thread at a time.
+    """
+    shaft_nos = dict((shaft, ii) for ii, shaft in enumerate(draft.shafts))
+    treadle_nos = dict((treadle, ii)
+                       for ii, treadle in enumerate(draft.treadles))
+
+    def shaft_no(shaft):
+        return -1 if shaft is None else shaft_nos[shaft]
+
+    def numbers(index_map, objs):
+        return sorted(index_map[obj] for obj in objs)
+
+    def rgb(color):
+        return None if color is None else color.rgb
+
+    f.write('{')
+    if columnar:
+        f.write('"format": "columnar", ')
+    for key in draft_fields:
+        f.write('%s: %s, ' % (json.dumps(key),
+                              json.dumps(getattr(draft, key))))
+    f.write('"num_shafts": %d, ' % len(draft.shafts))
+    f.write('"num_treadles": %d, ' % len(draft.treadles))
+    f.write('"tieup": ')
+    write_array(f, (numbers(shaft_nos, treadle.shafts)
+                    for treadle in draft.treadles))
+
+    if columnar:
+        palette = {None: -1}
+        for color in draft.palette:
+            palette.setdefault(color, len(palette) - 1)
+        f.write(', "palette": ')
+        write_array(f, (color.rgb for color in sorted(
+            (color for color in palette if color), key=palette.get)))
+
+        f.write(', "warp": {"colors": ')
+        write_array(f, (palette[thread.color] for thread in draft.warp))
+        f.write(', "shafts": ')
+        write_array(f, (shaft_no(thread.shaft) for thread in draft.warp))
+        f.write('}, "weft": {"colors": ')
+        write_array(f, (palette[thread.color] for thread in draft.weft))
+        f.write(', "shafts": ')
+        write_array(f, (numbers(shaft_nos, thread.shafts)
+                        for thread in draft.weft))
+        f.write(', "treadles": ')
+        write_array(f, (numbers(treadle_nos, thread.treadles)
+                        for thread in draft.weft))
+        f.write('}')
+    else:
+        f.write(', "warp": ')
+        write_array(f, ({
+            'color': rgb(thread.color),
+            'shaft': shaft_no(thread.shaft),
+        } for thread in draft.warp))
+        f.write(', "weft": ')
+        write_array(f, ({
+            'color': rgb(thread.color),
+            'shafts': numbers(shaft_nos, thread.shafts),
+            'treadles': numbers(treadle_nos, thread.treadles),
+        } for thread in draft.weft))
+    f.write('}')
+
+
+class JSONStreamReader(object):
+    """
+    A minimal incremental JSON tokenizer, which reads from a text file object
+    in chunks so that the document never needs to be held in memory. Only the
+    structure of the containers iterated over with ``iter_object()`` and
+    ``iter_array()`` is parsed by hand; every other value is decoded whole by
+    the standard JSON decoder.
+    """
+    whitespace = ' \t\n\r'
+
+    def __init__(self, f, chunk_size=65536):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def fill(self):
+        """
+        Read another chunk into the buffer, returning False at end of file.
+        """
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """
+        Return the next non-whitespace character without consuming it.
+        """
+        while True:
+            while self.pos < len(self.buf):
+                if self.buf[self.pos] not in self.whitespace:
+                    return self.buf[self.pos]
+                self.pos += 1
+            if not self.fill():
+                raise ValueError("unexpected end of JSON document")
+
+    def expect(self, chars):
+        char = self.peek()
+        if char not in chars:
+            raise ValueError("expected %r at %r, got %r" %
+                             (chars, self.buf[self.pos:self.pos + 20], char))
+        self.pos += 1
+        return char
+
+    def value(self):
+        """
+        Decode and return the next complete value.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except ValueError:
+                if not self.fill():
+                    raise
+                continue
+            # A number at the very end of the buffer may continue in the next
+            # chunk.
+            if end == len(self.buf) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+    def iter_array(self):
+        """
+        Iterate over the elements of the next value, which must be an array.
+        The caller must consume each element (for example with ``value()``)
+        before advancing the iterator.
+        """
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield
+            if self.expect(',]') == ']':
+                return
+
+    def iter_object(self):
+        """
+        Iterate over the keys of the next value, which must be an object. The
+        caller must consume the value of each key before advancing the
+        iterator.
+        """
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            yield key
+            if self.expect(',}') == '}':
+                return
+
+    def iter_values(self):
+        """
+        Iterate over the decoded elements of the next value, which must be an
+        array.
+        """
+        for __ in self.iter_array():
+            yield self.value()
+
+
+class DraftJSONLoader(object):
+    """
+    Builds a draft from the parts of its JSON representation. The draft is
+    constructed as soon as the attributes it needs have been seen, after which
+    threads are added as they are read; threads which come earlier than that
+    in the document are held until then.
+    """
+    def __init__(self, cls):
+        self.cls = cls
+        self.fields = {}
+        self.draft = None
+        self.pending = []
+        self.palette = None
+        self.tieup = None
+
+    def set_field(self, key, value):
+        if self.draft is not None and key in draft_fields:
+            setattr(self.draft, key, value)
+        elif key == 'format':
+            if value != 'columnar':
+                raise ValueError("unknown draft JSON format %r" % value)
+        elif key == 'palette':
+            self.palette = value
+        elif key == 'tieup':
+            self.tieup = value
+        else:
+            self.fields[key] = value
+
+    def get_draft(self):
+        if self.draft is None:
+            self.draft = self.cls(**self.fields)
+            for method, args in self.pending:
+                method(*args)
+            self.pending = None
+        return self.draft
+
+    def defer(self, method, *args):
+        if self.draft is None and not ('num_shafts' in self.fields and
+                                       'num_treadles' in self.fields):
+            self.pending.append((method, args))
+        else:
+            self.get_draft()
+            method(*args)
+
+    def color(self, color):
+        if self.palette is None or color is None:
+            return color
+        return None if color < 0 else self.palette[color]
+
+    def shaft(self, shaft_no):
+        return None if shaft_no is None or shaft_no < 0 else shaft_no
+
+    def add_warp(self, color, shaft_no):
+        self.draft.add_warp_thread(color=self.color(color),
+                                   shaft=self.shaft(shaft_no))
+
+    def add_weft(self, color, shaft_nos, treadle_nos):
+        # Older versions wrote the shafts connected through the tie-up as
+        # well as the treadles of each pick: the treadles take precedence.
+        if treadle_nos:
+            shaft_nos = ()
+        self.draft.add_weft_thread(color=self.color(color),
+                                   shafts=shaft_nos,
+                                   treadles=treadle_nos)
+
+    def warp_row(self, obj):
+        self.defer(self.add_warp, obj.get('color'), obj.get('shaft'))
+
+    def weft_row(self, obj):
+        self.defer(self.add_weft, obj.get('color'),
+                   obj.get('shafts', ()), obj.get('treadles', ()))
+
+    def warp_columns(self, columns):
+        colors = columns.get('colors', ())
+        shafts = columns.get('shafts', ())
+        for color, shaft_no in zip(colors, shafts):
+            self.defer(self.add_warp, color, shaft_no)
+
+    def weft_columns(self, columns):
+        colors = columns.get('colors', ())
+        shafts = columns.get('shafts') or [()] * len(colors)
+        treadles = columns.get('treadles') or [()] * len(colors)
+        for color, shaft_nos, treadle_nos in zip(colors, shafts, treadles):
+            self.defer(self.add_weft, color, shaft_nos, treadle_nos)
+
+    def finish(self):
+        draft = self.get_draft()
+        for treadle, shaft_nos in zip(draft.treadles, self.tieup or ()):
+            treadle.shafts = set(draft.shafts[n] for n in shaft_nos)
+        return draft
+
+
+def load_json(cls, obj):
+    """
+    Construct a draft of class ``cls`` from a decoded JSON representation.
+    """
+    loader = DraftJSONLoader(cls)
+    obj = dict(obj)
+    warp = obj.pop('warp', [])
+    weft = obj.pop('weft', [])
+    for key, value in obj.items():
+        loader.set_field(key, value)
+    if isinstance(warp, dict):
+        loader.warp_columns(warp)
+    else:
+        for thread_obj in warp:
+            loader.warp_row(thread_obj)
+    if isinstance(weft, dict):
+        loader.weft_columns(weft)
+    else:
+        for thread_obj in weft:
+            loader.weft_row(thread_obj)
+    return loader.finish()
+
+
+def read_json(cls, f, chunk_size=65536):
+    """
+    Construct a draft of class ``cls`` by incrementally reading its JSON
+    representation from the text file object ``f``. Threads in the row layout
+    are added as they are read. Columns in the columnar layout are held until
+    all the columns of the warp or weft have been read, with the integer
+    columns packed into arrays.
+    """
+    stream = JSONStreamReader(f, chunk_size=chunk_size)
+    loader = DraftJSONLoader(cls)
+    for key in stream.iter_object():
+        if key not in ('warp', 'weft'):
+            loader.set_field(key, stream.value())
+        elif stream.peek() == '[':
+            row = loader.warp_row if key == 'warp' else loader.weft_row
+            for thread_obj in stream.iter_values():
+                row(thread_obj)
+        else:
+            columns = {}
+            for column in stream.iter_object():
+                if key == 'warp' or column == 'colors':
+                    columns[column] = array('i', stream.iter_values())
+                else:
+                    columns[column] = [tuple(nos)
+                                       for nos in stream.iter_values()]
+            if key == 'warp':
+                loader.warp_columns(columns)
+            else:
+                loader.weft_columns(columns)
+    return loader.finish()
@@ -0,0 +1,296 @@
+"""
+Combinatorial optimizations of the loom setup of a draft, working on shafts
+and treadles as integer bitmasks.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import heapq
+import time
+
+import numpy as np
+
+from .drawdown import iter_bits, masks_to_array
+
+
+def popcount(mask):
+    return bin(mask).count('1')
+
+
+def intersection_closure(masks, limit=4096, deadline=None):
+    """
+    Return the set of every non-empty intersection of one or more of
+    ``masks``, stopping once it contains ``limit`` masks, or at ``deadline``
+    (a ``time.time()`` value) if given.
+
+    Any minimal treadle basis can be rewritten using only masks from this
+    set, since each treadle can be grown to the intersection of the lifts it
+    is used in.
+    """
+    closure = set(mask for mask in masks if mask)
+    frontier = list(closure)
+    while frontier and len(closure) < limit:
+        new = []
+        for a in frontier:
+            if deadline is not None and time.time() > deadline:
+                return closure
+            for b in masks:
+                c = a & b
+                if c and c not in closure:
+                    closure.add(c)
+                    new.append(c)
+                    if len(closure) >= limit:
+                        return closure
+        frontier = new
+    return closure
+
+
+def cover_masks(lifts, basis):
+    """
+    Return, for each of ``lifts``, the indexes of a small subset of ``basis``
+    whose union is the lift, as a bitmask, using only masks which are subsets
+    of it. Raises ValueError if some lift has no such subset.
+
+    Each lift is covered greedily, by repeatedly choosing the mask with the
+    most of its shafts still missing: this is done for every lift at once,
+    with matrix products counting the shafts each mask would add.
+    """
+    width = max([0] + [mask.bit_length() for mask in list(lifts) + basis])
+    lift_bits = masks_to_array(lifts, width).astype(np.float64)
+    basis_bits = masks_to_array(basis, width).astype(np.float64)
+    usable = np.dot(1 - lift_bits, basis_bits.T) == 0
+    missing = lift_bits
+    chosen = np.zeros(usable.shape, dtype=bool)
+    rows = np.flatnonzero(missing.any(axis=1))
+    while len(rows):
+        gains = np.where(usable[rows], np.dot(missing[rows], basis_bits.T), 0)
+        best = gains.argmax(axis=1)
+        if not gains[np.arange(len(rows)), best].all():
+            raise ValueError("basis can't cover every lift")
+        chosen[rows, best] = True
+        missing[rows] *= 1 - basis_bits[best]
+        rows = rows[missing[rows].any(axis=1)]
+    weights = [1 << ii for ii in range(len(basis))]
+    return [sum(weights[ii] for ii in np.flatnonzero(row).tolist())
+            for row in chosen]
+
+
+def greedy_basis(lifts, candidates, deadline=None):
+    """
+    Choose masks from ``candidates`` until every one of ``lifts`` is a union
+    of chosen masks which are subsets of it, each time choosing the mask
+    covering the most shafts not yet covered, summed over the lifts it fits
+    in. Returns None if ``deadline`` (a ``time.time()`` value) passes first.
+
+    Since the gain of a mask can only shrink as others are chosen, gains are
+    kept in a heap and only recomputed for the mask at the top.
+    """
+    missing = dict((lift, lift) for lift in lifts if lift)
+    supersets = {}
+    for mask in candidates:
+        if deadline is not None and time.time() > deadline:
+            return None
+        supersets[mask] = [lift for lift in missing if not mask & ~lift]
+
+    def gain(mask):
+        return sum(popcount(mask & missing[lift])
+                   for lift in supersets[mask] if lift in missing)
+
+    heap = [(-gain(mask), mask) for mask in candidates]
+    heapq.heapify(heap)
+    basis = []
+    while missing and heap:
+        if deadline is not None and time.time() > deadline:
+            return None
+        __, mask = heapq.heappop(heap)
+        current = gain(mask)
+        if not current:
+            continue
+        if heap and current < -heap[0][0]:
+            heapq.heappush(heap, (-current, mask))
+            continue
+        basis.append(mask)
+        for lift in supersets[mask]:
+            if lift in missing:
+                missing[lift] &= ~mask
+                if not missing[lift]:
+                    del missing[lift]
+    return basis
+
+
+def exact_basis(lifts, candidates, best, deadline):
+    """
+    Search for a basis smaller than ``best`` by branch and bound, until
+    ``deadline`` (a ``time.time()`` value). Returns the smallest basis found.
+    """
+    lifts = sorted(set(lift for lift in lifts if lift))
+    usable = {}
+    state = {'best': list(best), 'expired': False}
+    seen = set()
+
+    def search(basis):
+        key = frozenset(basis)
+        if state['expired'] or key in seen:
+            return
+        seen.add(key)
+        if time.time() > deadline:
+            state['expired'] = True
+            return
+        # Some new treadle must lift each shaft which is missing from a lift:
+        # branch on the missing shaft with the fewest treadles to choose from.
+        choices = None
+        for lift in lifts:
+            if time.time() > deadline:
+                state['expired'] = True
+                return
+            missing = lift
+            for mask in basis:
+                if not mask & ~lift:
+                    missing &= ~mask
+            if missing and lift not in usable:
+                usable[lift] = [mask for mask in candidates
+                                if not mask & ~lift]
+            for bit in iter_bits(missing):
+                options = [mask for mask in usable[lift] if mask >> bit & 1]
+                if choices is None or len(options) < len(choices):
+                    choices = options
+        if choices is None:
+            state['best'] = list(basis)
+            return
+        if len(basis) + 1 >= len(state['best']):
+            return
+        for mask in sorted(choices, key=popcount, reverse=True):
+            basis.append(mask)
+            search(basis)
+            basis.pop()
+
+    search([])
+    return state['best']
+
+
+def treadle_basis(lifts, exact=False, time_limit=1.0):
+    """
+    Find a small set of treadle tie-ups, as bitmasks of shafts, such that
+    each of the shaft bitmasks ``lifts`` can be woven by pressing a subset of
+    the treadles together. Returns a pair of lists: the tie-up of each
+    treadle, and the treadles to press for each of ``lifts``, as bitmasks.
+
+    The basis is found with a greedy set cover over the intersections of the
+    lifts, never worse than one treadle per distinct lift or one per shaft.
+    If ``exact`` is True, a branch and bound search then looks for a smaller
+    basis, which finds the optimum if it completes. The whole search stops
+    once ``time_limit`` seconds have passed since the start, keeping the best
+    basis found so far.
+    """
+    deadline = time.time() + time_limit
+    distinct = sorted(set(lift for lift in lifts if lift))
+    union = 0
+    for lift in distinct:
+        union |= lift
+    shafts = [1 << ii for ii in iter_bits(union)]
+    basis = min(distinct, shafts, key=len)
+    # The greedy cover costs O(candidates * lifts), so the intersections
+    # considered grow with the number of lifts rather than as its square.
+    candidates = intersection_closure(
+        distinct, limit=min(4096, max(256, 4 * len(distinct))),
+        deadline=deadline)
+    greedy = greedy_basis(distinct, candidates, deadline)
+    if greedy is not None and len(greedy) <= len(basis):
+        basis = greedy
+    if exact:
+        smaller = exact_basis(distinct, candidates, basis, deadline)
+        if len(smaller) < len(basis):
+            basis = smaller
+
+    if basis is distinct:
+        covers = dict((lift, 1 << ii) for ii, lift in enumerate(distinct))
+    elif basis is shafts:
+        covers = dict((lift, sum(1 << ii for ii, mask in enumerate(shafts)
+                                 if lift & mask))
+                      for lift in distinct)
+    else:
+        covers = dict(zip(distinct, cover_masks(distinct, basis)))
+    covers[0] = 0
+    return list(basis), [covers[lift] for lift in lifts]
+
+
+def arrangement_cost(weights, order):
+    """
+    Return the cost of placing items in ``order``: the sum of the distance
+    between every pair of items, weighted by the symmetric matrix
+    ``weights``, counting each pair once.
+    """
+    positions = np.empty(len(order), dtype=np.intp)
+    positions[np.asarray(order, dtype=np.intp)] = np.arange(len(order))
+    distances = np.abs(positions[:, None] - positions[None, :])
+    return int((weights * distances).sum()) // 2
+
+
+def nearest_neighbour_order(weights, start):
+    """
+    Order items by starting at ``start`` and repeatedly moving to the
+    unvisited item with the greatest weight to the current one, or the
+    lowest numbered unvisited item if there is none.
+    """
+    num_items = len(weights)
+    visited = np.zeros(num_items, dtype=bool)
+    order = []
+    current = start
+    while True:
+        order.append(current)
+        visited[current] = True
+        if len(order) == num_items:
+            return order
+        row = np.where(visited, -1, weights[current])
+        current = int(row.argmax())
+
+
+def two_opt(weights, order, max_passes=None):
+    """
+    Improve an order by reversing any segment of it which lowers its
+    ``arrangement_cost()``, until no reversal helps or ``max_passes`` passes
+    have been made.
+    """
+    order = list(order)
+    cost = arrangement_cost(weights, order)
+    passes = 0
+    improved = True
+    while improved and (max_passes is None or passes < max_passes):
+        improved = False
+        passes += 1
+        for ii in range(len(order) - 1):
+            for jj in range(ii + 2, len(order) + 1):
+                candidate = order[:ii] + order[ii:jj][::-1] + order[jj:]
+                candidate_cost = arrangement_cost(weights, candidate)
+                if candidate_cost < cost:
+                    order, cost = candidate, candidate_cost
+                    improved = True
+    return order
+
+
+def sequential_order(weights, first_use):
+    """
+    Find an order of items, such as shafts or treadles, which places items
+    that often follow each other close together. ``weights`` is a symmetric
+    matrix counting how often each pair of items are adjacent, and
+    ``first_use`` gives the position at which each item is first used.
+
+    Both the order of first use and a nearest neighbour order are improved
+    with ``two_opt()``, and the cheapest is returned, unless the current
+    order is no worse. Returns a list of the current index of each item in
+    the new order.
+    """
+    num_items = len(weights)
+    identity = list(range(num_items))
+    if num_items < 2:
+        return identity
+    first_use_order = sorted(identity, key=lambda ii: (first_use[ii], ii))
+    best = identity
+    best_cost = arrangement_cost(weights, identity)
+    for order in (first_use_order,
+                  nearest_neighbour_order(weights, first_use_order[0])):
+        order = two_opt(weights, order, max_passes=num_items)
+        cost = arrangement_cost(weights, order)
+        if cost < best_cost:
+            best, best_cost = order, cost
+    return best
@@ -1,24 +1,88 @@
 from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 
+import os
 import os.path
+from io import StringIO
 
+import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 
+from .drawdown import (compute_drawdown_array, compute_float_arrays,
+                       minimal_period)
+
 
 __here__ = os.path.dirname(__file__)
 
 font_path = os.path.join(__here__, 'data', 'Arial.ttf')
 
 
+def thread_colors(threads, default):
+    """
+    Return the colors of ``threads`` as an array of shape (threads, 3), using
+    ``default`` for threads with no color.
+    """
+    colors = np.empty((len(threads), 3), dtype=np.uint8)
+    for ii, thread in enumerate(threads):
+        colors[ii] = thread.color.rgb if thread.color else default
+    return colors
+
+
+def rasterize_drawdown(drawdown, warp_colors, weft_colors, scale, foreground):
+    """
+    Build an RGB pixel array for a drawdown array (as returned by
+    ``Draft.compute_drawdown_array()``), with ``scale`` pixels per square.
+
+    This produces the same pixels as painting each visible float as a
+    rectangle outlined in ``foreground``: the squares are filled with the
+    visible thread's color, and the grid line between two squares takes the
+    thread color when both squares are part of the same float, or the
+    foreground color otherwise.
+    """
+    num_warp_threads, num_weft_threads = drawdown.shape
+    colors = np.concatenate((warp_colors, weft_colors, [foreground]))
+    palette, indexes = np.unique(colors.astype(np.uint8), axis=0,
+                                 return_inverse=True)
+    dtype = np.uint8 if len(palette) <= 256 else np.uint16
+    indexes = indexes.reshape(-1).astype(dtype)
+    warp = indexes[:num_warp_threads]
+    weft = indexes[num_warp_threads:-1]
+    fg = indexes[-1]
+
+    # Work in (y, x) order from here on, to match the image.
+    warp_on_top = drawdown.T
+    weft_on_top = ~warp_on_top
+    squares = np.where(warp_on_top, warp[np.newaxis, :], weft[:, np.newaxis])
+
+    # Nearest neighbor upscale. The extra final row and column of pixels are
+    # the closing outline of the last squares, filled in with the border.
+    pixels = np.empty(((num_weft_threads * scale) + 1,
+                       (num_warp_threads * scale) + 1), dtype=dtype)
+    pixels[:-1, :-1] = np.repeat(np.repeat(squares, scale, axis=0),
+                                 scale, axis=1)
+
+    # Vertical lines between horizontally adjacent squares are only hidden
+    # inside a weft float, and horizontal lines inside a warp float.
+    lines = np.where(weft_on_top[:, :-1] & weft_on_top[:, 1:],
+                     weft[:, np.newaxis], fg)
+    pixels[:-1, scale:-1:scale] = np.repeat(lines, scale, axis=0)
+    lines = np.where(warp_on_top[:-1] & warp_on_top[1:],
+                     warp[np.newaxis, :], fg)
+    pixels[scale:-1:scale, :-1] = np.repeat(lines, scale, axis=1)
+
+    # Grid intersections and the outer border are always outlines.
+    pixels[::scale, ::scale] = fg
+    pixels[[0, -1], :] = fg
+    pixels[:, [0, -1]] = fg
+    return np.take(palette, pixels, axis=0)
+
+
 class ImageRenderer(object):
     # TODO:
     # - Add a "drawndown only" option
     # - Add a default tag (like a small delta symbol) to signal the initial
     # shuttle direction
     # - Add option to render the backside of the fabric
-    # - Add option to render a bar graph of the thread crossings along the
-    # sides
     # - Add option to render 'stats table'
     #   - Number of warp threads
     #   - Number of weft threads
@@ -37,10 +101,13 @@ class ImageRenderer(object):
     # - Add option to render heddle count on each shaft
     def __init__(self, draft, liftplan=None, margin_pixels=20, scale=10,
                  foreground=(127, 127, 127), background=(255, 255, 255),
-                 markers=(0, 0, 0), numbering=(200, 0, 0)):
+                 markers=(0, 0, 0), numbering=(200, 0, 0), raster=True,
+                 crossings=False):
         self.draft = draft
 
         self.liftplan = liftplan
+        self.raster = raster
+        self.crossings = crossings
 
         self.margin_pixels = margin_pixels
         self.pixels_per_square = scale
@@ -71,6 +138,10 @@ class ImageRenderer(object):
 
         height_squares = len(self.draft.weft) + 6 + len(self.draft.shafts)
 
+        if self.crossings:
+            width_squares += 1 + self.crossings_squares
+            height_squares += 1 + self.crossings_squares
+
         # XXX Not totally sure why the +1 is needed here, but otherwise the
         # contents overflows the canvas
         width = (width_squares * self.pixels_per_square) + 1
@@ -90,8 +161,13 @@ class ImageRenderer(object):
             self.paint_tieup(draw)
             self.paint_treadling(draw)
 
-        self.paint_drawdown(draw)
+        if self.raster:
+            self.paste_drawdown(im)
+        else:
+            self.paint_drawdown(draw)
         self.paint_start_indicator(draw)
+        if self.crossings:
+            self.paint_crossings(draw)
         del draw
 
         im = self.pad_image(im)
@@ -127,6 +203,12 @@ class ImageRenderer(object):
                            outline=self.foreground,
                            fill=thread.color.rgb)
 
+    def text_width(self, draw, text):
+        # ImageDraw.textsize() was removed in Pillow 10.
+        if hasattr(draw, 'textlength'):
+            return int(draw.textlength(text, font=self.font))
+        return draw.textsize(text, font=self.font)[0]
+
     def paint_fill_marker(self, draw, box):
         startx, starty, endx, endy = box
         draw.rectangle((startx + 2, starty + 2, endx - 2, endy - 2),
@@ -272,7 +354,7 @@ class ImageRenderer(object):
                 draw.line((startx, starty, endx, endy),
                           fill=self.numbering)
                 # draw text on left side, right justified
-                textw, texth = draw.textsize(str(treadle_no), font=self.font)
+                textw = self.text_width(draw, str(treadle_no))
                 draw.text((startx - textw - 2, starty + 2),
                           str(treadle_no),
                           font=self.font,
@@ -315,6 +397,45 @@ class ImageRenderer(object):
                           font=self.font,
                           fill=self.numbering)
 
+    # Length in squares of the longest bar in the crossings bar graphs.
+    crossings_squares = 5
+
+    def paint_crossings(self, draw):
+        """
+        Paint bar graphs of the number of crossings along each weft thread, to
+        the right of the weft colors, and along each warp thread, below the
+        drawdown.
+        """
+        warp_crossings, weft_crossings = self.draft.compute_crossings()
+        most = max(warp_crossings.max(initial=0),
+                   weft_crossings.max(initial=0), 1)
+        max_length = self.crossings_squares * self.pixels_per_square
+
+        startx_squares = len(self.draft.warp) + 7
+        if self.liftplan or self.draft.liftplan:
+            startx_squares += len(self.draft.shafts)
+        else:
+            startx_squares += len(self.draft.treadles)
+        startx = startx_squares * self.pixels_per_square
+        offsety = (6 + len(self.draft.shafts)) * self.pixels_per_square
+        for ii, count in enumerate(weft_crossings.tolist()):
+            if count:
+                starty = (self.pixels_per_square * ii) + offsety
+                draw.rectangle((startx, starty + 1,
+                                startx + (count * max_length // most),
+                                starty + self.pixels_per_square - 1),
+                               fill=self.markers)
+
+        starty = offsety + ((len(self.draft.weft) + 1) *
+                            self.pixels_per_square)
+        for ii, count in enumerate(warp_crossings.tolist()):
+            if count:
+                startx = self.pixels_per_square * ii
+                draw.rectangle((startx + 1, starty,
+                                startx + self.pixels_per_square - 1,
+                                starty + (count * max_length // most)),
+                               fill=self.markers)
+
     def paint_drawdown(self, draw):
         offsety = (6 + len(self.draft.shafts)) * self.pixels_per_square
         floats = self.draft.compute_floats()
@@ -329,6 +450,22 @@ class ImageRenderer(object):
                                outline=self.foreground,
                                fill=thread.color.rgb)
 
+    def paste_drawdown(self, im):
+        """
+        Paste a rasterized drawdown into the image. This is equivalent to
+        ``.paint_drawdown()`` but does not draw each float individually.
+        """
+        if not (self.draft.warp and self.draft.weft):
+            return
+        offsety = (6 + len(self.draft.shafts)) * self.pixels_per_square
+        pixels = rasterize_drawdown(
+            self.draft.compute_drawdown_array(),
+            thread_colors(self.draft.warp, self.background),
+            thread_colors(self.draft.weft, self.background),
+            self.pixels_per_square,
+            self.foreground)
+        im.paste(Image.fromarray(pixels), (0, offsety))
+
     def show(self):
         im = self.make_pil_image()
         im.show()
@@ -338,6 +475,128 @@ class ImageRenderer(object):
         im.save(filename)
 
 
+class TiledImageRenderer(object):
+    """
+    Render the drawdown of a draft as a grid of fixed-size image tiles which
+    are written to disk one at a time, so that peak memory is bounded by the
+    tile size rather than the size of the draft.
+
+    Tiles are written in the XYZ layout, ``<directory>/<z>/<x>/<y>.png``,
+    where zoom level ``.max_zoom`` is full resolution and each lower level is
+    downsampled by half. Pixels match the drawdown painted by
+    ``ImageRenderer``.
+    """
+    def __init__(self, draft, scale=10, tile_size=256,
+                 foreground=(127, 127, 127), background=(255, 255, 255),
+                 format='png'):
+        self.draft = draft
+
+        self.pixels_per_square = scale
+        self.tile_size = tile_size
+
+        self.foreground = foreground
+        self.background = background
+        self.format = format
+
+        self.threading = draft.threading_array()
+        self.lifts = draft.liftplan_array()
+        self.warp_colors = thread_colors(draft.warp, background)
+        self.weft_colors = thread_colors(draft.weft, background)
+
+        # The drawdown includes the closing outline of the last float.
+        self.width = (len(self.threading) * scale) + 1
+        self.height = (len(self.lifts) * scale) + 1
+
+        self.num_cols = -(-self.width // tile_size)
+        self.num_rows = -(-self.height // tile_size)
+        self.max_zoom = 0
+        while (1 << self.max_zoom) < max(self.num_cols, self.num_rows):
+            self.max_zoom += 1
+
+    def make_tile(self, col, row):
+        """
+        Render the full-resolution tile at the given column and row.
+        """
+        scale = self.pixels_per_square
+        startx = col * self.tile_size
+        starty = row * self.tile_size
+        endx = min(startx + self.tile_size, self.width)
+        endy = min(starty + self.tile_size, self.height)
+        # Grid lines depend on the neighbouring squares, so rasterize one
+        # square of context around the tile and crop it off.
+        x0 = max((startx // scale) - 1, 0)
+        y0 = max((starty // scale) - 1, 0)
+        x1 = ((endx - 1) // scale) + 2
+        y1 = ((endy - 1) // scale) + 2
+        block = compute_drawdown_array(self.threading[x0:x1],
+                                       self.lifts[y0:y1],
+                                       self.draft.rising_shed)
+        pixels = rasterize_drawdown(block,
+                                    self.warp_colors[x0:x1],
+                                    self.weft_colors[y0:y1],
+                                    scale,
+                                    self.foreground)
+        left = startx - (x0 * scale)
+        top = starty - (y0 * scale)
+        pixels = pixels[top:top + endy - starty, left:left + endx - startx]
+        return Image.fromarray(np.ascontiguousarray(pixels))
+
+    def tile_path(self, directory, zoom, col, row):
+        return os.path.join(directory, str(zoom), str(col),
+                            '%d.%s' % (row, self.format))
+
+    def save_tile(self, im, path):
+        dirname = os.path.dirname(path)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        im.save(path)
+
+    def make_downsampled_tile(self, directory, zoom, col, row):
+        """
+        Build a tile at ``zoom`` from the four tiles below it at ``zoom + 1``,
+        which must already have been saved. Returns None if there is no
+        content in this tile.
+        """
+        size = self.tile_size
+        im = None
+        for dx in (0, 1):
+            for dy in (0, 1):
+                path = self.tile_path(directory, zoom + 1,
+                                      (col * 2) + dx, (row * 2) + dy)
+                if not os.path.exists(path):
+                    continue
+                if im is None:
+                    im = Image.new('RGB', (size * 2, size * 2),
+                                   self.background)
+                im.paste(Image.open(path), (dx * size, dy * size))
+        if im is None:
+            return None
+        return im.resize((size, size), Image.LANCZOS)
+
+    def save(self, directory, pyramid=False):
+        """
+        Write every full-resolution tile to ``directory``. If ``pyramid`` is
+        True, also write each lower zoom level down to a single tile.
+        """
+        for col in range(self.num_cols):
+            for row in range(self.num_rows):
+                im = self.make_tile(col, row)
+                self.save_tile(im, self.tile_path(directory, self.max_zoom,
+                                                  col, row))
+        if pyramid:
+            num_cols, num_rows = self.num_cols, self.num_rows
+            for zoom in range(self.max_zoom - 1, -1, -1):
+                num_cols = -(-num_cols // 2)
+                num_rows = -(-num_rows // 2)
+                for col in range(num_cols):
+                    for row in range(num_rows):
+                        im = self.make_downsampled_tile(directory, zoom,
+                                                        col, row)
+                        if im is not None:
+                            self.save_tile(im, self.tile_path(
+                                directory, zoom, col, row))
+
+
 svg_preamble = '<?xml version="1.0" encoding="utf-8" standalone="no"?>'
 svg_header = '''<svg width="{width}" height="{height}"
     viewBox="0 0 {width} {height}"
@@ -361,13 +620,27 @@ class TagGenerator(object):
 SVG = TagGenerator()
 
 
+class SVGStream(object):
+    """
+    Writes each element appended to it straight to a file object, one per
+    line, so that an SVG document never needs to be held in memory.
+    """
+    def __init__(self, f):
+        self.f = f
+
+    def append(self, s):
+        self.f.write(s)
+        self.f.write('\n')
+
+
 class SVGRenderer(object):
     def __init__(self, draft, liftplan=None, scale=10,
                  foreground='#7f7f7f', background='#ffffff',
-                 markers='#000000', numbering='#c80000'):
+                 markers='#000000', numbering='#c80000', patterns=False):
         self.draft = draft
 
         self.liftplan = liftplan
+        self.patterns = patterns
 
         self.scale = scale
 
@@ -379,7 +652,10 @@ class SVGRenderer(object):
         self.font_family = 'Arial, sans-serif'
         self.font_size = 12
 
-    def make_svg_doc(self):
+    def write(self, f):
+        """
+        Stream the SVG document to the file object ``f``.
+        """
         width_squares = len(self.draft.warp) + 6
         if self.liftplan or self.draft.liftplan:
             width_squares += len(self.draft.shafts)
@@ -391,7 +667,7 @@ class SVGRenderer(object):
         width = width_squares * self.scale
         height = height_squares * self.scale
 
-        doc = []
+        doc = SVGStream(f)
         # Use a negative starting point so we don't have to offset everything
         # in the drawing.
         doc.append(svg_header.format(width=width, height=height))
@@ -408,26 +684,33 @@ class SVGRenderer(object):
             self.paint_tieup(doc)
             self.paint_treadling(doc)
 
-        self.paint_drawdown(doc)
+        if self.patterns:
+            self.paint_drawdown_pattern(doc)
+        else:
+            self.paint_drawdown(doc)
         doc.append('</svg>')
-        return '\n'.join(doc)
+
+    def make_svg_doc(self):
+        f = StringIO()
+        self.write(f)
+        return f.getvalue()
 
     def write_metadata(self, doc):
         doc.append(SVG.title(self.draft.title))
 
     def paint_warp(self, doc):
         starty = 0
-        grp = []
+        doc.append('<g>')
         for ii, thread in enumerate(self.draft.warp):
             # paint box, outlined with foreground color, filled with thread
             # color
             startx = self.scale * ii
-            grp.append(SVG.rect(
+            doc.append(SVG.rect(
                 x=startx, y=starty,
                 width=self.scale, height=self.scale,
                 style='stroke:%s; fill:%s' % (self.foreground,
                                               thread.color.css)))
-        doc.append(SVG.g(*grp))
+        doc.append('</g>')
 
     def paint_weft(self, doc):
         offsety = (6 + len(self.draft.shafts)) * self.scale
@@ -438,17 +721,17 @@ class SVGRenderer(object):
             startx_squares += len(self.draft.treadles)
         startx = startx_squares * self.scale
 
-        grp = []
+        doc.append('<g>')
         for ii, thread in enumerate(self.draft.weft):
             # paint box, outlined with foreground color, filled with thread
             # color
             starty = (self.scale * ii) + offsety
-            grp.append(SVG.rect(
+            doc.append(SVG.rect(
                 x=startx, y=starty,
                 width=self.scale, height=self.scale,
                 style='stroke:%s; fill:%s' % (self.foreground,
                                               thread.color.css)))
-        doc.append(SVG.g(*grp))
+        doc.append('</g>')
 
     def paint_fill_marker(self, doc, box):
         startx, starty, endx, endy = box
@@ -465,7 +748,7 @@ class SVGRenderer(object):
         num_threads = len(self.draft.warp)
         num_shafts = len(self.draft.shafts)
 
-        grp = []
+        doc.append('<g>')
         for ii, thread in enumerate(self.draft.warp):
             startx = (num_threads - ii - 1) * self.scale
             endx = startx + self.scale
@@ -473,7 +756,7 @@ class SVGRenderer(object):
             for jj, shaft in enumerate(self.draft.shafts):
                 starty = (4 + (num_shafts - jj)) * self.scale
                 endy = starty + self.scale
-                grp.append(SVG.rect(
+                doc.append(SVG.rect(
                     x=startx, y=starty,
                     width=self.scale, height=self.scale,
                     style='stroke:%s; fill:%s' % (self.foreground,
@@ -481,7 +764,7 @@ class SVGRenderer(object):
 
                 if shaft == thread.shaft:
                     # draw threading marker
-                    self.paint_fill_marker(grp, (startx, starty, endx, endy))
+                    self.paint_fill_marker(doc, (startx, starty, endx, endy))
 
             # paint the number if it's a multiple of 4
             thread_no = ii + 1
@@ -492,14 +775,14 @@ class SVGRenderer(object):
                 startx = endx = (num_threads - ii - 1) * self.scale
                 starty = 3 * self.scale
                 endy = (5 * self.scale) - 1
-                grp.append(SVG.line(
+                doc.append(SVG.line(
                     x1=startx,
                     y1=starty,
                     x2=endx,
                     y2=endy,
                     style='stroke:%s' % self.numbering))
                 # draw text
-                grp.append(SVG.text(
+                doc.append(SVG.text(
                     str(thread_no),
                     x=(startx + 3),
                     y=(starty + self.font_size),
@@ -507,7 +790,7 @@ class SVGRenderer(object):
                         self.font_family,
                         self.font_size,
                         self.numbering)))
-        doc.append(SVG.g(*grp))
+        doc.append('</g>')
 
     def paint_liftplan(self, doc):
         num_threads = len(self.draft.weft)
@@ -515,7 +798,7 @@ class SVGRenderer(object):
         offsetx = (1 + len(self.draft.warp)) * self.scale
         offsety = (6 + len(self.draft.shafts)) * self.scale
 
-        grp = []
+        doc.append('<g>')
         for ii, thread in enumerate(self.draft.weft):
             starty = (ii * self.scale) + offsety
             endy = starty + self.scale
@@ -523,7 +806,7 @@ class SVGRenderer(object):
             for jj, shaft in enumerate(self.draft.shafts):
                 startx = (jj * self.scale) + offsetx
                 endx = startx + self.scale
-                grp.append(SVG.rect(
+                doc.append(SVG.rect(
                     x=startx,
                     y=starty,
                     width=self.scale,
@@ -533,7 +816,7 @@ class SVGRenderer(object):
 
                 if shaft in thread.connected_shafts:
                     # draw liftplan marker
-                    self.paint_fill_marker(grp, (startx, starty, endx, endy))
+                    self.paint_fill_marker(doc, (startx, starty, endx, endy))
 
             # paint the number if it's a multiple of 4
             thread_no = ii + 1
@@ -545,14 +828,14 @@ class SVGRenderer(object):
                 starty = endy
                 endx = startx + (2 * self.scale)
                 endy = starty
-                grp.append(SVG.line(
+                doc.append(SVG.line(
                     x1=startx,
                     y1=starty,
                     x2=endx,
                     y2=endy,
                     style='stroke:%s' % self.numbering))
                 # draw text
-                grp.append(SVG.text(
+                doc.append(SVG.text(
                     str(thread_no),
                     x=(startx + 3),
                     y=(starty - 4),
@@ -560,7 +843,7 @@ class SVGRenderer(object):
                         self.font_family,
                         self.font_size,
                         self.numbering)))
-        doc.append(SVG.g(*grp))
+        doc.append('</g>')
 
     def paint_tieup(self, doc):
         offsetx = (1 + len(self.draft.warp)) * self.scale
@@ -569,7 +852,7 @@ class SVGRenderer(object):
         num_treadles = len(self.draft.treadles)
         num_shafts = len(self.draft.shafts)
 
-        grp = []
+        doc.append('<g>')
         for ii, treadle in enumerate(self.draft.treadles):
             startx = (ii * self.scale) + offsetx
             endx = startx + self.scale
@@ -581,7 +864,7 @@ class SVGRenderer(object):
                           offsety)
                 endy = starty + self.scale
 
-                grp.append(SVG.rect(
+                doc.append(SVG.rect(
                     x=startx,
                     y=starty,
                     width=self.scale,
@@ -590,7 +873,7 @@ class SVGRenderer(object):
                                                   self.background)))
 
                 if shaft in treadle.shafts:
-                    self.paint_fill_marker(grp, (startx, starty, endx, endy))
+                    self.paint_fill_marker(doc, (startx, starty, endx, endy))
 
                 # on the last treadle, paint the shaft markers
                 if treadle_no == num_treadles:
@@ -600,13 +883,13 @@ class SVGRenderer(object):
                         line_startx = endx
                         line_endx = line_startx + (2 * self.scale)
                         line_starty = line_endy = starty
-                        grp.append(SVG.line(
+                        doc.append(SVG.line(
                             x1=line_startx,
                             y1=line_starty,
                             x2=line_endx,
                             y2=line_endy,
                             style='stroke:%s' % self.numbering))
-                        grp.append(SVG.text(
+                        doc.append(SVG.text(
                             str(shaft_no),
                             x=(line_startx + 3),
                             y=(line_starty + 2 + self.font_size),
@@ -621,14 +904,14 @@ class SVGRenderer(object):
                 startx = endx = (treadle_no * self.scale) + offsetx
                 starty = 3 * self.scale
                 endy = (5 * self.scale) - 1
-                grp.append(SVG.line(
+                doc.append(SVG.line(
                     x1=startx,
                     y1=starty,
                     x2=endx,
                     y2=endy,
                     style='stroke:%s' % self.numbering))
                 # draw text on left side, right justified
-                grp.append(SVG.text(
+                doc.append(SVG.text(
                     str(treadle_no),
                     x=(startx - 3),
                     y=(starty + self.font_size),
@@ -637,7 +920,7 @@ class SVGRenderer(object):
                         self.font_family,
                         self.font_size,
                         self.numbering)))
-        doc.append(SVG.g(*grp))
+        doc.append('</g>')
 
     def paint_treadling(self, doc):
         num_threads = len(self.draft.weft)
@@ -645,7 +928,7 @@ class SVGRenderer(object):
         offsetx = (1 + len(self.draft.warp)) * self.scale
         offsety = (6 + len(self.draft.shafts)) * self.scale
 
-        grp = []
+        doc.append('<g>')
         for ii, thread in enumerate(self.draft.weft):
             starty = (ii * self.scale) + offsety
             endy = starty + self.scale
@@ -653,7 +936,7 @@ class SVGRenderer(object):
             for jj, treadle in enumerate(self.draft.treadles):
                 startx = (jj * self.scale) + offsetx
                 endx = startx + self.scale
-                grp.append(SVG.rect(
+                doc.append(SVG.rect(
                     x=startx,
                     y=starty,
                     width=self.scale,
@@ -663,7 +946,7 @@ class SVGRenderer(object):
 
                 if treadle in thread.treadles:
                     # draw treadling marker
-                    self.paint_fill_marker(grp, (startx, starty, endx, endy))
+                    self.paint_fill_marker(doc, (startx, starty, endx, endy))
 
             # paint the number if it's a multiple of 4
             thread_no = ii + 1
@@ -675,14 +958,14 @@ class SVGRenderer(object):
                 starty = endy
                 endx = startx + (2 * self.scale)
                 endy = starty
-                grp.append(SVG.line(
+                doc.append(SVG.line(
                     x1=startx,
                     y1=starty,
                     x2=endx,
                     y2=endy,
                     style='stroke:%s' % self.numbering))
                 # draw text
-                grp.append(SVG.text(
+                doc.append(SVG.text(
                     str(thread_no),
                     x=(startx + 3),
                     y=(starty - 4),
@@ -690,13 +973,13 @@ class SVGRenderer(object):
                         self.font_family,
                         self.font_size,
                         self.numbering)))
-        doc.append(SVG.g(*grp))
+        doc.append('</g>')
 
     def paint_drawdown(self, doc):
         offsety = (6 + len(self.draft.shafts)) * self.scale
         floats = self.draft.compute_floats()
 
-        grp = []
+        doc.append('<g>')
         for start, end, visible, length, thread in floats:
             if visible:
                 startx = start[0] * self.scale
@@ -705,19 +988,87 @@ class SVGRenderer(object):
                 endy = ((end[1] + 1) * self.scale) + offsety
                 width = endx - startx
                 height = endy - starty
-                grp.append(SVG.rect(
+                doc.append(SVG.rect(
                     x=startx,
                     y=starty,
                     width=width,
                     height=height,
                     style='stroke:%s; fill:%s' % (self.foreground,
                                                   thread.color.css)))
-        doc.append(SVG.g(*grp))
+        doc.append('</g>')
+
+    def paint_drawdown_pattern(self, doc):
+        """
+        Paint the drawdown by finding its smallest repeating unit (including
+        thread colors), drawing that once as a ``<pattern>``, and filling the
+        drawdown area with it. Falls back to ``.paint_drawdown()`` if the
+        drawdown does not repeat.
+        """
+        drawdown = self.draft.compute_drawdown_array()
+        num_warp_threads, num_weft_threads = drawdown.shape
+        warp_keys = [(column.tobytes(), thread.color.css)
+                     for column, thread in zip(drawdown, self.draft.warp)]
+        weft_keys = [(row.tobytes(), thread.color.css)
+                     for row, thread in zip(drawdown.T.copy(),
+                                            self.draft.weft)]
+        unit_w = minimal_period(warp_keys)
+        unit_h = minimal_period(weft_keys)
+        if (unit_w, unit_h) == (num_warp_threads, num_weft_threads):
+            self.paint_drawdown(doc)
+            return
+
+        scale = self.scale
+        offsety = (6 + len(self.draft.shafts)) * scale
+        unit = drawdown[:unit_w, :unit_h]
+
+        doc.append('<defs>')
+        doc.append('<pattern id="drawdown" x="0" y="%d" width="%d" '
+                   'height="%d" patternUnits="userSpaceOnUse">' %
+                   (offsety, unit_w * scale, unit_h * scale))
+        # Fill each float within the unit without an outline...
+        warp_floats, weft_floats = compute_float_arrays(unit)
+        for floats, threads in ((warp_floats, self.draft.warp),
+                                (weft_floats, self.draft.weft)):
+            visible = floats.visible
+            for start, end, thread_no in zip(floats.start[visible].tolist(),
+                                             floats.end[visible].tolist(),
+                                             floats.thread[visible].tolist()):
+                doc.append(SVG.rect(
+                    x=start[0] * scale,
+                    y=start[1] * scale,
+                    width=(end[0] + 1 - start[0]) * scale,
+                    height=(end[1] + 1 - start[1]) * scale,
+                    style='fill:%s' % threads[thread_no].color.css))
+
+        # ...then outline every boundary between two different floats,
+        # wrapping around to the neighbouring repeat at the edges of the unit.
+        segments = []
+        for y in range(unit_h):
+            for x in range(unit_w + 1):
+                if unit[(x - 1) % unit_w, y] or unit[x % unit_w, y]:
+                    segments.append('M%d %dv%d' % (x * scale, y * scale,
+                                                   scale))
+        for x in range(unit_w):
+            for y in range(unit_h + 1):
+                if not (unit[x, (y - 1) % unit_h] and unit[x, y % unit_h]):
+                    segments.append('M%d %dh%d' % (x * scale, y * scale,
+                                                   scale))
+        doc.append(SVG.path(d=''.join(segments),
+                            style='stroke:%s; fill:none' % self.foreground))
+        doc.append('</pattern>')
+        doc.append('</defs>')
+
+        doc.append(SVG.rect(
+            x=0,
+            y=offsety,
+            width=num_warp_threads * scale,
+            height=num_weft_threads * scale,
+            style='stroke:%s; fill:url(#drawdown)' % self.foreground))
 
     def render_to_string(self):
         return self.make_svg_doc()
 
     def save(self, filename):
-        s = svg_preamble + '\n' + self.make_svg_doc()
         with open(filename, 'w') as f:
-            f.write(s)
+            f.write(svg_preamble + '\n')
+            self.write(f)
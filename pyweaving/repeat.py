@@ -0,0 +1,319 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+from collections.abc import Sequence
+
+import numpy as np
+
+from . import Draft, DraftError, WarpThread, WeftThread
+from .drawdown import (compute_longest_floats, tile_array, masks_to_array,
+                       iter_bits, rotate_mask)
+
+
+class RepeatSequence(Sequence):
+    """
+    A read-only sequence which repeats the threads of ``unit`` a number of
+    times, without copying them.
+
+    If ``transform`` is given, threads after the first repeat are instead
+    produced on access by calling ``transform(thread, repeat_no)``.
+    """
+    def __init__(self, unit, repeats, transform=None):
+        self.unit = unit
+        self.repeats = repeats
+        self.transform = transform
+
+    def __len__(self):
+        return len(self.unit) * self.repeats
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[ii] for ii in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('thread index out of range')
+        repeat_no, index = divmod(index, len(self.unit))
+        thread = self.unit[index]
+        if repeat_no and self.transform:
+            thread = self.transform(thread, repeat_no)
+        return thread
+
+    def __iter__(self):
+        for repeat_no in range(self.repeats):
+            for thread in self.unit:
+                if repeat_no and self.transform:
+                    thread = self.transform(thread, repeat_no)
+                yield thread
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+    def __repr__(self):
+        return '<RepeatSequence %d x %r>' % (self.repeats, self.unit)
+
+
+def unsupported(name):
+    """
+    Return a method which raises DraftError, in place of a ``Draft`` method
+    which would change the threads, shafts or treadles of a repeated draft.
+    """
+    def method(self, *args, **kwargs):
+        raise DraftError("can't %s a repeated draft: use .materialize() to "
+                         "get a plain draft" % name.replace('_', ' '))
+    method.__name__ = str(name)
+    return method
+
+
+class RepeatedDraft(Draft):
+    """
+    A draft made of a base draft repeated ``warp_repeats`` times across and
+    ``weft_repeats`` times along, without copying any threads.
+
+    ``.warp`` and ``.weft`` are virtual sequences over the threads of the base
+    draft, so a thread changed in the base changes in every repeat. The
+    drawdown and longest floats are computed from the base unit and tiled.
+    Anything that iterates over threads, like rendering or WIF export, works
+    unchanged. The metadata and shed settings are read from the base draft.
+    Methods which would change the draft raise ``DraftError``: use
+    ``.materialize()`` to get a plain draft.
+    """
+    base_attributes = frozenset([
+        'liftplan', 'rising_shed', 'start_at_lowest_thread', 'date', 'title',
+        'author', 'address', 'email', 'telephone', 'fax', 'notes'])
+
+    def __init__(self, base, warp_repeats=1, weft_repeats=1):
+        self.base = base
+        self.warp_repeats = warp_repeats
+        self.weft_repeats = weft_repeats
+
+    def __getattr__(self, name):
+        if name in self.base_attributes:
+            return getattr(self.base, name)
+        raise AttributeError(name)
+
+    @property
+    def shafts(self):
+        return self.base.shafts
+
+    @property
+    def treadles(self):
+        return self.base.treadles
+
+    @property
+    def warp(self):
+        return RepeatSequence(self.base.warp, self.warp_repeats)
+
+    @property
+    def weft(self):
+        return RepeatSequence(self.base.weft, self.weft_repeats)
+
+    @property
+    def palette(self):
+        return self.base.palette
+
+    def add_warp_thread(self, *args, **kwargs):
+        raise DraftError("can't add threads to a repeated draft")
+
+    def add_weft_thread(self, *args, **kwargs):
+        raise DraftError("can't add threads to a repeated draft")
+
+    add_shaft = unsupported('add_shaft')
+    add_treadle = unsupported('add_treadle')
+    recolor = unsupported('recolor')
+    reduce_shafts = unsupported('reduce_shafts')
+    remap_shafts = unsupported('remap_shafts')
+    reduce_treadles = unsupported('reduce_treadles')
+    replace_treadles = unsupported('replace_treadles')
+    reduce_active_treadles = unsupported('reduce_active_treadles')
+    sort_threading = unsupported('sort_threading')
+    sort_treadles = unsupported('sort_treadles')
+    remap_treadles = unsupported('remap_treadles')
+    invert_shed = unsupported('invert_shed')
+    rotate = unsupported('rotate')
+    flip_weftwise = unsupported('flip_weftwise')
+    flip_warpwise = unsupported('flip_warpwise')
+    make_selvedges_continuous = unsupported('make_selvedges_continuous')
+    add_selvedge_shaft = unsupported('add_selvedge_shaft')
+
+    def copy(self):
+        return self.__class__(self.base.copy(), self.warp_repeats,
+                              self.weft_repeats)
+
+    def materialize(self):
+        """
+        Return a plain draft containing every repeated thread.
+        """
+        draft = self.base.copy()
+        warp = list(draft.warp)
+        weft = list(draft.weft)
+        for __ in range(self.warp_repeats - 1):
+            for thread in warp:
+                draft.add_warp_thread(color=thread.color, shaft=thread.shaft)
+        for __ in range(self.weft_repeats - 1):
+            for thread in weft:
+                draft.add_weft_thread(color=thread.color,
+                                      shafts=thread.shafts,
+                                      treadles=thread.treadles)
+        return draft
+
+    def threading_array(self):
+        return np.tile(self.base.threading_array(), self.warp_repeats)
+
+    def lift_masks(self):
+        return self.base.lift_masks() * self.weft_repeats
+
+    def pick_masks(self):
+        shaft_masks, treadle_masks = self.base.pick_masks()
+        return (shaft_masks * self.weft_repeats,
+                treadle_masks * self.weft_repeats)
+
+    def liftplan_array(self):
+        return np.tile(self.base.liftplan_array(), (self.weft_repeats, 1))
+
+    def compute_drawdown_array(self):
+        return tile_array(self.base.compute_drawdown_array(),
+                          (len(self.warp), len(self.weft)))
+
+    def compute_longest_floats(self):
+        # Any float which is not the full length of the draft is shorter than
+        # the unit, so crosses at most one boundary between repeats: it is
+        # enough to look at two repeats in each direction.
+        num_warp_threads = len(self.base.warp)
+        num_weft_threads = len(self.base.weft)
+        warp_repeats = min(self.warp_repeats, 2)
+        weft_repeats = min(self.weft_repeats, 2)
+        warp_longest, weft_longest = compute_longest_floats(
+            np.tile(self.base.threading_array(), warp_repeats),
+            np.tile(self.base.liftplan_array(), (weft_repeats, 1)),
+            self.rising_shed)
+        if num_weft_threads and \
+                warp_longest == weft_repeats * num_weft_threads - 1:
+            warp_longest = len(self.weft) - 1
+        if num_warp_threads and \
+                weft_longest == warp_repeats * num_warp_threads - 1:
+            weft_longest = len(self.warp) - 1
+        return warp_longest, weft_longest
+
+    def find_repeats(self):
+        # The periods of a repeated sequence are the same as those of two
+        # repeats of it.
+        return Draft.find_repeats(RepeatedDraft(
+            self.base, min(self.warp_repeats, 2), min(self.weft_repeats, 2)))
+
+    def repeat_unit(self):
+        repeats = self.find_repeats()
+        unit = self.base.copy()
+        unit.warp = unit.warp[:repeats.warp]
+        unit.weft = unit.weft[:repeats.weft]
+        return unit
+
+
+class AdvancedDraft(RepeatedDraft):
+    """
+    An advancing view of a base draft, as produced by ``Draft.advance()``: the
+    base draft is repeated ``repeats`` times in each direction, with the
+    threading and treadling of each successive repeat offset by another
+    ``step`` shafts and treadles.
+
+    Threads in the first repeat are those of the base draft. Threads in later
+    repeats are created as they are accessed, so changing them has no effect:
+    change the base draft instead. The threading and liftplan are computed
+    directly from the base draft.
+    """
+    def __init__(self, base, step=1, repeats=None):
+        if repeats is None:
+            repeats = len(base.shafts)
+        RepeatedDraft.__init__(self, base, repeats, repeats)
+        self.step = step
+
+    @property
+    def repeats(self):
+        return self.warp_repeats
+
+    @property
+    def warp(self):
+        shafts = self.base.shafts
+        shaft_index = dict((shaft, ii) for ii, shaft in enumerate(shafts))
+
+        def advance_thread(thread, repeat_no):
+            shaft = thread.shaft
+            if shaft is not None:
+                shaft = shafts[(shaft_index[shaft] + repeat_no * self.step) %
+                               len(shafts)]
+            return WarpThread(color=thread.color, shaft=shaft)
+
+        return RepeatSequence(self.base.warp, self.repeats, advance_thread)
+
+    @property
+    def weft(self):
+        shafts = self.base.shafts
+        treadles = self.base.treadles
+        shaft_index = dict((shaft, ii) for ii, shaft in enumerate(shafts))
+        treadle_index = dict((treadle, ii)
+                             for ii, treadle in enumerate(treadles))
+
+        def advance_thread(thread, repeat_no):
+            offset = repeat_no * self.step
+            return WeftThread(
+                color=thread.color,
+                shafts=[shafts[(shaft_index[shaft] + offset) % len(shafts)]
+                        for shaft in thread.shafts],
+                treadles=[treadles[(treadle_index[treadle] + offset) %
+                                   len(treadles)]
+                          for treadle in thread.treadles])
+
+        return RepeatSequence(self.base.weft, self.repeats, advance_thread)
+
+    def copy(self):
+        return self.__class__(self.base.copy(), self.step, self.repeats)
+
+    def materialize(self):
+        draft = self.base.copy()
+        draft.advance(step=self.step, repeats=self.repeats)
+        return draft
+
+    def threading_array(self):
+        threading = self.base.threading_array()
+        offsets = np.repeat(np.arange(self.repeats) * self.step,
+                            len(threading))
+        threading = np.tile(threading, self.repeats)
+        return np.where(threading < 0, -1,
+                        (threading + offsets) % max(len(self.shafts), 1))
+
+    def pick_masks(self):
+        num_shafts = len(self.shafts)
+        num_treadles = len(self.treadles)
+        shaft_masks, treadle_masks = self.base.pick_masks()
+        advanced_shaft_masks = []
+        advanced_treadle_masks = []
+        for repeat_no in range(self.repeats):
+            offset = repeat_no * self.step
+            advanced_shaft_masks.extend(
+                rotate_mask(mask, offset, num_shafts) for mask in shaft_masks)
+            advanced_treadle_masks.extend(
+                rotate_mask(mask, offset, num_treadles)
+                for mask in treadle_masks)
+        return advanced_shaft_masks, advanced_treadle_masks
+
+    def lift_masks(self):
+        tieup = self.base.tieup_masks()
+        masks = []
+        for mask, treadle_mask in zip(*self.pick_masks()):
+            for treadle_no in iter_bits(treadle_mask):
+                mask |= tieup[treadle_no]
+            masks.append(mask)
+        return masks
+
+    def liftplan_array(self):
+        return masks_to_array(self.lift_masks(), len(self.shafts))
+
+    compute_drawdown_array = Draft.compute_drawdown_array
+    compute_longest_floats = Draft.compute_longest_floats
+    find_repeats = Draft.find_repeats
+
+    def repeat_unit(self):
+        return self.materialize().repeat_unit()
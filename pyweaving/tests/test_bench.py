@@ -0,0 +1,34 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import json
+from unittest import TestCase
+
+from .. import bench
+
+
+class TestBench(TestCase):
+    def test_tile_draft(self):
+        draft = bench.make_twill(50)
+        self.assertEqual(len(draft.warp), 50)
+        self.assertEqual(len(draft.weft), 50)
+        self.assertEqual(draft.compute_longest_floats(), (2, 2))
+
+    def test_run(self):
+        ret = bench.run(sizes=[20], stage_names=['drawdown', 'wif_write',
+                                                 'wif_read'])
+        json.dumps(ret)
+        stages = [(result['draft'], result['stage'])
+                  for result in ret['results']]
+        self.assertEqual(len(stages), 3 * 4)
+        self.assertIn(('raster', 'wif_read'), stages)
+        for result in ret['results']:
+            self.assertGreaterEqual(result['seconds'], 0)
+            self.assertGreater(result['peak_bytes'], 0)
+
+    def test_read_stage_alone(self):
+        ret = bench.run(draft_names=['twill'], sizes=[20],
+                        stage_names=['wif_read'])
+        stages = [result['stage'] for result in ret['results']]
+        self.assertEqual(stages, ['build', 'wif_read'])
+        self.assertGreaterEqual(ret['results'][1]['seconds'], 0)
@@ -0,0 +1,82 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import os.path
+import shutil
+from tempfile import mkdtemp
+from unittest import TestCase
+
+from .. import Draft
+from ..binary import BinaryDraftReader, BinaryDraftWriter
+from ..generators import twill
+from ..wif import FastWIFReader
+
+
+SAMPLE_DIR = os.path.join(os.path.dirname(__file__), 'samples')
+
+
+class TestBinaryDraft(TestCase):
+    def setUp(self):
+        self.dir = mkdtemp()
+        self.filename = os.path.join(self.dir, 'draft.pwb')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def check_round_trip(self, draft):
+        BinaryDraftWriter(draft).write(self.filename)
+        for use_mmap in (True, False):
+            loaded = BinaryDraftReader(self.filename).read(use_mmap=use_mmap)
+            self.assertEqual(list(loaded.threading_array()),
+                             list(draft.threading_array()))
+            self.assertEqual(loaded.liftplan_array().tolist(),
+                             draft.liftplan_array().tolist())
+            self.assertEqual([thread.color.rgb for thread in loaded.warp],
+                             [thread.color.rgb for thread in draft.warp])
+            self.assertEqual([thread.color.rgb for thread in loaded.weft],
+                             [thread.color.rgb for thread in draft.weft])
+            self.assertEqual(len(loaded.treadles), len(draft.treadles))
+            self.assertEqual(loaded.liftplan, draft.liftplan)
+            self.assertEqual(loaded.rising_shed, draft.rising_shed)
+            self.assertEqual(loaded.date, draft.date)
+            self.assertEqual(loaded.notes, draft.notes)
+        return loaded
+
+    def test_round_trip_treadling(self):
+        draft = twill.twill(3)
+        draft.warp[4].shaft = None
+        draft.notes = 'Notes\nwith ünicode'
+        self.check_round_trip(draft)
+
+    def test_round_trip_liftplan(self):
+        draft = FastWIFReader(os.path.join(SAMPLE_DIR, 'twill.wif')).read()
+        draft.rising_shed = False
+        draft.recolor((255, 0, 0), (255, 255, 255))
+        self.check_round_trip(draft)
+
+    def test_round_trip_empty(self):
+        self.check_round_trip(Draft(num_shafts=0))
+        loaded = self.check_round_trip(Draft(num_shafts=0, num_treadles=2))
+        self.assertEqual(len(loaded.shafts), 0)
+        self.assertEqual([treadle.shafts for treadle in loaded.treadles],
+                         [set(), set()])
+
+    def test_mmap_changes_in_place(self):
+        draft = twill.twill(2)
+        BinaryDraftWriter(draft).write(self.filename)
+        loaded = BinaryDraftReader(self.filename).read()
+        loaded.warp[0].shaft = loaded.shafts[3]
+        loaded.weft[1].treadles = [loaded.treadles[0]]
+        loaded.add_warp_thread(color=(0, 0, 0), shaft=1)
+        self.assertEqual(loaded.threading_array()[0], 3)
+        self.assertEqual(len(loaded.warp), len(draft.warp) + 1)
+        self.assertEqual(loaded.weft[1].treadles, set([loaded.treadles[0]]))
+        # The file itself is unchanged.
+        reloaded = BinaryDraftReader(self.filename).read()
+        self.assertEqual(reloaded.threading_array()[0], 0)
+
+    def test_not_a_draft(self):
+        with open(self.filename, 'wb') as f:
+            f.write(b'not a binary draft, but long enough to have a header')
+        with self.assertRaises(ValueError):
+            BinaryDraftReader(self.filename).read()
@@ -0,0 +1,164 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+from unittest import TestCase
+
+from .. import Draft, Color
+from ..compact import CompactDraft
+from ..generators import twill
+
+
+class TestCompactDraft(TestCase):
+    def make_draft(self):
+        draft = CompactDraft(num_shafts=12, num_treadles=10)
+        for ii in range(10):
+            draft.treadles[ii].shafts.add(draft.shafts[ii])
+            draft.treadles[ii].shafts.add(draft.shafts[ii + 2])
+        for ii in range(24):
+            draft.add_warp_thread(color=(0, 0, 100), shaft=ii % 12)
+            draft.add_weft_thread(color=(255, 255, 255), treadles=[ii % 10])
+        return draft
+
+    def test_threading_views(self):
+        draft = self.make_draft()
+        self.assertEqual(len(draft.warp), 24)
+        self.assertEqual(len(draft.weft), 24)
+        self.assertIs(draft.warp[13].shaft, draft.shafts[1])
+        self.assertIs(draft.warp[-1].shaft, draft.shafts[11])
+        draft.warp[13].shaft = draft.shafts[5]
+        self.assertEqual(list(draft.threading_array()[12:14]), [0, 5])
+
+    def test_palette(self):
+        draft = self.make_draft()
+        self.assertEqual(len(draft.palette), 2)
+        self.assertIs(draft.warp[0].color, draft.warp[1].color)
+        self.assertEqual(draft.weft[0].color, Color((255, 255, 255)))
+
+    def test_tieup_bitmask(self):
+        draft = self.make_draft()
+        treadle = draft.treadles[9]
+        self.assertEqual(set(treadle.shafts),
+                         set([draft.shafts[9], draft.shafts[11]]))
+        treadle.shafts.discard(draft.shafts[11])
+        self.assertEqual(draft.weft[9].connected_shafts,
+                         set([draft.shafts[9]]))
+        lifts = draft.liftplan_array()
+        self.assertEqual(lifts.shape, (24, 12))
+        self.assertEqual(list(lifts[9].nonzero()[0]), [9])
+        self.assertEqual(list(lifts[0].nonzero()[0]), [0, 2])
+
+    def test_insert_weft(self):
+        draft = self.make_draft()
+        draft.add_weft_thread(color=(0, 0, 0), index=1, shafts=[3, 11])
+        self.assertEqual(len(draft.weft), 25)
+        self.assertEqual(draft.weft[1].connected_shafts,
+                         set([draft.shafts[3], draft.shafts[11]]))
+        self.assertEqual(draft.weft[2].treadles, set([draft.treadles[1]]))
+
+    def test_repr(self):
+        draft = self.make_draft()
+        draft.add_weft_thread(color=(0, 0, 0), shafts=[3, 11])
+        self.assertEqual(repr(draft.weft[1]),
+                         '<WeftThread color:(255, 255, 255) '
+                         'treadles:<BitSetView [1]>>')
+        self.assertEqual(repr(draft.weft[-1]),
+                         '<WeftThread color:(0, 0, 0) '
+                         'shafts:<BitSetView [3, 11]>>')
+        self.assertIn(repr(draft.weft[-1]), repr(draft.weft))
+
+    def test_from_draft(self):
+        draft = twill.twill(2)
+        compact = CompactDraft.from_draft(draft)
+        self.assertEqual(compact.compute_longest_floats(),
+                         draft.compute_longest_floats())
+        self.assertEqual(
+            [draft.shafts.index(thread.shaft) for thread in draft.warp],
+            list(compact.threading_array()))
+
+    def test_json_round_trip(self):
+        draft = CompactDraft(num_shafts=4, liftplan=True)
+        for ii in range(8):
+            draft.add_warp_thread(color=(0, 0, 100), shaft=ii % 4)
+            draft.add_weft_thread(color=(255, 255, 255),
+                                  shafts=[ii % 4, (ii + 1) % 4])
+        copy = CompactDraft.from_json(draft.to_json())
+        self.assertEqual(list(copy.threading_array()),
+                         list(draft.threading_array()))
+        self.assertTrue((copy.liftplan_array() ==
+                         draft.liftplan_array()).all())
+        self.assertIsInstance(Draft.from_json(draft.to_json()), Draft)
+
+    def test_copy_on_write(self):
+        draft = self.make_draft()
+        for copy_on_write in (False, True):
+            copy = draft.copy(copy_on_write=copy_on_write)
+            self.assertEqual(copy.liftplan_array().tolist(),
+                             draft.liftplan_array().tolist())
+            self.assertEqual(copy._lifts is draft._lifts, copy_on_write)
+            copy.warp[0].shaft = copy.shafts[4]
+            copy.weft[0].treadles = [copy.treadles[5]]
+            copy.treadles[1].shafts = [copy.shafts[0]]
+            self.assertEqual(draft.threading_array()[0], 0)
+            self.assertEqual(draft.weft[0].get_treadle_mask(), 1)
+            self.assertEqual(draft.treadles[1].get_mask(), 0b1010)
+            self.assertIs(copy.weft[0].treadles.objs, copy.treadles)
+        # The original can still be modified after sharing its storage.
+        draft.add_warp_thread(shaft=3)
+        self.assertEqual(len(draft.warp), 25)
+
+    def test_recolor(self):
+        draft = self.make_draft()
+        draft.add_warp_thread(color=(255, 0, 0))
+        draft.recolor((0, 0, 100), (255, 0, 0))
+        self.assertEqual(set(draft.palette), set([Color((255, 0, 0)),
+                                                  Color((255, 255, 255))]))
+        self.assertEqual(set(thread.color for thread in draft.warp),
+                         set([Color((255, 0, 0))]))
+        self.assertEqual(draft.color_number((255, 0, 0)),
+                         draft.color_number(Color((255, 0, 0))))
+
+    def test_add_shafts_and_treadles(self):
+        draft = self.make_draft()
+        lifts = draft.liftplan_array()
+        shafts = [draft.add_shaft() for __ in range(5)]
+        treadle = draft.add_treadle(shafts=shafts[-1:])
+        self.assertEqual(len(draft.shafts), 17)
+        self.assertEqual(draft.liftplan_array()[:, :12].tolist(),
+                         lifts.tolist())
+        draft.weft[3].treadles.add(treadle)
+        self.assertIn(shafts[-1], draft.weft[3].connected_shafts)
+        draft.make_selvedges_continuous(add_new_shafts=True)
+        self.assertTrue(draft.selvedges_continuous())
+
+    def test_reduce_shafts(self):
+        draft = self.make_draft()
+        draft.warp[5].shaft = None
+        expected = Draft.from_json(draft.to_json())
+        expected.reduce_shafts()
+        drawdown = draft.compute_drawdown_array()
+        draft.reduce_shafts()
+        self.assertEqual(len(draft.shafts), len(expected.shafts))
+        self.assertEqual(draft.threading_array().tolist(),
+                         expected.threading_array().tolist())
+        self.assertEqual(draft.compute_drawdown_array().tolist(),
+                         drawdown.tolist())
+
+    def test_reduce_treadles(self):
+        draft = self.make_draft()
+        drawdown = draft.compute_drawdown_array()
+        draft.reduce_treadles(exact=True)
+        self.assertLessEqual(len(draft.treadles), 10)
+        self.assertEqual(draft.compute_drawdown_array().tolist(),
+                         drawdown.tolist())
+
+    def test_sort_threading_and_treadles(self):
+        draft = self.make_draft()
+        for ii in range(24):
+            draft.warp[ii].shaft = draft.shafts[(ii * 5) % 12]
+        drawdown = draft.compute_drawdown_array()
+        draft.sort_threading()
+        draft.sort_treadles()
+        self.assertEqual(draft.threading_array().tolist()[:12],
+                         list(range(12)))
+        self.assertEqual(draft.compute_drawdown_array().tolist(),
+                         drawdown.tolist())
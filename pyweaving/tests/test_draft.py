@@ -1,9 +1,16 @@
 from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 
+import pickle
+import tracemalloc
+from copy import deepcopy
 from unittest import TestCase
 
-from .. import Draft, Color
+import numpy as np
+
+from .. import Draft, Color, DraftError
+from ..drawdown import compute_longest_floats, find_layers, tile_array
+from ..generators import twill
 
 
 class TestDraft(TestCase):
@@ -26,3 +33,433 @@ class TestDraft(TestCase):
             color=black,
             shafts=[1],
         )
+
+    def test_drawdown_array(self):
+        draft = twill.twill(2)
+        draft.warp[3].shaft = None
+        for rising_shed in (True, False):
+            draft.rising_shed = rising_shed
+            array = draft.compute_drawdown_array()
+            self.assertEqual(array.shape, (len(draft.warp), len(draft.weft)))
+            for x, warp_thread in enumerate(draft.warp):
+                for y in range(len(draft.weft)):
+                    visible = draft.compute_drawdown_at((x, y))
+                    self.assertEqual(array[x, y], visible is warp_thread)
+
+    def test_drawdown_adapter(self):
+        draft = twill.twill(2)
+        drawdown = draft.compute_drawdown()
+        self.assertEqual(len(drawdown), len(draft.warp))
+        self.assertEqual(len(drawdown[0]), len(draft.weft))
+        self.assertIs(drawdown[0][0], draft.compute_drawdown_at((0, 0)))
+        self.assertIs(drawdown[-1][3], draft.compute_drawdown_at((15, 3)))
+
+    def test_floats(self):
+        draft = twill.twill(2)
+        floats = list(draft.compute_floats())
+        warp_floats = [f for f in floats if f[4] in draft.warp]
+        self.assertEqual(sum(length + 1 for start, end, visible, length,
+                             thread in warp_floats),
+                         len(draft.warp) * len(draft.weft))
+        start, end, visible, length, thread = floats[0]
+        self.assertEqual(start, (0, 0))
+        self.assertIs(thread, draft.warp[0])
+        self.assertEqual(draft.compute_longest_floats(), (1, 1))
+
+    def test_longest_floats_streaming(self):
+        draft = twill.twill(3)
+        draft.warp[2].shaft = draft.shafts[0]
+        draft.warp[5].shaft = None
+        warp_floats, weft_floats = draft.compute_float_arrays()
+        expected = (warp_floats.length.max(), weft_floats.length.max())
+        for block_size in (1, 5, 1024):
+            self.assertEqual(compute_longest_floats(
+                draft.threading_array(), draft.liftplan_array(),
+                block_size=block_size), expected)
+
+    def test_lift_cache_invalidation(self):
+        draft = twill.twill(2)
+        lifts = draft.liftplan_array()
+        self.assertIs(draft.liftplan_array(), lifts)
+        self.assertEqual(list(lifts[0].nonzero()[0]), [0, 1])
+        connected = draft.weft[0].connected_shafts
+        self.assertIs(draft.weft[0].connected_shafts, connected)
+
+        # Edit the tie-up in place.
+        draft.treadles[0].shafts.add(draft.shafts[3])
+        self.assertEqual(list(draft.liftplan_array()[0].nonzero()[0]),
+                         [0, 1, 3])
+        self.assertIn(draft.shafts[3], draft.weft[0].connected_shafts)
+
+        # Change the treadling of a pick.
+        draft.weft[0].treadles = [draft.treadles[2]]
+        self.assertEqual(list(draft.liftplan_array()[0].nonzero()[0]),
+                         [2, 3])
+        self.assertEqual(draft.lift_masks()[0], 0b1100)
+
+    def test_lift_cache_reordered_picks(self):
+        draft = twill.twill(2)
+        draft.weft[0].treadles = [draft.treadles[2]]
+        masks = list(draft.lift_masks())
+
+        draft.weft[0], draft.weft[1] = draft.weft[1], draft.weft[0]
+        masks[0], masks[1] = masks[1], masks[0]
+        self.assertEqual(draft.lift_masks(), masks)
+
+        draft.weft = list(reversed(draft.weft))
+        masks.reverse()
+        self.assertEqual(draft.lift_masks(), masks)
+        self.assertEqual(draft.liftplan_array().tolist(),
+                         draft.copy().liftplan_array().tolist())
+        self.assertEqual(draft.compute_drawdown_array().tolist(),
+                         draft.copy().compute_drawdown_array().tolist())
+
+        del draft.weft[0]
+        self.assertEqual(draft.lift_masks(), masks[1:])
+
+    def test_lift_cache_per_draft(self):
+        draft = twill.twill(2)
+        other = twill.twill(2)
+        lifts = draft.liftplan_array()
+        other.treadles[0].shafts.add(other.shafts[3])
+        other.add_weft_thread(treadles=[0])
+        self.assertIs(draft.liftplan_array(), lifts)
+
+        # Picks shared with another draft are still seen to change.
+        other.shafts = list(draft.shafts)
+        other.weft = list(draft.weft)
+        self.assertEqual(other.lift_masks(), draft.lift_masks())
+        draft.weft[0].treadles = [draft.treadles[2]]
+        self.assertEqual(other.lift_masks()[0], 0b1100)
+        self.assertEqual(draft.lift_masks()[0], 0b1100)
+
+    def test_lift_cache_pickle_and_deepcopy(self):
+        self.assertEqual(
+            len(pickle.loads(pickle.dumps(Draft(num_shafts=2))).shafts), 2)
+        draft = twill.twill(2)
+        draft.lift_masks()
+        for copy in (pickle.loads(pickle.dumps(draft)), deepcopy(draft)):
+            self.assertEqual(copy.lift_masks(), draft.lift_masks())
+            # Edits to the tie-up, treadling and picks of the copy are still
+            # seen, and the original is unchanged.
+            treadle, = copy.weft[0].treadles
+            treadle.shafts.add(copy.shafts[3])
+            self.assertEqual(copy.lift_masks()[0], 0b1011)
+            copy.weft[1].treadles.add(copy.treadles[3])
+            self.assertEqual(copy.lift_masks()[1], 0b1111)
+            copy.weft.reverse()
+            self.assertEqual(copy.lift_masks(), copy.copy().lift_masks())
+            self.assertEqual(draft.lift_masks()[:2], [0b0011, 0b0110])
+
+    def test_copy(self):
+        draft = twill.twill(2)
+        draft.warp[3].shaft = None
+        copy = draft.copy()
+        self.assertEqual(list(copy.threading_array()),
+                         list(draft.threading_array()))
+        self.assertEqual(copy.liftplan_array().tolist(),
+                         draft.liftplan_array().tolist())
+        self.assertIs(copy.warp[0].color, draft.warp[0].color)
+        self.assertIn(copy.warp[0].shaft, copy.shafts)
+        self.assertTrue(copy.weft[0].treadles <= set(copy.treadles))
+        self.assertTrue(copy.treadles[0].shafts <= set(copy.shafts))
+
+        # Changes to the copy don't affect the original.
+        copy.treadles[0].shafts.add(copy.shafts[3])
+        copy.warp[0].shaft = copy.shafts[2]
+        copy.add_weft_thread(treadles=[0])
+        self.assertNotIn(draft.shafts[3], draft.treadles[0].shafts)
+        self.assertIs(draft.warp[0].shaft, draft.shafts[0])
+        self.assertEqual(len(draft.weft), len(copy.weft) - 1)
+
+    def test_color_interning(self):
+        color = Color((10, 20, 30))
+        self.assertIs(Color([10, 20, 30]), color)
+        self.assertIs(Color(color), color)
+        self.assertEqual(len(set([color, Color((10, 20, 30))])), 1)
+        self.assertNotEqual(color, Color((10, 20, 31)))
+        with self.assertRaises(AttributeError):
+            color.rgb = (0, 0, 0)
+        self.assertIs(deepcopy(color), color)
+
+        draft = twill.twill(2)
+        self.assertIs(draft.warp[0].color, draft.warp[1].color)
+
+    def test_palette_recolor(self):
+        draft = twill.twill(2, warp_color=(0, 0, 100),
+                            weft_color=(255, 255, 255))
+        self.assertEqual(draft.palette, [Color((0, 0, 100)),
+                                         Color((255, 255, 255))])
+        draft.recolor((0, 0, 100), (200, 0, 44))
+        self.assertEqual(draft.palette, [Color((200, 0, 44)),
+                                         Color((255, 255, 255))])
+        self.assertIs(draft.warp[3].color, Color((200, 0, 44)))
+
+    def test_memory_per_thread(self):
+        draft = Draft(num_shafts=8, num_treadles=8)
+        count = 5000
+        tracemalloc.start()
+        try:
+            start = tracemalloc.get_traced_memory()[0]
+            for ii in range(count):
+                draft.add_warp_thread(color=(0, 0, 100), shaft=ii % 8)
+            warp_end = tracemalloc.get_traced_memory()[0]
+            for ii in range(count):
+                draft.add_weft_thread(color=(255, 255, 255),
+                                      treadles=[ii % 8])
+            weft_end = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+        warp_bytes = (warp_end - start) / count
+        weft_bytes = (weft_end - warp_end) / count
+        # With per-instance dicts and two sets per pick, these were about 100
+        # and 580 bytes respectively.
+        self.assertLess(warp_bytes, 80)
+        self.assertLess(weft_bytes, 350)
+
+    def test_find_repeats(self):
+        draft = twill.twill(2, warp_color=(0, 0, 100),
+                            weft_color=(255, 255, 255))
+        for ii in range(0, 16, 2):
+            draft.warp[ii].color = (255, 0, 0)
+        repeats = draft.find_repeats()
+        self.assertEqual(repeats.threading, 4)
+        self.assertEqual(repeats.treadling, 4)
+        self.assertEqual(repeats.warp_colors, 2)
+        self.assertEqual(repeats.weft_colors, 1)
+        self.assertEqual((repeats.warp, repeats.weft), (4, 4))
+
+        unit = draft.repeat_unit()
+        self.assertEqual((len(unit.warp), len(unit.weft)), (4, 4))
+        self.assertEqual(
+            tile_array(unit.compute_drawdown_array(), (16, 16)).tolist(),
+            draft.compute_drawdown_array().tolist())
+
+        draft.warp[1].shaft = draft.shafts[0]
+        self.assertEqual(draft.find_repeats().warp, 16)
+
+    def test_advance(self):
+        draft = Draft(num_shafts=4, num_treadles=4)
+        for ii in range(4):
+            draft.treadles[ii].shafts = set([draft.shafts[ii]])
+        for ii in range(3):
+            draft.add_warp_thread(color=(0, 0, 100), shaft=ii)
+            draft.add_weft_thread(color=(255, 255, 255), treadles=[ii])
+        draft.add_warp_thread(color=(0, 0, 100), shaft=None)
+        draft.advance(step=2, repeats=3)
+        self.assertEqual(draft.threading_array().tolist(),
+                         [0, 1, 2, -1, 2, 3, 0, -1, 0, 1, 2, -1])
+        self.assertEqual([sorted(draft.treadles.index(treadle)
+                                 for treadle in thread.treadles)
+                          for thread in draft.weft],
+                         [[0], [1], [2], [2], [3], [0], [0], [1], [2]])
+
+    def test_track_drawdown(self):
+        draft = twill.twill(3)
+        tracker = draft.track_drawdown()
+
+        def check():
+            tracker.update()
+            self.assertEqual(tracker.array.tolist(),
+                             draft.compute_drawdown_array().tolist())
+            self.assertEqual(tracker.longest_floats(),
+                             draft.compute_longest_floats())
+
+        check()
+        draft.warp[4].shaft = draft.shafts[0]
+        check()
+        draft.warp[0].shaft = None
+        check()
+        draft.weft[7].treadles = set()
+        draft.weft[7].shafts = set(draft.shafts[:5])
+        check()
+        draft.treadles[1].shafts.add(draft.shafts[5])
+        check()
+        draft.rising_shed = False
+        check()
+        draft.add_warp_thread(shaft=2)
+        check()
+
+    def make_paired_draft(self, cls=Draft):
+        # Each treadle is used on two picks in a row, so no shaft can give a
+        # continuous selvedge.
+        draft = cls(num_shafts=8, num_treadles=8)
+        for ii in range(8):
+            draft.treadles[ii].shafts = set([draft.shafts[ii]])
+        for ii in range(16):
+            draft.add_warp_thread(shaft=ii % 8)
+            draft.add_weft_thread(treadles=[(ii // 2) % 8])
+        return draft
+
+    def test_selvedges_continuous(self):
+        draft = twill.twill(2)
+        self.assertFalse(draft.selvedges_continuous())
+        self.assertEqual(draft.continuous_selvedge_shafts(True).tolist(),
+                         [False, True, False, True])
+        draft.make_selvedges_continuous()
+        self.assertTrue(draft.selvedges_continuous())
+        self.assertEqual(len(draft.shafts), 4)
+
+    def test_selvedges_add_new_shafts(self):
+        draft = self.make_paired_draft()
+        with self.assertRaises(DraftError):
+            draft.make_selvedges_continuous()
+        draft.make_selvedges_continuous(add_new_shafts=True)
+        self.assertTrue(draft.selvedges_continuous())
+        self.assertEqual(len(draft.shafts), 9)
+        self.assertIs(draft.warp[0].shaft, draft.shafts[8])
+        self.assertIs(draft.warp[-1].shaft, draft.shafts[8])
+        self.assertEqual(draft.treadles[8].shafts, set([draft.shafts[8]]))
+
+    def test_reduce_shafts(self):
+        # A straight draw on 8 shafts where shafts 4-7 repeat the lifts of
+        # shafts 0-3, as in a draft converted from a jacquard design.
+        draft = Draft(num_shafts=10, liftplan=True)
+        for ii in range(16):
+            draft.add_warp_thread(shaft=ii % 8)
+        for ii in range(8):
+            draft.add_weft_thread(shafts=[ii % 4, ii % 4 + 4, 9])
+        drawdown = draft.compute_drawdown_array()
+        draft.reduce_shafts()
+        self.assertEqual(len(draft.shafts), 4)
+        self.assertEqual(draft.threading_array().tolist(), [0, 1, 2, 3] * 4)
+        self.assertEqual(draft.compute_drawdown_array().tolist(),
+                         drawdown.tolist())
+
+    def test_reduce_shafts_treadled(self):
+        # Tie shafts 0 and 2 up to the same treadles.
+        draft = twill.twill(2)
+        for treadle in draft.treadles:
+            if draft.shafts[0] in treadle.shafts or \
+                    draft.shafts[2] in treadle.shafts:
+                treadle.shafts.update([draft.shafts[0], draft.shafts[2]])
+        drawdown = draft.compute_drawdown_array()
+        draft.reduce_shafts()
+        self.assertEqual(len(draft.shafts), 3)
+        self.assertEqual(draft.compute_drawdown_array().tolist(),
+                         drawdown.tolist())
+
+    def test_reduce_treadles(self):
+        # Every pick uses its own treadle, tied up to a union of four groups
+        # of shafts.
+        draft = Draft(num_shafts=8, num_treadles=16)
+        groups = [[0, 1], [2, 3], [4, 5, 6], [7]]
+        for ii, treadle in enumerate(draft.treadles):
+            treadle.shafts = set(draft.shafts[shaft_no]
+                                 for bit, group in enumerate(groups)
+                                 if ii >> bit & 1 for shaft_no in group)
+            draft.add_weft_thread(treadles=[ii])
+        for ii in range(8):
+            draft.add_warp_thread(shaft=ii)
+        drawdown = draft.compute_drawdown_array()
+        draft.reduce_treadles()
+        self.assertEqual(len(draft.treadles), 4)
+        self.assertEqual(draft.compute_drawdown_array().tolist(),
+                         drawdown.tolist())
+        self.assertEqual(max(len(thread.treadles) for thread in draft.weft),
+                         4)
+        draft.liftplan = True
+        with self.assertRaises(ValueError):
+            draft.reduce_treadles()
+
+    def test_sort_threading_and_treadles(self):
+        # A straight twill, with the shafts and treadles numbered out of
+        # order.
+        order = [2, 0, 3, 1]
+        draft = Draft(num_shafts=4, num_treadles=4)
+        for ii, treadle_no in enumerate(order):
+            draft.treadles[treadle_no].shafts = set(
+                [draft.shafts[order[ii]], draft.shafts[order[(ii + 1) % 4]]])
+        for ii in range(16):
+            draft.add_warp_thread(shaft=order[ii % 4])
+            draft.add_weft_thread(treadles=[order[ii % 4]])
+        drawdown = draft.compute_drawdown_array()
+        draft.sort_threading()
+        draft.sort_treadles()
+        self.assertEqual(draft.threading_array().tolist(), [0, 1, 2, 3] * 4)
+        self.assertEqual([draft.treadles.index(list(thread.treadles)[0])
+                          for thread in draft.weft], [0, 1, 2, 3] * 4)
+        self.assertEqual(draft.compute_drawdown_array().tolist(),
+                         drawdown.tolist())
+
+    def test_crossings(self):
+        draft = twill.twill(2)
+        draft.warp[0].shaft = None
+        drawdown = draft.compute_drawdown_array()
+        warp_crossings = draft.compute_warp_crossings()
+        weft_crossings = draft.compute_weft_crossings()
+        self.assertEqual(warp_crossings.tolist(),
+                         [sum(a != b for a, b in zip(column, column[1:]))
+                          for column in drawdown.tolist()])
+        self.assertEqual(weft_crossings.tolist(),
+                         [sum(a != b for a, b in zip(row, row[1:]))
+                          for row in drawdown.T.tolist()])
+        self.assertEqual(warp_crossings[0], 0)
+        self.assertIs(draft.compute_crossings(), draft.compute_crossings())
+        draft.warp[0].shaft = draft.shafts[0]
+        self.assertEqual(draft.compute_warp_crossings()[0], 8)
+
+    def test_all_threads_attached(self):
+        draft = twill.twill(2)
+        self.assertTrue(draft.all_threads_attached())
+        self.assertEqual(len(draft.find_layers()), 1)
+        draft.warp[3].shaft = None
+        self.assertFalse(draft.all_threads_attached())
+        layers = [(warps.tolist(), wefts.tolist())
+                  for warps, wefts in draft.find_layers()]
+        self.assertIn(([3], []), layers)
+
+    def test_double_weave_layers(self):
+        # Shafts 0 and 1 weave a plain weave top layer on the even picks,
+        # and shafts 2 and 3 a bottom layer on the odd picks.
+        draft = Draft(num_shafts=4, liftplan=True)
+        for ii in range(8):
+            draft.add_warp_thread(shaft=ii % 4)
+        for ii in range(8):
+            if ii % 2:
+                draft.add_weft_thread(shafts=[0, 1, 2 + (ii // 2) % 2])
+            else:
+                draft.add_weft_thread(shafts=[(ii // 2) % 2])
+        self.assertFalse(draft.all_threads_attached())
+        layers = [(warps.tolist(), wefts.tolist())
+                  for warps, wefts in draft.find_layers()]
+        self.assertEqual(layers, [([0, 1, 4, 5], [0, 2, 4, 6]),
+                                  ([2, 3, 6, 7], [1, 3, 5, 7])])
+        # Stitching the layers together on one pick attaches them.
+        draft.weft[1].shafts.remove(draft.shafts[1])
+        self.assertTrue(draft.all_threads_attached())
+
+    def test_layers_without_drawdown(self):
+        # A 4000 x 4000 drawdown would take 16MB.
+        draft = twill.twill(2).repeat(499, lazy=True)
+        draft.liftplan_array()
+        tracemalloc.start()
+        try:
+            attached = draft.all_threads_attached()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        self.assertTrue(attached)
+        self.assertLess(peak, 4000000)
+
+    def test_many_layers(self):
+        # 100 stacked layers of plain weave, 10 threads each way, with each
+        # layer lying above all of the later ones.
+        blocks = np.arange(1000) // 10
+        plain = (np.arange(1000)[:, None] + np.arange(1000)) % 2 == 0
+        drawdown = np.where(blocks[:, None] == blocks, plain,
+                            blocks[:, None] < blocks)
+        layers = find_layers(drawdown)
+        self.assertEqual(len(layers), 100)
+        for ii, (warps, wefts) in enumerate(layers):
+            expected = list(range(ii * 10, ii * 10 + 10))
+            self.assertEqual(warps.tolist(), expected)
+            self.assertEqual(wefts.tolist(), expected)
+        # Nothing interlaces in an unwoven drawdown, so every thread is a
+        # layer of its own.
+        layers = find_layers(np.zeros((1000, 2000), dtype=bool))
+        self.assertEqual(len(layers), 3000)
+        self.assertEqual([warps.tolist() for warps, wefts in layers[:1000]],
+                         [[ii] for ii in range(1000)])
+        self.assertEqual([wefts.tolist() for warps, wefts in layers[1000:]],
+                         [[ii] for ii in range(2000)])
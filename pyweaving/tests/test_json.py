@@ -0,0 +1,80 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import json
+from io import StringIO
+from unittest import TestCase
+
+from .. import Draft, jsonio
+from ..compact import CompactDraft
+from ..generators import twill
+
+
+class TestDraftJSON(TestCase):
+    def make_draft(self):
+        draft = twill.twill(3, weft_color=(200, 0, 44))
+        draft.warp[4].shaft = None
+        draft.weft[2].color = None
+        draft.title = 'Twill'
+        draft.notes = 'Notes\nwith "quotes"'
+        return draft
+
+    def assertSameDraft(self, copy, draft):
+        self.assertEqual(list(copy.threading_array()),
+                         list(draft.threading_array()))
+        self.assertEqual(copy.liftplan_array().tolist(),
+                         draft.liftplan_array().tolist())
+        self.assertEqual([thread.treadles and
+                          sorted(copy.treadles.index(treadle)
+                                 for treadle in thread.treadles)
+                          for thread in copy.weft],
+                         [thread.treadles and
+                          sorted(draft.treadles.index(treadle)
+                                 for treadle in thread.treadles)
+                          for thread in draft.weft])
+        self.assertEqual([thread.color and thread.color.rgb
+                          for thread in copy.warp + copy.weft],
+                         [thread.color and thread.color.rgb
+                          for thread in draft.warp + draft.weft])
+        self.assertEqual(copy.title, draft.title)
+        self.assertEqual(copy.notes, draft.notes)
+
+    def test_round_trip(self):
+        draft = self.make_draft()
+        for columnar in (False, True):
+            s = draft.to_json(columnar=columnar)
+            self.assertSameDraft(Draft.from_json(s), draft)
+            self.assertSameDraft(CompactDraft.from_json(s), draft)
+
+    def test_columnar_layout(self):
+        draft = self.make_draft()
+        obj = json.loads(draft.to_json(columnar=True))
+        self.assertEqual(obj['palette'], [[0, 0, 100], [200, 0, 44]])
+        self.assertEqual(obj['warp']['shafts'][:6], [0, 1, 2, 3, -1, 5])
+        self.assertEqual(obj['weft']['colors'][:3], [1, 1, -1])
+
+    def test_streaming(self):
+        draft = self.make_draft()
+        for columnar in (False, True):
+            f = StringIO()
+            draft.write_json(f, columnar=columnar)
+            f.seek(0)
+            self.assertSameDraft(Draft.read_json(f), draft)
+            # Small chunks split values across reads.
+            f.seek(0)
+            self.assertSameDraft(
+                jsonio.read_json(CompactDraft, f, chunk_size=7), draft)
+
+    def test_keys_in_any_order(self):
+        draft = self.make_draft()
+        s = json.dumps(json.loads(draft.to_json()), sort_keys=True)
+        self.assertSameDraft(Draft.read_json(StringIO(s)), draft)
+
+    def test_legacy_connected_shafts(self):
+        draft = self.make_draft()
+        obj = json.loads(draft.to_json())
+        # Older versions also wrote the shafts connected by the treadles.
+        for thread_obj, thread in zip(obj['weft'], draft.weft):
+            thread_obj['shafts'] = [draft.shafts.index(shaft) for shaft in
+                                    thread.connected_shafts]
+        self.assertSameDraft(Draft.from_json(json.dumps(obj)), draft)
@@ -0,0 +1,79 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import random
+import time
+from unittest import TestCase
+
+import numpy as np
+
+from ..optimize import (arrangement_cost, intersection_closure,
+                        sequential_order, treadle_basis)
+
+
+class TestTreadleBasis(TestCase):
+    def check_basis(self, lifts, basis, treadling):
+        self.assertEqual(len(treadling), len(lifts))
+        for lift, treadles in zip(lifts, treadling):
+            union = 0
+            for ii, mask in enumerate(basis):
+                if treadles >> ii & 1:
+                    self.assertFalse(mask & ~lift)
+                    union |= mask
+            self.assertEqual(union, lift)
+
+    def test_intersection_closure(self):
+        self.assertEqual(intersection_closure([0b0110, 0b0011, 0b1100]),
+                         set([0b0110, 0b0011, 0b1100, 0b0010, 0b0100]))
+
+    def test_hidden_basis(self):
+        rng = random.Random(0)
+        hidden = [0b11, 0b1100, 0b1110000, 0b10000000]
+        lifts = []
+        for __ in range(50):
+            lift = 0
+            for mask in hidden:
+                if rng.random() < 0.5:
+                    lift |= mask
+            lifts.append(lift)
+        basis, treadling = treadle_basis(lifts)
+        self.check_basis(lifts, basis, treadling)
+        self.assertEqual(sorted(basis), sorted(hidden))
+
+    def test_exact(self):
+        lifts = [0b1110, 0b10101, 0b11100, 0b11110]
+        basis, treadling = treadle_basis(lifts)
+        self.check_basis(lifts, basis, treadling)
+        self.assertEqual(len(basis), 4)
+        basis, treadling = treadle_basis(lifts, exact=True)
+        self.check_basis(lifts, basis, treadling)
+        self.assertEqual(len(basis), 3)
+
+    def test_time_limit(self):
+        # Too many unrelated lifts to cover greedily in time: the search
+        # stops and falls back to one treadle per shaft.
+        rng = random.Random(0)
+        lifts = [rng.getrandbits(40) for __ in range(4000)]
+        start = time.time()
+        basis, treadling = treadle_basis(lifts, exact=True, time_limit=0.2)
+        self.assertLess(time.time() - start, 1.0)
+        self.check_basis(lifts, basis, treadling)
+        self.assertEqual(len(basis), 40)
+
+
+class TestSequentialOrder(TestCase):
+    def test_recovers_straight_order(self):
+        # Items 0-5 follow each other in a scrambled straight order.
+        scrambled = [3, 0, 5, 1, 4, 2]
+        weights = np.zeros((6, 6), dtype=np.intp)
+        for a, b in zip(scrambled, scrambled[1:]):
+            weights[a, b] = weights[b, a] = 10
+        first_use = np.arange(6)
+        order = sequential_order(weights, first_use)
+        self.assertIn(order, (scrambled, scrambled[::-1]))
+        self.assertEqual(arrangement_cost(weights, order), 50)
+
+    def test_keeps_optimal_order(self):
+        weights = np.ones((4, 4), dtype=np.intp)
+        self.assertEqual(sequential_order(weights, np.arange(4)),
+                         [0, 1, 2, 3])
@@ -1,11 +1,18 @@
 from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 
+import os
+import shutil
+from io import StringIO
 from unittest import TestCase
-from tempfile import NamedTemporaryFile
+from tempfile import NamedTemporaryFile, mkdtemp
+from xml.etree import ElementTree
+
+from PIL import Image
 
 from .. import Draft, Color
-from ..render import ImageRenderer, SVGRenderer
+from ..generators import twill
+from ..render import ImageRenderer, SVGRenderer, TiledImageRenderer
 
 
 class TestRender(TestCase):
@@ -52,3 +59,60 @@ class TestRender(TestCase):
         draft = self.make_draft()
         with NamedTemporaryFile() as f:
             SVGRenderer(draft, liftplan=True).save(f.name)
+
+    def test_tiles_match_image(self):
+        draft = twill.twill(3)
+        draft.warp[5].shaft = draft.shafts[0]
+        renderer = TiledImageRenderer(draft, tile_size=37)
+        directory = mkdtemp()
+        try:
+            renderer.save(directory, pyramid=True)
+            im = ImageRenderer(draft, margin_pixels=0).make_pil_image()
+            offsety = (6 + len(draft.shafts)) * 10
+            expected = im.crop((0, offsety, renderer.width,
+                                offsety + renderer.height))
+            actual = Image.new('RGB', (renderer.width, renderer.height))
+            for col in range(renderer.num_cols):
+                for row in range(renderer.num_rows):
+                    tile = Image.open(renderer.tile_path(
+                        directory, renderer.max_zoom, col, row))
+                    actual.paste(tile, (col * 37, row * 37))
+            self.assertEqual(actual.tobytes(), expected.tobytes())
+            self.assertTrue(os.path.exists(
+                renderer.tile_path(directory, 0, 0, 0)))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_raster_matches_floats(self):
+        draft = twill.twill(3)
+        draft.warp[5].shaft = draft.shafts[0]
+        draft.weft[2].color = Color((0, 120, 0))
+        for scale in (4, 7, 10):
+            raster = ImageRenderer(draft, scale=scale).make_pil_image()
+            floats = ImageRenderer(draft, scale=scale,
+                                   raster=False).make_pil_image()
+            self.assertEqual(raster.tobytes(), floats.tobytes())
+
+    def test_svg_patterns(self):
+        draft = twill.twill(2)
+        plain = SVGRenderer(draft).render_to_string()
+        patterned = SVGRenderer(draft, patterns=True).render_to_string()
+        self.assertLess(len(patterned), len(plain))
+        root = ElementTree.fromstring(patterned)
+        ns = '{http://www.w3.org/2000/svg}'
+        pattern = root.find('%sdefs/%spattern' % (ns, ns))
+        self.assertEqual(pattern.get('width'), '40')
+        self.assertEqual(pattern.get('height'), '40')
+
+    def test_svg_stream(self):
+        draft = self.make_draft()
+        f = StringIO()
+        SVGRenderer(draft).write(f)
+        self.assertEqual(f.getvalue(), SVGRenderer(draft).render_to_string())
+        ElementTree.fromstring(f.getvalue())
+
+    def test_image_crossings(self):
+        draft = self.make_draft()
+        im = ImageRenderer(draft, crossings=True).make_pil_image()
+        plain = ImageRenderer(draft).make_pil_image()
+        self.assertEqual(im.size, (plain.size[0] + 60, plain.size[1] + 60))
@@ -0,0 +1,165 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import os
+import shutil
+from tempfile import mkdtemp
+from unittest import TestCase
+
+from .. import Color, DraftError
+from ..compact import CompactDraft
+from ..generators import twill
+from ..render import ImageRenderer
+from ..repeat import RepeatSequence, RepeatedDraft
+from ..wif import WIFWriter
+
+
+class TestRepeatedDraft(TestCase):
+    def make_draft(self):
+        draft = twill.twill(3)
+        draft.warp[5].shaft = draft.shafts[0]
+        draft.weft[2].color = Color((0, 120, 0))
+        return draft
+
+    def check_matches(self, lazy, eager):
+        self.assertEqual(len(lazy.warp), len(eager.warp))
+        self.assertEqual(len(lazy.weft), len(eager.weft))
+        self.assertEqual(lazy.threading_array().tolist(),
+                         eager.threading_array().tolist())
+        self.assertEqual(lazy.liftplan_array().tolist(),
+                         eager.liftplan_array().tolist())
+        self.assertEqual(lazy.compute_drawdown_array().tolist(),
+                         eager.compute_drawdown_array().tolist())
+        self.assertEqual(lazy.compute_longest_floats(),
+                         eager.compute_longest_floats())
+        self.assertEqual(lazy.find_repeats(), eager.find_repeats())
+
+    def test_sequence(self):
+        seq = RepeatSequence(['a', 'b', 'c'], 3)
+        self.assertEqual(len(seq), 9)
+        self.assertEqual(seq[4], 'b')
+        self.assertEqual(seq[-1], 'c')
+        self.assertEqual(seq[2:5], ['c', 'a', 'b'])
+        self.assertEqual(list(seq), ['a', 'b', 'c'] * 3)
+        with self.assertRaises(IndexError):
+            seq[9]
+
+    def test_matches_eager_repeat(self):
+        lazy = self.make_draft().repeat(3, lazy=True)
+        eager = self.make_draft()
+        eager.repeat(3)
+        self.assertIsInstance(lazy, RepeatedDraft)
+        self.check_matches(lazy, eager)
+        self.check_matches(lazy, lazy.materialize())
+
+    def test_compact_base(self):
+        base = CompactDraft.from_draft(self.make_draft())
+        lazy = RepeatedDraft(base, 4, 2)
+        self.check_matches(lazy, lazy.materialize())
+        self.assertEqual(lazy.pick_masks(), lazy.materialize().pick_masks())
+        self.assertEqual(repr(lazy.weft[len(base.weft)]), repr(base.weft[0]))
+
+    def test_full_length_floats(self):
+        draft = twill.twill(2)
+        for thread in draft.warp:
+            thread.shaft = draft.shafts[0]
+        lazy = draft.repeat(9, lazy=True)
+        self.check_matches(lazy, lazy.materialize())
+        self.assertEqual(lazy.compute_longest_floats()[1],
+                         len(lazy.warp) - 1)
+
+    def test_base_changes_show_through(self):
+        draft = self.make_draft()
+        lazy = draft.repeat(2, lazy=True)
+        draft.warp[1].shaft = draft.shafts[2]
+        self.assertIs(lazy.warp[len(draft.warp) + 1].shaft, draft.shafts[2])
+        self.assertEqual(lazy.find_repeats().warp, len(draft.warp))
+
+    def test_add_thread(self):
+        lazy = self.make_draft().repeat(1, lazy=True)
+        with self.assertRaises(DraftError):
+            lazy.add_warp_thread(shaft=0)
+
+    def test_changes_leave_base_alone(self):
+        draft = self.make_draft()
+        lazy = draft.repeat(1, lazy=True)
+        threading = draft.threading_array().tolist()
+        lifts = draft.liftplan_array().tolist()
+        num_shafts = len(draft.shafts)
+        with self.assertRaises(DraftError):
+            lazy.recolor((0, 120, 0), (255, 255, 255))
+        with self.assertRaises(DraftError):
+            lazy.reduce_shafts()
+        with self.assertRaises(DraftError):
+            lazy.flip_warpwise()
+        with self.assertRaises(DraftError):
+            lazy.add_shaft()
+        self.assertEqual(draft.weft[2].color, Color((0, 120, 0)))
+        self.assertEqual(draft.threading_array().tolist(), threading)
+        self.assertEqual(draft.liftplan_array().tolist(), lifts)
+        self.assertEqual(len(draft.shafts), num_shafts)
+        # Metadata is still read from the base draft.
+        draft.title = 'Twill'
+        self.assertEqual(lazy.title, 'Twill')
+        self.assertEqual(lazy.rising_shed, draft.rising_shed)
+        with self.assertRaises(AttributeError):
+            lazy.missing
+
+    def test_export_and_render(self):
+        lazy = self.make_draft().repeat(2, lazy=True)
+        eager = lazy.materialize()
+        directory = mkdtemp()
+        try:
+            contents = []
+            for draft in (lazy, eager):
+                filename = os.path.join(directory, 'out.wif')
+                WIFWriter(draft).write(filename)
+                with open(filename) as f:
+                    contents.append(f.read())
+            self.assertEqual(contents[0], contents[1])
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual(
+            ImageRenderer(lazy).make_pil_image().tobytes(),
+            ImageRenderer(eager).make_pil_image().tobytes())
+
+
+class TestAdvancedDraft(TestCase):
+    def make_draft(self):
+        draft = twill.twill(3)
+        draft.warp[5].shaft = None
+        draft.weft[2].color = Color((0, 120, 0))
+        return draft
+
+    def test_matches_eager_advance(self):
+        for step, repeats in ((1, None), (2, 3), (5, 4)):
+            lazy = self.make_draft().advance(step=step, repeats=repeats,
+                                             lazy=True)
+            eager = self.make_draft()
+            eager.advance(step=step, repeats=repeats)
+            self.assertEqual(len(lazy.warp), len(eager.warp))
+            self.assertEqual([thread.color for thread in lazy.weft],
+                             [thread.color for thread in eager.weft])
+            self.assertEqual(lazy.threading_array().tolist(),
+                             eager.threading_array().tolist())
+            self.assertEqual(lazy.pick_masks(), eager.pick_masks())
+            self.assertEqual(lazy.lift_masks(), eager.lift_masks())
+            self.assertEqual(lazy.compute_drawdown_array().tolist(),
+                             eager.compute_drawdown_array().tolist())
+            self.assertEqual(lazy.find_repeats(), eager.find_repeats())
+            materialized = lazy.materialize()
+            self.assertEqual(materialized.lift_masks(), eager.lift_masks())
+            self.assertEqual(
+                [-1 if thread.shaft is None else
+                 lazy.shafts.index(thread.shaft) for thread in lazy.warp],
+                lazy.threading_array().tolist())
+
+    def test_compact_base(self):
+        base = CompactDraft.from_draft(self.make_draft())
+        lazy = base.advance(step=2, lazy=True)
+        eager = self.make_draft()
+        eager.advance(step=2)
+        self.assertEqual(lazy.pick_masks(), eager.pick_masks())
+        self.assertEqual(lazy.lift_masks(), eager.lift_masks())
+        self.assertEqual(lazy.liftplan_array().tolist(),
+                         eager.liftplan_array().tolist())
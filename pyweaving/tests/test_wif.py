@@ -0,0 +1,137 @@
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import os.path
+import shutil
+from io import StringIO
+from tempfile import mkdtemp
+from unittest import TestCase
+
+from .. import Draft
+from ..generators import twill
+from ..wif import (WIFReader, FastWIFReader, WIFWriter, parse_wif,
+                   parse_int_lines)
+
+
+SAMPLE_DIR = os.path.join(os.path.dirname(__file__), 'samples')
+
+
+class TestFastWIFReader(TestCase):
+    def setUp(self):
+        self.dir = mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_parse_wif(self):
+        sections = parse_wif(StringIO(
+            '; comment\n'
+            '[WIF]\n'
+            'Version=1.1\n'
+            '[weaving]\n'
+            'Shafts: 4\n'
+            'shafts=8\n'
+            'Notes=first\n'
+            '  second\n'))
+        self.assertEqual(sections['WIF'], {'version': '1.1'})
+        self.assertEqual(sections['WEAVING'],
+                         {'shafts': '8', 'notes': 'first\nsecond'})
+
+    def test_parse_int_lines(self):
+        keys, counts, values = parse_int_lines(
+            '\n1=3\n2 = 4, 15\n\n12=6,7,8\n')
+        self.assertEqual(keys.tolist(), [1, 2, 12])
+        self.assertEqual(counts.tolist(), [1, 2, 3])
+        self.assertEqual(values.tolist(), [3, 4, 15, 6, 7, 8])
+        keys, counts, values = parse_int_lines('')
+        self.assertEqual(len(keys), 0)
+        for text in ('1=3\n; comment\n', '1=\n', '1=2,\n', '1=2,,3\n',
+                     '1,2=3\n', '1=2=3\n', '=3\n', '1=2 3\n',
+                     '1=2\n  3\n'):
+            self.assertIsNone(parse_int_lines(text), text)
+
+    def rewrite_wif(self, draft, *replacements):
+        filename = os.path.join(self.dir, 'out.wif')
+        WIFWriter(draft).write(filename)
+        with open(filename) as f:
+            text = f.read()
+        for old, new in replacements:
+            text = text.replace(old, new)
+        with open(filename, 'w') as f:
+            f.write(text)
+        return filename
+
+    def test_unusual_sections(self):
+        # Sections which can't be tokenized in bulk are parsed line by line.
+        filename = self.rewrite_wif(
+            twill.twill(2),
+            ('[TREADLING]\n1=', '[TREADLING]\n; picks\n1=x'),
+            ('[THREADING]\n', '[THREADING]\n# ends\n'))
+        expected = WIFReader(filename).read()
+        draft = FastWIFReader(filename).read()
+        self.assertEqual(len(draft.weft), len(expected.weft))
+        self.assertEqual(len(draft.weft), 15)
+        self.assertEqual(list(draft.threading_array()),
+                         list(expected.threading_array()))
+        self.assertEqual(draft.liftplan_array().tolist(),
+                         expected.liftplan_array().tolist())
+
+    def test_missing_date(self):
+        draft = twill.twill(2)
+        filename = self.rewrite_wif(draft, ('Date=%s\n' % draft.date, ''))
+        loaded = FastWIFReader(filename).read()
+        self.assertEqual(loaded.date, Draft(num_shafts=2).date)
+        filename = self.rewrite_wif(loaded)
+        with open(filename) as f:
+            self.assertNotIn('Date=None', f.read())
+
+    def test_matches_wif_reader(self):
+        filename = os.path.join(SAMPLE_DIR, 'twill.wif')
+        expected = WIFReader(filename).read()
+        draft = FastWIFReader(filename).read()
+
+        self.assertEqual(len(draft.warp), len(expected.warp))
+        self.assertEqual(len(draft.weft), len(expected.weft))
+        self.assertEqual(list(draft.threading_array()),
+                         list(expected.threading_array()))
+        self.assertEqual(draft.liftplan_array().tolist(),
+                         expected.liftplan_array().tolist())
+        self.assertEqual([thread.color.rgb for thread in draft.warp],
+                         [thread.color.rgb for thread in expected.warp])
+        self.assertEqual([thread.color.rgb for thread in draft.weft],
+                         [thread.color.rgb for thread in expected.weft])
+        self.assertEqual(draft.compute_longest_floats(),
+                         expected.compute_longest_floats())
+        self.assertEqual(draft.date, expected.date)
+
+
+class TestWIFWriter(TestCase):
+    def setUp(self):
+        self.dir = mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def check_round_trip(self, draft, liftplan):
+        filename = os.path.join(self.dir, 'out.wif')
+        WIFWriter(draft).write(filename, liftplan=liftplan)
+        for reader in (WIFReader, FastWIFReader):
+            loaded = reader(filename).read()
+            self.assertEqual(len(loaded.treadles),
+                             0 if liftplan else len(draft.treadles))
+            self.assertEqual(list(loaded.threading_array()),
+                             list(draft.threading_array()))
+            self.assertEqual(loaded.liftplan_array().tolist(),
+                             draft.liftplan_array().tolist())
+            self.assertEqual([thread.color.rgb for thread in loaded.weft],
+                             [thread.color.rgb for thread in draft.weft])
+
+    def test_round_trip_treadling(self):
+        draft = twill.twill(2, warp_color=(0, 0, 100),
+                            weft_color=(255, 255, 255))
+        draft.notes = 'first line\nsecond line'
+        self.check_round_trip(draft, liftplan=False)
+
+    def test_round_trip_liftplan(self):
+        draft = FastWIFReader(os.path.join(SAMPLE_DIR, 'twill.wif')).read()
+        self.check_round_trip(draft, liftplan=True)
@@ -1,9 +1,14 @@
 from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 
+import io
+import re
+
+import numpy as np
 from six.moves.configparser import RawConfigParser
 
 from . import Draft, __version__
+from .compact import CompactDraft
 
 
 class WIFReader(object):
@@ -208,9 +213,392 @@ class WIFReader(object):
         return draft
 
 
+def split_wif(text):
+    """
+    Split the text of a WIF file into a dict mapping each section name, upper
+    cased, to a list of the bodies of every section with that name. Anything
+    before the first section is ignored.
+    """
+    bodies = {}
+    name = None
+    body_start = 0
+    # Brackets are rare outside section headers, so jump between them rather
+    # than looking at every line.
+    pos = text.find('[')
+    while pos >= 0:
+        line_start = text.rfind('\n', 0, pos) + 1
+        line_end = text.find('\n', pos)
+        if line_end < 0:
+            line_end = len(text)
+        line = text[line_start:line_end].strip()
+        if not text[line_start:pos].strip() and line[-1] == ']':
+            if name is not None:
+                bodies.setdefault(name, []).append(
+                    text[body_start:line_start])
+            name = line[1:-1].strip().upper()
+            body_start = line_end
+        pos = text.find('[', line_end)
+    if name is not None:
+        bodies.setdefault(name, []).append(text[body_start:])
+    return bodies
+
+
+def parse_options(bodies):
+    """
+    Parse the lines of one or more section bodies into a dict of options.
+    Option names are lower cased, and later duplicates of an option override
+    earlier ones, instead of raising an error as ``RawConfigParser`` would.
+    """
+    options = {}
+    option = None
+    for body in bodies:
+        for line in body.splitlines():
+            stripped = line.strip()
+            if not stripped or stripped[0] in '#;':
+                continue
+            if line[0] in ' \t' and option is not None:
+                # continuation of the previous value
+                options[option] += '\n' + stripped
+                continue
+            key, sep, value = stripped.partition('=')
+            if not sep:
+                key, sep, value = stripped.partition(':')
+                if not sep:
+                    continue
+            option = key.strip().lower()
+            options[option] = value.strip()
+    return options
+
+
+def parse_wif(f):
+    """
+    Split the lines of a WIF file into a dict mapping each section name to a
+    dict of its options. Section names are upper cased and option names are
+    lower cased. Later duplicates of a section or option override earlier
+    ones, instead of raising an error as ``RawConfigParser`` would.
+    """
+    return dict((name, parse_options(bodies))
+                for name, bodies in split_wif(f.read()).items())
+
+
+INT_LINE_CHARS = b'0123456789=,\n \t\r'
+SEPARATORS_TO_SPACES = bytes(bytearray(
+    ch if ord('0') <= ch <= ord('9') else ord(' ') for ch in range(256)))
+SPLIT_OR_INDENTED = re.compile(br'\d[ \t\r]+\d|\n[ \t]')
+
+
+def parse_int_lines(text):
+    """
+    Parse a section body made only of lines like ``12=3,5``, returning a
+    tuple of integer arrays ``(keys, counts, values)``: the option of each
+    line, the number of values on it, and every value, in order.
+
+    The text is tokenized with array operations rather than line by line.
+    Returns None if any line is not of that form (such as a comment, an
+    empty value or an indented continuation line), in which case the caller
+    should fall back to ``parse_options()``.
+    """
+    data = text.encode('ascii', 'replace')
+    if data.translate(None, INT_LINE_CHARS):
+        return None
+    if b' ' in data or b'\t' in data or b'\r' in data:
+        # Spaces may surround separators, but not split numbers or indent
+        # lines.
+        if data[:1] in (b' ', b'\t') or SPLIT_OR_INDENTED.search(data):
+            return None
+        data = data.translate(None, b' \t\r')
+
+    # Find every number, and check that each is either a key between the
+    # start of a line and '=', or a value between '=' or ',' and ',' or the
+    # end of a line. Counting separators then ensures none are left over.
+    chars = np.frombuffer(b'\n' + data + b'\n', dtype=np.uint8)
+    is_digit = (chars - np.uint8(ord('0'))) < 10
+    edges = np.diff(is_digit.view(np.int8))
+    starts = np.flatnonzero(edges == 1) + 1
+    ends = np.flatnonzero(edges == -1) + 1
+    before = chars[starts - 1]
+    after = chars[ends]
+    is_key = before == ord('\n')
+    follows_comma = before == ord(',')
+    valid = np.where(is_key, after == ord('='),
+                     (follows_comma | (before == ord('='))) &
+                     ((after == ord(',')) | (after == ord('\n'))))
+    num_keys = int(np.count_nonzero(is_key))
+    if not valid.all() or data.count(b'=') != num_keys or \
+            data.count(b',') != np.count_nonzero(follows_comma) or \
+            np.count_nonzero(before == ord('=')) != num_keys:
+        return None
+    if len(starts) and (ends - starts).max() > 18:
+        return None
+
+    if len(starts):
+        tokens = np.fromstring(data.translate(SEPARATORS_TO_SPACES),
+                               dtype=np.int64, sep=' ')
+    else:
+        tokens = np.zeros(0, dtype=np.int64)
+    key_indexes = np.flatnonzero(is_key)
+    counts = np.diff(np.append(key_indexes, len(tokens))) - 1
+    return tokens[is_key], counts, tokens[~is_key]
+
+
+def last_lines(keys, low, high):
+    """
+    Return the indexes of the lines with keys from ``low`` to ``high``, in
+    order of key, using only the last line with each key.
+    """
+    unique, index = np.unique(keys[::-1], return_index=True)
+    index = len(keys) - 1 - index
+    return index[(unique >= low) & (unique <= high)]
+
+
+class FastWIFReader(object):
+    """
+    A reader for a specific WIF file, which splits the file into sections in
+    a single pass instead of going through ``RawConfigParser``, and loads the
+    threads directly into the packed arrays of a ``CompactDraft``.
+
+    The large sections listing a number for each thread are tokenized with
+    array operations (see ``parse_int_lines()``), falling back to parsing
+    them line by line if they contain anything unusual.
+
+    Handles the same vendor quirks as ``WIFReader``: threads beyond those
+    which are threaded or treadled are dropped, and unparseable treadling
+    entries are ignored.
+    """
+
+    allowed_units = WIFReader.allowed_units
+
+    def __init__(self, filename):
+        self.filename = filename
+
+    def options(self, section):
+        if section not in self.sections:
+            self.sections[section] = parse_options(
+                self.bodies.get(section, ()))
+        return self.sections[section]
+
+    def get(self, section, option, default=None):
+        return self.options(section).get(option.lower(), default)
+
+    def getint(self, section, option, default=None):
+        value = self.get(section, option)
+        if value is None:
+            return default
+        return int(value)
+
+    def getbool(self, section, option):
+        value = self.get(section, option)
+        if value is None:
+            return False
+        return RawConfigParser.BOOLEAN_STATES[value.lower()]
+
+    def int_lines(self, section):
+        """
+        Return the integer options of a section and their comma-separated
+        integer values as a tuple of arrays ``(keys, counts, values)``, as
+        for ``parse_int_lines()``. Options whose values aren't integers are
+        ignored.
+        """
+        if section in self.int_sections:
+            return self.int_sections[section]
+        ret = parse_int_lines('\n'.join(self.bodies.get(section, ())))
+        if ret is None:
+            ret = self.parse_int_options(section)
+        self.int_sections[section] = ret
+        return ret
+
+    def parse_int_options(self, section):
+        """
+        Parse the integer options of a section line by line, for sections
+        which ``parse_int_lines()`` can't handle.
+        """
+        keys = []
+        counts = []
+        values = []
+        for key, value in self.options(section).items():
+            try:
+                key = int(key)
+                nos = [int(n) for n in value.split(',')]
+            except ValueError:
+                continue
+            keys.append(key)
+            counts.append(len(nos))
+            values.extend(nos)
+        return (np.array(keys, dtype=np.int64),
+                np.array(counts, dtype=np.intp),
+                np.array(values, dtype=np.int64))
+
+    def int_lists(self, section):
+        """
+        Return a dict mapping the integer options of a section to lists of
+        comma-separated integers.
+        """
+        keys, counts, values = self.int_lines(section)
+        values = np.split(values, np.cumsum(counts)[:-1]) if len(keys) else []
+        return dict((key, nos) for key, nos in
+                    zip(keys.tolist(), (nos.tolist() for nos in values)))
+
+    def read_palette(self, draft):
+        """
+        Add the WIF color table to the draft palette, and return a dict
+        mapping WIF color numbers to palette indexes.
+        """
+        if self.getbool('CONTENTS', 'COLOR PALETTE'):
+            rstart, rend = self.get('COLOR PALETTE', 'Range').split(',')
+            palette_range = int(rstart), int(rend)
+        else:
+            palette_range = 0, 255
+
+        wif_palette = {}
+        if self.getbool('CONTENTS', 'COLOR TABLE'):
+            scale = 255. / palette_range[1]
+            for color_no, channels in self.int_lists('COLOR TABLE').items():
+                wif_palette[color_no] = draft.color_number(
+                    [int(round(ch * scale)) for ch in channels])
+        return wif_palette
+
+    def thread_colors(self, dir, wif_palette, num_threads):
+        """
+        Return an array giving the palette index of each thread, indexed by
+        thread number, using the default color of the section for threads
+        without a color of their own.
+        """
+        default = wif_palette.get(self.getint(dir, 'Color'), -1)
+        colors = np.full(num_threads + 1, default, dtype=np.intp)
+        if self.getbool('CONTENTS', '%s COLORS' % dir):
+            keys, counts, values = self.int_lines('%s COLORS' % dir)
+            single = counts == 1
+            keys = keys[single]
+            values = values[np.cumsum(counts)[single] - 1]
+            lines = last_lines(keys, 1, num_threads)
+            color_nos, index = np.unique(values[lines], return_inverse=True)
+            lookup = np.array([wif_palette.get(color_no, -1)
+                               for color_no in color_nos.tolist()],
+                              dtype=np.intp)
+            colors[keys[lines]] = lookup[index]
+        return colors
+
+    def thread_matrix(self, section, thread_nos, width):
+        """
+        Return a boolean matrix with a row for each of ``thread_nos``,
+        giving which of the (1-indexed) numbers from 1 to ``width`` are
+        listed for that thread in ``section``.
+        """
+        matrix = np.zeros((len(thread_nos), width), dtype=bool)
+        if not len(thread_nos):
+            return matrix
+        keys, counts, values = self.int_lines(section)
+        row_nos = np.full(int(thread_nos[-1]) + 1, -1, dtype=np.intp)
+        row_nos[thread_nos] = np.arange(len(thread_nos))
+        lines = last_lines(keys, 1, len(row_nos) - 1)
+        used = np.zeros(len(keys), dtype=bool)
+        used[lines] = True
+        value_lines = np.repeat(np.arange(len(keys)), counts)
+        rows = np.full(len(keys), -1, dtype=np.intp)
+        rows[lines] = row_nos[keys[lines]]
+        rows = rows[value_lines]
+        keep = used[value_lines] & (rows >= 0) & \
+            (values >= 1) & (values <= width)
+        matrix[rows[keep], values[keep] - 1] = True
+        return matrix
+
+    def check_units(self, dir):
+        units = self.get(dir, 'Units', '').lower()
+        assert units in self.allowed_units, \
+            "%s Units of %r is not understood" % (dir.title(), units)
+
+    def put_warp(self, draft, wif_palette):
+        self.check_units('WARP')
+        num_threads = self.getint('WARP', 'Threads', 0)
+        colors = self.thread_colors('WARP', wif_palette, num_threads)
+        if not self.getbool('CONTENTS', 'THREADING'):
+            return
+        keys, counts, values = self.int_lines('THREADING')
+        # NOTE: Some crappy software will generate WIFs with way more
+        # threads in the warp or weft section than mentioned in the
+        # threading. To ignore that, make sure that this thread actually
+        # has threading specified: otherwise it's unused.
+        lines = last_lines(keys, 1, num_threads)
+        first = np.cumsum(counts) - counts
+        value_lines = np.repeat(np.arange(len(keys)), counts)
+        used = np.zeros(len(keys), dtype=bool)
+        used[lines] = True
+        assert (values == values[first][value_lines])[
+            used[value_lines]].all()
+        draft.extend_warp((values[first][lines] - 1).tolist(),
+                          colors[keys[lines]].tolist())
+
+    def put_weft(self, draft, wif_palette):
+        self.check_units('WEFT')
+        num_threads = self.getint('WEFT', 'Threads', 0)
+        colors = self.thread_colors('WEFT', wif_palette, num_threads)
+        thread_nos = []
+        sections = []
+        for section, width in (('LIFTPLAN', len(draft.shafts)),
+                               ('TREADLING', len(draft.treadles))):
+            if self.getbool('CONTENTS', section):
+                keys = self.int_lines(section)[0]
+                thread_nos.append(keys[(keys >= 1) & (keys <= num_threads)])
+            sections.append((section, width))
+        thread_nos = np.unique(np.concatenate(
+            thread_nos or [np.zeros(0, dtype=np.int64)]))
+        lifts, treadles = [
+            self.thread_matrix(section, thread_nos, width)
+            if self.getbool('CONTENTS', section) else
+            np.zeros((len(thread_nos), width), dtype=bool)
+            for section, width in sections]
+        draft.extend_weft(colors[thread_nos].tolist(), lifts, treadles)
+
+    def put_tieup(self, draft):
+        for treadle_no, shaft_nos in self.int_lists('TIEUP').items():
+            if 0 < treadle_no <= len(draft.treadles):
+                draft.treadles[treadle_no - 1].set_mask(
+                    sum(1 << (n - 1) for n in set(shaft_nos)
+                        if 0 < n <= len(draft.shafts)))
+
+    def read(self):
+        """
+        Perform the actual parsing, and return a CompactDraft instance.
+        """
+        with io.open(self.filename, encoding='utf-8-sig',
+                     errors='replace') as f:
+            self.bodies = split_wif(f.read())
+        self.sections = {}
+        self.int_sections = {}
+
+        rising_shed = self.getbool('WEAVING', 'Rising Shed')
+        num_shafts = self.getint('WEAVING', 'Shafts')
+        num_treadles = self.getint('WEAVING', 'Treadles', 0)
+
+        liftplan = self.getbool('CONTENTS', 'LIFTPLAN')
+        treadling = self.getbool('CONTENTS', 'TREADLING')
+        assert not (liftplan and treadling), \
+            "WIF contains both liftplan and treadling"
+        assert not (liftplan and (num_treadles > 0)), \
+            "WIF contains liftplan and non-zero treadle count"
+
+        # A draft gets the default date if the file has none.
+        draft = CompactDraft(num_shafts=num_shafts,
+                             num_treadles=num_treadles,
+                             rising_shed=rising_shed,
+                             date=self.get('WIF', 'Date'))
+
+        wif_palette = self.read_palette(draft)
+        self.put_warp(draft, wif_palette)
+        self.put_weft(draft, wif_palette)
+        if treadling:
+            self.put_tieup(draft)
+
+        return draft
+
+
 class WIFWriter(object):
     """
     A WIF writer for a draft.
+
+    Sections are streamed straight to the output file as they are generated,
+    and shafts and treadles are numbered through index maps built once per
+    write, so the time taken is linear in the size of the draft.
     """
 
     # TODO
@@ -219,130 +607,150 @@ class WIFWriter(object):
     def __init__(self, draft):
         self.draft = draft
 
-    def write_metadata(self, config, liftplan):
-        config.add_section('WIF')
-        config.set('WIF', 'Date', self.draft.date)
-        config.set('WIF', 'Version', '1.1')
-        config.set('WIF', 'Developers', 'storborg@gmail.com')
-        config.set('WIF', 'Source Program', 'PyWeaving')
-        config.set('WIF', 'Source Version', __version__)
-
-        config.set('CONTENTS', 'WEAVING', 1)
-        config.add_section('WEAVING')
-        config.set('WEAVING', 'Rising Shed', self.draft.rising_shed)
-        config.set('WEAVING', 'Shafts', len(self.draft.shafts))
-        config.set('WEAVING', 'Treadles',
-                   0 if liftplan else len(self.draft.treadles))
-
-        config.set('CONTENTS', 'TEXT', 1)
-        config.add_section('TEXT')
-        config.set('TEXT', 'Title', self.draft.title)
-        config.set('TEXT', 'Author', self.draft.author)
-        config.set('TEXT', 'Address', self.draft.address)
-        config.set('TEXT', 'EMail', self.draft.email)
-        config.set('TEXT', 'Telephone', self.draft.telephone)
-        config.set('TEXT', 'FAX', self.draft.fax)
+    def write_section(self, f, section, options):
+        """
+        Write a section header followed by each ``(option, value)`` pair
+        yielded by ``options``.
+        """
+        f.write('[%s]\n' % section)
+        for option, value in options:
+            f.write('%s=%s\n' % (option, value))
+        f.write('\n')
 
+    def write_contents(self, f, liftplan):
+        contents = ['WIF', 'WEAVING', 'TEXT']
         if self.draft.notes:
-            config.set('CONTENTS', 'NOTES', 1)
-            config.add_section('NOTES')
-            for ii, line in enumerate(self.draft.notes.split('\n')):
-                config.set('NOTES', str(ii), line)
-
-    def write_palette(self, config):
-        # generate the color table and write it to the config
-        # return a wif_palette mapping color instances to numbers.
-        colors = set(thread.color.rgb for thread in
-                     self.draft.warp + self.draft.weft)
+            contents.append('NOTES')
+        contents += ['COLOR TABLE', 'COLOR PALETTE',
+                     'WARP', 'WARP COLORS', 'WEFT', 'WEFT COLORS',
+                     'THREADING']
+        if liftplan:
+            contents.append('LIFTPLAN')
+        else:
+            contents += ['TREADLING', 'TIEUP']
+        self.write_section(f, 'CONTENTS',
+                           ((section, 'true') for section in contents))
+
+    def write_metadata(self, f, liftplan):
+        draft = self.draft
+        self.write_section(f, 'WIF', [
+            ('Date', draft.date),
+            ('Version', '1.1'),
+            ('Developers', 'storborg@gmail.com'),
+            ('Source Program', 'PyWeaving'),
+            ('Source Version', __version__),
+        ])
+        self.write_section(f, 'WEAVING', [
+            ('Rising Shed', 'true' if draft.rising_shed else 'false'),
+            ('Shafts', len(draft.shafts)),
+            ('Treadles', 0 if liftplan else len(draft.treadles)),
+        ])
+        self.write_section(f, 'TEXT', [
+            ('Title', draft.title),
+            ('Author', draft.author),
+            ('Address', draft.address),
+            ('EMail', draft.email),
+            ('Telephone', draft.telephone),
+            ('FAX', draft.fax),
+        ])
+        if draft.notes:
+            self.write_section(f, 'NOTES',
+                               enumerate(draft.notes.split('\n')))
+
+    def write_palette(self, f):
+        # generate the color table and write it to the file
+        # return a wif_palette mapping colors to numbers.
         wif_palette = {}
-        config.set('CONTENTS', 'COLOR TABLE', 1)
-        config.add_section('COLOR TABLE')
-        for ii, color in enumerate(colors, start=1):
-            val = '%d,%d,%d' % color
-            config.set('COLOR TABLE', str(ii), val)
-            wif_palette[color] = ii
-
-        config.set('CONTENTS', 'COLOR PALETTE', 1)
-        config.add_section('COLOR PALETTE')
-        config.set('COLOR PALETTE', 'Form', 'RGB')
-        config.set('COLOR PALETTE', 'Range', '0,255')
+        for color in self.draft.palette:
+            wif_palette.setdefault(color, len(wif_palette) + 1)
+
+        self.write_section(f, 'COLOR TABLE',
+                           ((ii, '%d,%d,%d' % color.rgb)
+                            for color, ii in wif_palette.items()))
+        self.write_section(f, 'COLOR PALETTE', [
+            ('Form', 'RGB'),
+            ('Range', '0,255'),
+        ])
         return wif_palette
 
-    def write_threads(self, config, wif_palette, dir):
+    def write_threads(self, f, wif_palette, dir):
         assert dir in ('warp', 'weft')
         threads = getattr(self.draft, dir)
         dir = dir.upper()
-        config.set('CONTENTS', dir, 1)
-        config.add_section(dir)
-        config.set(dir, 'Threads', len(threads))
-        # XXX This should actually be stored in the draft.
-        config.set(dir, 'Units', 'Inches')
-
-        config.set('CONTENTS', '%s COLORS' % dir, 1)
-        config.add_section('%s COLORS' % dir)
-        for ii, thread in enumerate(threads, start=1):
-            config.set('%s COLORS' % dir,
-                       str(ii),
-                       wif_palette[thread.color.rgb])
-
-    def write_threading(self, config):
-        config.set('CONTENTS', 'THREADING', 1)
-        config.add_section('THREADING')
-
-        for ii, thread in enumerate(self.draft.warp, start=1):
-            shaft_string = str(self.draft.shafts.index(thread.shaft) + 1)
-            config.set('THREADING', str(ii), shaft_string)
-
-    def write_liftplan(self, config):
-        config.set('CONTENTS', 'LIFTPLAN', 1)
-        config.add_section('LIFTPLAN')
-
-        for ii, thread in enumerate(self.draft.weft, start=1):
-            shaft_nos = [self.draft.shafts.index(shaft) + 1
-                         for shaft in thread.connected_shafts]
-            shaft_string = ','.join([str(shaft_no) for shaft_no in shaft_nos])
-            config.set('LIFTPLAN', str(ii), shaft_string)
-
-    def write_treadling(self, config):
-        config.set('CONTENTS', 'TREADLING', 1)
-        config.add_section('TREADLING')
-
-        for ii, thread in enumerate(self.draft.weft, start=1):
-            treadle_nos = [self.draft.treadles.index(treadle) + 1
-                           for treadle in thread.treadles]
-            treadle_string = ','.join([str(treadle_no) for treadle_no in
-                                       treadle_nos])
-            config.set('TREADLING', str(ii), treadle_string)
-
-    def write_tieup(self, config):
-        config.set('CONTENTS', 'TIEUP', 1)
-        config.add_section('TIEUP')
-
-        for ii, treadle in enumerate(self.draft.treadles, start=1):
-            shaft_nos = [self.draft.shafts.index(shaft) + 1
-                         for shaft in treadle.shafts]
-            shaft_string = ','.join([str(shaft_no) for shaft_no in shaft_nos])
-            config.set('TIEUP', str(ii), shaft_string)
-
-    def write(self, filename, liftplan=False):
+        self.write_section(f, dir, [
+            ('Threads', len(threads)),
+            # XXX This should actually be stored in the draft.
+            ('Units', 'Inches'),
+        ])
+        self.write_section(f, '%s COLORS' % dir,
+                           ((ii, wif_palette[thread.color])
+                            for ii, thread in enumerate(threads, start=1)))
+
+    def number_list(self, index_map, objs):
+        return ','.join(str(no) for no in sorted(index_map[obj]
+                                                 for obj in objs))
+
+    def write_threading(self, f, shaft_nos):
+        # Unthreaded ends are left out of the threading section.
+        self.write_section(f, 'THREADING',
+                           ((ii, shaft_nos[thread.shaft])
+                            for ii, thread in enumerate(self.draft.warp,
+                                                        start=1)
+                            if thread.shaft is not None))
+
+    def write_liftplan(self, f, shaft_nos):
+        def lifts():
+            for ii, thread in enumerate(self.draft.weft, start=1):
+                shafts = set(thread.shafts)
+                for treadle in thread.treadles:
+                    shafts.update(treadle.shafts)
+                if shafts:
+                    yield ii, self.number_list(shaft_nos, shafts)
+        self.write_section(f, 'LIFTPLAN', lifts())
+
+    def write_treadling(self, f, treadle_nos):
+        self.write_section(f, 'TREADLING',
+                           ((ii, self.number_list(treadle_nos,
+                                                  thread.treadles))
+                            for ii, thread in enumerate(self.draft.weft,
+                                                        start=1)
+                            if thread.treadles))
+
+    def write_tieup(self, f, shaft_nos):
+        self.write_section(f, 'TIEUP',
+                           ((ii, self.number_list(shaft_nos, treadle.shafts))
+                            for ii, treadle in enumerate(self.draft.treadles,
+                                                         start=1)
+                            if treadle.shafts))
+
+    def write_file(self, f, liftplan=False):
+        """
+        Write the draft to the text file object ``f``.
+        """
         assert self.draft.start_at_lowest_thread
+        liftplan = liftplan or not self.draft.treadles
 
-        config = RawConfigParser()
-        config.optionxform = str
-        config.add_section('CONTENTS')
+        shaft_nos = dict((shaft, ii)
+                         for ii, shaft in enumerate(self.draft.shafts,
+                                                    start=1))
+        treadle_nos = dict((treadle, ii)
+                           for ii, treadle in enumerate(self.draft.treadles,
+                                                        start=1))
 
-        self.write_metadata(config, liftplan=liftplan)
+        self.write_contents(f, liftplan=liftplan)
+        self.write_metadata(f, liftplan=liftplan)
 
-        wif_palette = self.write_palette(config)
-        self.write_threads(config, wif_palette, 'warp')
-        self.write_threads(config, wif_palette, 'weft')
+        wif_palette = self.write_palette(f)
+        self.write_threads(f, wif_palette, 'warp')
+        self.write_threads(f, wif_palette, 'weft')
 
-        self.write_threading(config)
-        if liftplan or not self.draft.treadles:
-            self.write_liftplan(config)
+        self.write_threading(f, shaft_nos)
+        if liftplan:
+            self.write_liftplan(f, shaft_nos)
         else:
-            self.write_treadling(config)
-            self.write_tieup(config)
+            self.write_treadling(f, treadle_nos)
+            self.write_tieup(f, shaft_nos)
 
-        with open(filename, 'wb') as f:
-            config.write(f)
+    def write(self, filename, liftplan=False):
+        with io.open(filename, 'w', encoding='utf-8') as f:
+            self.write_file(f, liftplan=liftplan)
@@ -24,6 +24,7 @@ setup(name='pyweaving',
       author_email='storborg@gmail.com',
       install_requires=[
           'Pillow>=2.1.0',      # Provides PIL
+          'numpy>=1.17',
           'six>=1.5.2',
       ],
       license='MIT',